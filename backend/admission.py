@@ -0,0 +1,335 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.security.utils import get_authorization_scheme_param
+
+from auth import username_from_token
+from instrumentation import span
+
+# Limits are per worker process, like the DB pool; size them against the provider quota / worker count
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_MAX_CONCURRENT_PER_USER = int(os.getenv("ADMISSION_MAX_CONCURRENT_PER_USER", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_QUEUE_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUE_PER_USER", "4"))
+# Longest a request may wait (queue + token budget) before it is shed with a 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "15"))
+# Estimated prompt tokens per minute (0 = unlimited)
+ADMISSION_TOKENS_PER_MINUTE = int(os.getenv("ADMISSION_TOKENS_PER_MINUTE", "1000000"))
+ADMISSION_USER_TOKENS_PER_MINUTE = int(os.getenv("ADMISSION_USER_TOKENS_PER_MINUTE", "0"))
+# Pause after the provider rate-limits us without saying for how long
+ADMISSION_PROVIDER_BACKOFF = float(os.getenv("ADMISSION_PROVIDER_BACKOFF_SECONDS", "30"))
+
+CHARS_PER_TOKEN = 4
+MAX_USER_BUCKETS = 10_000
+RETRY_HINT = re.compile(r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+
+
+def estimate_tokens(chars: int) -> int:
+    """Rough prompt size in tokens (Gemini averages ~4 characters per token for English)."""
+    return max(1, math.ceil(chars / CHARS_PER_TOKEN))
+
+
+RATE_LIMIT_ERROR_TYPES = ("ResourceExhausted", "TooManyRequests", "RateLimitError")
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    True for provider quota / rate-limit errors, judged by exception type and status
+    code (google.api_core ResourceExhausted, google-genai / httpx errors with a 429).
+    Wrapping exceptions (e.g. LangChain's) are followed through __cause__.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in RATE_LIMIT_ERROR_TYPES:
+            return True
+        response = getattr(error, "response", None)
+        for code in (getattr(error, "code", None), getattr(error, "status_code", None),
+                     getattr(response, "status_code", None)):
+            if code == 429:
+                return True
+        if getattr(error, "status", None) == "RESOURCE_EXHAUSTED":
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def retry_after_hint(error: BaseException) -> Optional[float]:
+    match = RETRY_HINT.search(str(error))
+    if not match:
+        return None
+    return float(match.group(1) or match.group(2))
+
+
+def rejection(status_code: int, detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class TokenBucket:
+    """Refills at `rate` tokens/second up to `capacity`. Reservations may run into debt."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: int) -> float:
+        """Take `amount` tokens; returns the seconds until they are actually available."""
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: int):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class Ticket:
+    """An admitted request's slot; release() is idempotent."""
+
+    def __init__(self, controller: Optional["AdmissionController"], key: str):
+        self._controller = controller
+        self.key = key
+        self.admitted_at = time.monotonic()
+
+    def release(self):
+        if self._controller is not None:
+            controller, self._controller = self._controller, None
+            controller._release(self.key, time.monotonic() - self.admitted_at)
+
+
+class AdmissionController:
+    """
+    Admission control for LLM-backed requests.
+
+    A request is charged its estimated prompt tokens against a global token bucket
+    (and optionally a per-client one), then takes one of max_concurrent slots, at
+    most max_per_user per client. Requests that can't start immediately wait in a
+    bounded FIFO queue; anything that can't be admitted within queue_timeout is
+    rejected up front instead of timing out later: 429 when the client is over its
+    own share, 503 when the service (or the provider) is saturated. Both carry a
+    Retry-After estimate.
+    """
+
+    def __init__(self, enabled: bool = ADMISSION_ENABLED, max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+                 max_per_user: int = ADMISSION_MAX_CONCURRENT_PER_USER, max_queue: int = ADMISSION_MAX_QUEUE,
+                 max_queue_per_user: int = ADMISSION_MAX_QUEUE_PER_USER, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 tokens_per_minute: int = ADMISSION_TOKENS_PER_MINUTE,
+                 user_tokens_per_minute: int = ADMISSION_USER_TOKENS_PER_MINUTE):
+        self.enabled = enabled
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.user_tokens_per_minute = user_tokens_per_minute
+        self.user_buckets: Dict[str, TokenBucket] = {}
+        self.active = 0
+        self.active_by_user: Dict[str, int] = {}
+        self.waiting: deque = deque()
+        self.waiting_by_user: Dict[str, int] = {}
+        self.blocked_until = 0.0
+        # Moving average of how long admitted requests hold a slot, for Retry-After
+        self.avg_hold_seconds = 5.0
+        self.admitted_total = 0
+        self.rejected_429 = 0
+        self.rejected_503 = 0
+        self.provider_rate_limits = 0
+
+    # --- token budgets ---
+
+    def _user_bucket(self, key: str) -> Optional[TokenBucket]:
+        if self.user_tokens_per_minute <= 0:
+            return None
+        bucket = self.user_buckets.get(key)
+        if bucket is None:
+            if len(self.user_buckets) >= MAX_USER_BUCKETS:
+                # Full buckets carry no state; forget them
+                self.user_buckets = {k: b for k, b in self.user_buckets.items() if not b.is_full()}
+            bucket = self.user_buckets[key] = TokenBucket(self.user_tokens_per_minute)
+        return bucket
+
+    def _reject(self, status_code: int, detail: str, retry_after: float) -> HTTPException:
+        if status_code == 429:
+            self.rejected_429 += 1
+        else:
+            self.rejected_503 += 1
+        return rejection(status_code, detail, retry_after)
+
+    # --- concurrency slots ---
+
+    def _can_run(self, key: str) -> bool:
+        return self.active < self.max_concurrent and self.active_by_user.get(key, 0) < self.max_per_user
+
+    def _grant(self, key: str):
+        self.active += 1
+        self.active_by_user[key] = self.active_by_user.get(key, 0) + 1
+        self.admitted_total += 1
+
+    def _waiter_gone(self, key: str):
+        self.waiting_by_user[key] -= 1
+        if self.waiting_by_user[key] <= 0:
+            del self.waiting_by_user[key]
+
+    def _dispatch(self):
+        """Hand free slots to waiters in FIFO order, skipping clients at their own limit."""
+        remaining = deque()
+        while self.waiting:
+            key, future = self.waiting.popleft()
+            if future.done():
+                self._waiter_gone(key)
+                continue
+            if self._can_run(key):
+                self._waiter_gone(key)
+                self._grant(key)
+                future.set_result(None)
+            else:
+                remaining.append((key, future))
+        self.waiting = remaining
+
+    def _release(self, key: str, held: float):
+        self.active -= 1
+        self.active_by_user[key] -= 1
+        if self.active_by_user[key] <= 0:
+            del self.active_by_user[key]
+        self.avg_hold_seconds = 0.9 * self.avg_hold_seconds + 0.1 * held
+        self._dispatch()
+
+    def _forget_waiter(self, entry):
+        try:
+            self.waiting.remove(entry)
+        except ValueError:
+            return  # Already dropped by _dispatch
+        self._waiter_gone(entry[0])
+
+    async def _acquire_slot(self, key: str, timeout: float):
+        if self._can_run(key):
+            self._grant(key)
+            return
+        if self.waiting_by_user.get(key, 0) >= self.max_queue_per_user:
+            raise self._reject(429, "Too many concurrent analyses for this client", self.avg_hold_seconds)
+        if len(self.waiting) >= self.max_queue:
+            raise self._reject(503, "Server is busy; try again shortly",
+                               self.avg_hold_seconds * len(self.waiting) / max(1, self.max_concurrent))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (key, future)
+        self.waiting.append(entry)
+        self.waiting_by_user[key] = self.waiting_by_user.get(key, 0) + 1
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._forget_waiter(entry)
+            raise self._reject(503, "Server is busy; timed out waiting for capacity", self.avg_hold_seconds)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the client went away
+                Ticket(self, key).release()
+            else:
+                self._forget_waiter(entry)
+            raise
+
+    async def admit(self, key: str, tokens: int) -> Ticket:
+        """Wait for a slot for `key` costing `tokens` estimated prompt tokens, or raise 429/503."""
+        if not self.enabled:
+            return Ticket(None, key)
+
+        with span("admission_wait"):
+            deadline = time.monotonic() + self.queue_timeout
+            backoff = self.blocked_until - time.monotonic()
+            if backoff > self.queue_timeout:
+                raise self._reject(503, "LLM provider is rate limiting requests; try again later", backoff)
+
+            user_bucket = self._user_bucket(key)
+            user_wait = user_bucket.reserve(tokens) if user_bucket else 0.0
+            if user_wait > self.queue_timeout:
+                user_bucket.refund(tokens)
+                raise self._reject(429, "Token budget for this client exhausted", user_wait)
+            wait = self.bucket.reserve(tokens) if self.bucket else 0.0
+            if wait > self.queue_timeout:
+                self._refund(user_bucket, tokens)
+                raise self._reject(503, "Server token budget exhausted; try again later", wait)
+
+            try:
+                wait = max(wait, user_wait, backoff)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._acquire_slot(key, max(0.0, deadline - time.monotonic()))
+            except BaseException:
+                self._refund(user_bucket, tokens)
+                raise
+        return Ticket(self, key)
+
+    def _refund(self, user_bucket: Optional[TokenBucket], tokens: int):
+        if user_bucket:
+            user_bucket.refund(tokens)
+        if self.bucket:
+            self.bucket.refund(tokens)
+
+    @asynccontextmanager
+    async def slot(self, key: str, tokens: int):
+        ticket = await self.admit(key, tokens)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    # --- provider feedback ---
+
+    def provider_backoff(self, error: BaseException) -> float:
+        """Record a provider rate-limit error; new requests are held back meanwhile. Returns the pause."""
+        self.provider_rate_limits += 1
+        seconds = retry_after_hint(error) or ADMISSION_PROVIDER_BACKOFF
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        return seconds
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "active": self.active,
+            "waiting": len(self.waiting),
+            "admitted_total": self.admitted_total,
+            "rejected_429_total": self.rejected_429,
+            "rejected_503_total": self.rejected_503,
+            "provider_rate_limits_total": self.provider_rate_limits,
+            "provider_backoff_seconds": max(0.0, self.blocked_until - time.monotonic()),
+            "tokens_available": self.bucket.tokens if self.bucket else -1,
+            "avg_hold_seconds": self.avg_hold_seconds,
+        }
+
+
+async def client_key(request: Request) -> str:
+    """Who a request counts against: the signed-in user, else the client address."""
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() == "bearer" and token:
+        username = username_from_token(token)
+        if username:
+            return f"user:{username}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+# Global admission controller for the LLM-backed endpoints
+admission = AdmissionController()
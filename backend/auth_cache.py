@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import event, inspect
+
+from models import User
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Shared backend is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() != "false"
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+# With a shared backend, other workers' invalidations reach this process's local
+# copy only after this many seconds
+AUTH_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("AUTH_CACHE_LOCAL_TTL_SECONDS", "5"))
+AUTH_CACHE_REDIS_URL = os.getenv("AUTH_CACHE_REDIS_URL")
+
+USER_FIELDS = ("id", "email", "username", "created_at")
+
+
+class TTLCache:
+    """Thread-safe LRU dict whose entries also expire after a per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InMemoryBackend:
+    """Process-local user cache; the stand-in for the shared backend."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.cache = TTLCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self.cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict):
+        self.cache.set(key, value, self.ttl)
+
+    def invalidate(self, key: str):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self.cache), "hits": self.hits, "misses": self.misses}
+
+
+class RedisBackend:
+    """Redis-shared user cache with a short-lived local copy in front of it."""
+
+    def __init__(self, url: str, ttl: float, local_ttl: float, max_entries: int, prefix: str = "auth:user:"):
+        if redis is None:
+            raise RuntimeError("AUTH_CACHE_REDIS_URL is set but the redis package is not installed")
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.prefix = prefix
+        self.local = TTLCache(max_entries)
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._pending = set()
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        try:
+            raw = await self.client.get(self.prefix + key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Auth cache read failed: {e}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.shared_hits += 1
+        value = json.loads(raw)
+        self.local.set(key, value, self.local_ttl)
+        return value
+
+    async def set(self, key: str, value: dict):
+        self.local.set(key, value, self.local_ttl)
+        try:
+            await self.client.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Auth cache write failed: {e}")
+
+    async def _delete(self, key: str):
+        try:
+            await self.client.delete(self.prefix + key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Auth cache invalidation failed: {e}")
+
+    def invalidate(self, key: str):
+        # Called from ORM flush events (sync); the shared delete is scheduled on the loop
+        self.local.delete(key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.warning(f"Auth cache: no event loop, shared entry for {key!r} expires by TTL")
+            return
+        task = loop.create_task(self._delete(key))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "local_entries": len(self.local),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "hits": self.local_hits + self.shared_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+class AuthCache:
+    """
+    Caches verified JWTs (token -> username, never past the token's exp) and user
+    snapshots (username -> id/email/username/created_at) for get_current_user.
+    User rows changed or deleted through the ORM are invalidated by mapper events;
+    bulk query.update()/delete() bypasses them and relies on the TTL.
+    """
+
+    def __init__(self, enabled: bool = AUTH_CACHE_ENABLED, ttl: float = AUTH_CACHE_TTL_SECONDS,
+                 max_entries: int = AUTH_CACHE_MAX_ENTRIES, redis_url: Optional[str] = AUTH_CACHE_REDIS_URL):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.tokens = TTLCache(max_entries)
+        self.token_hits = 0
+        self.token_misses = 0
+        if redis_url:
+            self.users = RedisBackend(redis_url, ttl, AUTH_CACHE_LOCAL_TTL_SECONDS, max_entries)
+        else:
+            self.users = InMemoryBackend(ttl, max_entries)
+
+    def token_username(self, token: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        username = self.tokens.get(token)
+        if username is None:
+            self.token_misses += 1
+        else:
+            self.token_hits += 1
+        return username
+
+    def remember_token(self, token: str, username: str, exp: Optional[float]):
+        if not self.enabled:
+            return
+        ttl = self.ttl
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        self.tokens.set(token, username, ttl)
+
+    async def get_user(self, username: str) -> Optional[User]:
+        if not self.enabled:
+            return None
+        snapshot = await self.users.get(username)
+        if snapshot is None:
+            return None
+        fields = dict(snapshot)
+        if isinstance(fields.get("created_at"), str):
+            fields["created_at"] = datetime.fromisoformat(fields["created_at"])
+        # Transient (session-less) object: callers only read its columns
+        return User(**fields)
+
+    async def set_user(self, user: User):
+        if self.enabled:
+            await self.users.set(user.username, {field: getattr(user, field) for field in USER_FIELDS})
+
+    def invalidate_user(self, username: str):
+        self.users.invalidate(username)
+
+    def clear(self):
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self) -> dict:
+        users = self.users.stats()
+        token_total = self.token_hits + self.token_misses
+        user_total = users["hits"] + users["misses"]
+        return {
+            "enabled": self.enabled,
+            "tokens": {
+                "entries": len(self.tokens),
+                "hits": self.token_hits,
+                "misses": self.token_misses,
+                "hit_rate": self.token_hits / token_total if token_total else 0.0,
+            },
+            "users": {**users, "hit_rate": users["hits"] / user_total if user_total else 0.0},
+        }
+
+
+# Global auth cache instance
+auth_cache = AuthCache()
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_updated_user(mapper, connection, target):
+    history = inspect(target).attrs.username.history
+    for username in {target.username, *(history.deleted or ())}:
+        auth_cache.invalidate_user(username)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    auth_cache.invalidate_user(target.username)
@@ -0,0 +1,335 @@
+"""
+Reproducible load test for the API, without Gemini or gutenberg.org.
+
+The app runs in-process under uvicorn (in a thread) with:
+  - a deterministic fake chat model (fake_llm.py) with configurable latency/output size,
+  - a local HTTP stand-in serving Gutenberg-format fixture books (gutenberg_stub.py),
+  - a throwaway SQLite database (needs aiosqlite) or --database-url for a local Postgres,
+  - fresh extraction-cache and corpus directories, Databricks logging disabled.
+
+Each scenario is driven at every --concurrency level and reported as JSON:
+throughput, p50/p95/p99/max latency, status codes and process RSS.
+
+    python benchmarks/bench_api.py --concurrency 1,8,32 --requests 200 --out bench.json
+    python benchmarks/bench_api.py --scenarios analyze,auth_login --llm-latency-ms 50
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from gutenberg_stub import GutenbergStub, fixture_book  # noqa: E402
+
+SCENARIOS = [
+    "analyze", "analyze_gutenberg", "analyses_create", "analyses_get", "analyses_list",
+    "analyses_update", "analyses_patch", "analyses_delete", "auth_login", "predict",
+]
+PASSWORD = "benchmark-password"
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (server and load generator)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def configure_environment(args, workdir: str, stub: GutenbergStub):
+    """Must run before the app modules are imported (they read config at import time)."""
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "GUTENBERG_URL": stub.url_template,
+        "GUTENBERG_CORPUS_DIR": os.path.join(workdir, "corpus"),
+        "EXTRACTION_CACHE_PATH": os.path.join(workdir, "extraction_cache.sqlite3"),
+        "GOOGLE_API_KEY": "benchmark",
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "SECRET_KEY": "benchmark-secret",
+        # Empty (not unset) so load_dotenv() can't re-enable them from a local .env
+        "DATABRICKS_HOST": "",
+        "AUTH_CACHE_REDIS_URL": "",
+        "ASYNC_DATABASE_URL": "",
+    })
+    if args.no_admission:
+        # All benchmark traffic comes from one client, so per-client limits would shed most of it
+        os.environ["ADMISSION_ENABLED"] = "false"
+
+
+def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    # Signal handlers can only be installed from the main thread
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 60
+    while not server.started:
+        if not thread.is_alive() or time.time() > deadline:
+            raise RuntimeError("API server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def sample_graph(seed: int, size: int) -> dict:
+    nodes = [{"id": f"Character {seed}-{i}", "work": "Benchmark Saga", "size": 5 + i % 7} for i in range(size)]
+    links = [
+        {"source": nodes[i]["id"], "target": nodes[(i * 7 + 1) % size]["id"], "label": "ALLY_OF"}
+        for i in range(size) if (i * 7 + 1) % size != i
+    ]
+    return {"nodes": nodes, "links": links}
+
+
+async def run_scenario(name: str, op, requests: int, concurrency: int) -> dict:
+    """Run `requests` calls of op(i) with `concurrency` workers and summarise them."""
+    latencies = []
+    statuses = Counter()
+    indices = iter(range(requests))
+
+    async def worker():
+        for i in indices:
+            start = time.perf_counter()
+            try:
+                status = await op(i)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(count for status, count in statuses.items() if status.isdigit() and 200 <= int(status) < 300)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "errors": requests - ok,
+        "status_codes": dict(statuses),
+        "rss_mb": rss_mb(),
+    }
+
+
+async def run_benchmarks(args, base_url: str) -> list:
+    import httpx
+
+    results = []
+    unique = itertools.count()
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        response = await client.post("/auth/register", json={
+            "email": "bench@example.com", "username": "bench", "password": PASSWORD
+        })
+        if response.status_code not in (201, 400):
+            raise RuntimeError(f"Could not register benchmark user: {response.status_code} {response.text}")
+        response = await client.post("/auth/login", data={"username": "bench", "password": PASSWORD})
+        response.raise_for_status()
+        auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        created = []  # (id, version) of analyses made by analyses_create, consumed by later scenarios
+
+        async def analyze(i):
+            # Unique text per request so the extraction cache never short-circuits the pipeline
+            text = fixture_book(next(unique), args.text_chars)[:50000]
+            return (await client.post("/analyze", json={"text": text})).status_code
+
+        async def analyze_gutenberg(i):
+            book_id = 10_000 + next(unique)
+            response = await client.get(f"/analyze-gutenberg/{book_id}",
+                                        params={"limit_chars": args.gutenberg_limit_chars})
+            return response.status_code
+
+        async def analyses_create(i):
+            graph = sample_graph(next(unique), args.graph_nodes)
+            response = await client.post("/analyses", headers=auth, json={"name": f"Bench {i}", **graph})
+            if response.status_code == 201:
+                body = response.json()
+                created.append((body["id"], body.get("version", 1)))
+            return response.status_code
+
+        def target(i):
+            return created[i % len(created)] if created else ("missing", 1)
+
+        async def analyses_get(i):
+            return (await client.get(f"/analyses/{target(i)[0]}", headers=auth)).status_code
+
+        async def analyses_list(i):
+            return (await client.get("/analyses", headers=auth, params={"limit": 50})).status_code
+
+        async def analyses_update(i):
+            graph = sample_graph(next(unique), args.graph_nodes)
+            return (await client.put(f"/analyses/{target(i)[0]}", headers=auth, json=graph)).status_code
+
+        async def analyses_patch(i):
+            analysis_id, _ = target(i)
+            current = (await client.get(f"/analyses/{analysis_id}", headers=auth)).json()
+            node_id = current["nodes"][0]["id"] if current.get("nodes") else None
+            if node_id is None:
+                return 404
+            response = await client.patch(f"/analyses/{analysis_id}", headers=auth, json={
+                "base_version": current["version"],
+                "operations": [{"op": "replace", "path": f"/nodes/{node_id.replace('~', '~0').replace('/', '~1')}",
+                                "value": {"size": i % 40}}],
+            })
+            return response.status_code
+
+        async def analyses_delete(i):
+            if not created:
+                return "nothing_to_delete"
+            analysis_id, _ = created.pop()
+            return (await client.delete(f"/analyses/{analysis_id}", headers=auth)).status_code
+
+        async def auth_login(i):
+            response = await client.post("/auth/login", data={"username": "bench", "password": PASSWORD})
+            return response.status_code
+
+        async def predict(i):
+            response = await client.post("/predict/relationship-type", json={
+                "source_centrality": (i % 100) / 100,
+                "target_centrality": ((i * 7) % 100) / 100,
+                "source_name_length": 5 + i % 12,
+                "target_name_length": 4 + i % 9,
+                "same_work": i % 2,
+                "source_in_work": 1,
+            })
+            return response.status_code
+
+        operations = {
+            "analyze": analyze,
+            "analyze_gutenberg": analyze_gutenberg,
+            "analyses_create": analyses_create,
+            "analyses_get": analyses_get,
+            "analyses_list": analyses_list,
+            "analyses_update": analyses_update,
+            "analyses_patch": analyses_patch,
+            "analyses_delete": analyses_delete,
+            "auth_login": auth_login,
+            "predict": predict,
+        }
+        for concurrency in args.concurrency:
+            for name in args.scenarios:
+                requests = args.requests_per_scenario.get(name, args.requests)
+                result = await run_scenario(name, operations[name], requests, concurrency)
+                results.append(result)
+                print(f"{name:>18} c={concurrency:<4} {result['throughput_rps']:>9} rps  "
+                      f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                      f"errors {result['errors']}", file=sys.stderr)
+    return results
+
+
+def parse_overrides(value: str) -> dict:
+    """'analyze=20,auth_login=50' -> {'analyze': 20, 'auth_login': 50}"""
+    overrides = {}
+    for item in filter(None, value.split(",")):
+        name, count = item.split("=")
+        overrides[name] = int(count)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API against local stand-ins")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda value: [name for name in value.split(",") if name])
+    parser.add_argument("--concurrency", default="1,8,32", type=lambda value: [int(c) for c in value.split(",")])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and concurrency level")
+    parser.add_argument("--requests-per-scenario", default="analyze=20,analyze_gutenberg=10", type=parse_overrides,
+                        help="Per-scenario overrides, e.g. analyze=20,auth_login=50")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-nodes", type=int, default=12)
+    parser.add_argument("--llm-edges", type=int, default=16)
+    parser.add_argument("--text-chars", type=int, default=20_000, help="Size of /analyze texts (max 50k)")
+    parser.add_argument("--book-chars", type=int, default=200_000, help="Size of fixture Gutenberg books")
+    parser.add_argument("--gutenberg-limit-chars", type=int, default=60_000)
+    parser.add_argument("--graph-nodes", type=int, default=200, help="Nodes per saved analysis")
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--database-url", help="Sync SQLAlchemy URL of a local Postgres (default: temp SQLite)")
+    parser.add_argument("--no-admission", action="store_true",
+                        help="Disable admission control (otherwise excess load shows up as 429/503)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="mythinfo-bench-")
+    stub = GutenbergStub(book_chars=args.book_chars).start()
+    server = None
+    try:
+        configure_environment(args, workdir, stub)
+
+        from main import app
+        from llm import set_chat_model_factory
+        from fake_llm import fake_model_factory
+        set_chat_model_factory(fake_model_factory(args.llm_latency_ms, args.llm_nodes, args.llm_edges))
+
+        rss_before = rss_mb()
+        port = free_port()
+        server, _ = start_server(app, port)
+        results = asyncio.run(run_benchmarks(args, f"http://127.0.0.1:{port}"))
+
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("out", "database_url")},
+            "database": "postgresql" if args.database_url else "sqlite",
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "rss_mb_at_start": rss_before,
+            "rss_mb_at_end": rss_mb(),
+            "gutenberg_stub_requests": stub.requests,
+            "results": results,
+        }
+        output = json.dumps(report, indent=2)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+        else:
+            print(output)
+    finally:
+        if server is not None:
+            server.should_exit = True
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
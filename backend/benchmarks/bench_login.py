@@ -0,0 +1,103 @@
+"""
+Login throughput benchmark for password verification.
+
+Runs bursts of concurrent bcrypt verifications (the CPU part of /auth/login) through
+PasswordHasher pools of different sizes and reports throughput, latency and how long
+the event loop was stalled. Pool size 0 verifies inline on the event loop, which is
+how login behaved before hashing moved to a worker pool.
+
+    python benchmarks/bench_login.py --pool-sizes 0,1,2,4,8 --logins 200 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from password_hashing import PasswordHasher, make_context  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+async def _monitor_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Largest delay between when a 10ms sleep should wake up and when it did."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_burst(pool_size: int, rounds: int, logins: int, concurrency: int) -> dict:
+    context = make_context(rounds)
+    hashed = context.hash(PASSWORD)
+    hasher = PasswordHasher(workers=max(pool_size, 1), rounds=rounds, max_pending=concurrency)
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login():
+        async with gate:
+            start = time.perf_counter()
+            if pool_size == 0:
+                valid, _ = context.verify_and_update(PASSWORD, hashed)
+            else:
+                valid, _ = await hasher.verify_and_update(PASSWORD, hashed)
+            latencies.append(time.perf_counter() - start)
+            assert valid
+
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_monitor_loop_lag(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    max_lag = await monitor
+    hasher.shutdown()
+
+    latencies.sort()
+    return {
+        "pool_size": pool_size,
+        "rounds": rounds,
+        "logins": logins,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "max_event_loop_lag_ms": round(max_lag * 1000, 1),
+    }
+
+
+async def main(args):
+    results = []
+    for pool_size in args.pool_sizes:
+        results.append(await run_burst(pool_size, args.rounds, args.logins, args.concurrency))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark login (bcrypt verify) throughput per pool size")
+    parser.add_argument("--pool-sizes", default="0,1,2,4,8",
+                        type=lambda value: [int(size) for size in value.split(",")])
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON instead of a table")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"bcrypt rounds={args.rounds}, {args.logins} logins, concurrency {args.concurrency}")
+        print(f"{'pool':>5} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'loop lag ms':>12}")
+        for result in results:
+            pool = "inline" if result["pool_size"] == 0 else result["pool_size"]
+            print(f"{pool:>5} {result['logins_per_second']:>10} {result['p50_ms']:>9} "
+                  f"{result['p95_ms']:>9} {result['max_event_loop_lag_ms']:>12}")
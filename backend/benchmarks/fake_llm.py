@@ -0,0 +1,98 @@
+"""
+Deterministic stand-in for the Gemini chat model.
+
+Answers the extraction prompt with a knowledge graph built from the capitalised
+words of the prompt's text (padded with generated names up to `nodes`), and the
+dossier prompt with a fixed-shape dossier. Latency and output size are configurable;
+token usage is reported through usage_metadata like the real model.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+LABELS = ["ALLY_OF", "ENEMY_OF", "SIBLING_OF", "MENTOR_OF", "SERVES", "LOVES", "RIVAL_OF"]
+NAME_PATTERN = re.compile(r"\b[A-Z][a-z]{2,}\b")
+
+
+def _stable_int(value: str) -> int:
+    return int(hashlib.sha256(value.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class FakeChatModel(BaseChatModel):
+    latency_ms: float = 200.0
+    nodes: int = 12
+    edges: int = 16
+    work: str = "Benchmark Saga"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _extraction(self, text: str) -> dict:
+        names: List[str] = []
+        for name in NAME_PATTERN.findall(text):
+            if name not in names:
+                names.append(name)
+            if len(names) >= self.nodes:
+                break
+        while len(names) < self.nodes:
+            names.append(f"Character {len(names) + 1}")
+
+        seed = _stable_int(text)
+        edges = []
+        for i in range(min(self.edges, len(names) * (len(names) - 1))):
+            # Offset in [1, n-1], so source and target always differ
+            source = names[i % len(names)]
+            target = names[(i + 1 + (seed + i) % (len(names) - 1)) % len(names)]
+            edges.append({
+                "source": source,
+                "target": target,
+                "label": LABELS[(seed + i) % len(LABELS)],
+                "source_work": self.work,
+            })
+        return {
+            "nodes": [{"id": name, "source_work": self.work} for name in names],
+            "edges": edges,
+        }
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = str(messages[-1].content)
+        if "dossier" in prompt.lower():
+            match = re.search(r'character "([^"]+)"', prompt)
+            name = match.group(1) if match else "Unknown"
+            payload = {"name": name, "biography": f"{name} is a benchmark fixture.", "notable_events": ["Loaded"]}
+        else:
+            text = prompt.split("Text:", 1)[-1]
+            payload = self._extraction(text)
+        content = json.dumps(payload)
+        usage = {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": len(prompt) // 4 + len(content) // 4,
+        }
+        message = AIMessage(content=content, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+
+def fake_model_factory(latency_ms: float, nodes: int, edges: int):
+    """A factory for llm.set_chat_model_factory that returns FakeChatModel instances."""
+    def factory(api_key: str, max_output_tokens: Optional[int] = None) -> FakeChatModel:
+        return FakeChatModel(latency_ms=latency_ms, nodes=nodes, edges=edges)
+    return factory
@@ -0,0 +1,98 @@
+"""
+Local stand-in for gutenberg.org serving generated, Gutenberg-format fixture books
+at /cache/epub/<id>/pg<id>.txt (same path layout as scraper.GUTENBERG_URL).
+
+Books are generated deterministically from the book ID: a header, a "*** START OF
+THE PROJECT GUTENBERG EBOOK" marker, chapters of paragraphs mentioning a cast of
+named characters, and the matching END marker and licence footer.
+"""
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAST = [
+    "Alaric", "Brienne", "Cedric", "Delphine", "Edmund", "Fiora", "Gideon", "Helena",
+    "Isolde", "Jasper", "Katrin", "Leopold", "Marisol", "Nathaniel", "Ophelia", "Percival",
+    "Quintus", "Rosalind", "Sebastian", "Theodora", "Ulric", "Vivienne", "Wendell", "Yvaine",
+]
+VERBS = ["trusted", "betrayed", "followed", "feared", "rescued", "argued with", "wrote to", "married"]
+BOOK_PATH = re.compile(r"^/cache/epub/(\d+)/pg(\d+)\.txt$")
+
+
+def fixture_book(book_id: int, chars: int) -> str:
+    rng = random.Random(book_id)
+    cast = rng.sample(CAST, k=min(len(CAST), 8 + book_id % 8))
+    parts = [
+        f"The Project Gutenberg eBook of Benchmark Volume {book_id}\n\n",
+        "This eBook is for the use of anyone anywhere.\n\n",
+        f"*** START OF THE PROJECT GUTENBERG EBOOK BENCHMARK VOLUME {book_id} ***\n\n",
+    ]
+    size = 0
+    chapter = 0
+    while size < chars:
+        chapter += 1
+        heading = f"CHAPTER {chapter}\n\n"
+        parts.append(heading)
+        size += len(heading)
+        for _ in range(rng.randint(4, 9)):
+            sentences = []
+            for _ in range(rng.randint(3, 6)):
+                a, b = rng.sample(cast, 2)
+                sentences.append(f"{a} {rng.choice(VERBS)} {b} beneath the grey towers.")
+            paragraph = " ".join(sentences) + "\n\n"
+            parts.append(paragraph)
+            size += len(paragraph)
+    parts.append(f"*** END OF THE PROJECT GUTENBERG EBOOK BENCHMARK VOLUME {book_id} ***\n\n")
+    parts.append("Updated editions will replace the previous one.\n")
+    return "".join(parts)
+
+
+class GutenbergStub:
+    """Threaded HTTP server for fixture books; `url_template` plugs into GUTENBERG_URL."""
+
+    def __init__(self, book_chars: int = 200_000, host: str = "127.0.0.1", port: int = 0):
+        self.book_chars = book_chars
+        self.requests = 0
+        self._books = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = BOOK_PATH.match(self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                body = stub.book(int(match.group(1))).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def book(self, book_id: int) -> str:
+        with self._lock:
+            self.requests += 1
+            if book_id not in self._books:
+                self._books[book_id] = fixture_book(book_id, self.book_chars)
+            return self._books[book_id]
+
+    @property
+    def url_template(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/cache/epub/{{book_id}}/pg{{book_id}}.txt"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
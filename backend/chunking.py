@@ -0,0 +1,89 @@
+import re
+from typing import List
+
+# Lines that open a new chapter/section in Gutenberg-style plain text
+CHAPTER_HEADING = re.compile(
+    r"^\s*(CHAPTER|Chapter|BOOK|Book|PART|Part|ACT|Act|LETTER|Letter|STAVE|Stave)\b[^\n]*$"
+)
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def _split_paragraphs(text: str) -> List[str]:
+    """Split text on blank lines, dropping empty paragraphs."""
+    return [p.strip() for p in PARAGRAPH_BREAK.split(text) if p.strip()]
+
+
+def _hard_split(paragraph: str, max_chars: int) -> List[str]:
+    """Split a paragraph that is longer than a whole chunk on sentence/word boundaries."""
+    pieces = []
+    while len(paragraph) > max_chars:
+        cut = paragraph.rfind(". ", 0, max_chars)
+        if cut == -1:
+            cut = paragraph.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        else:
+            cut += 1
+        pieces.append(paragraph[:cut].strip())
+        paragraph = paragraph[cut:].strip()
+    if paragraph:
+        pieces.append(paragraph)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int = 12000, overlap_chars: int = 1000) -> List[str]:
+    """
+    Split text into overlapping chunks that respect chapter and paragraph boundaries.
+
+    Paragraphs are packed greedily up to max_chars. A chapter heading closes the
+    current chunk once it is at least half full, so chunks tend to line up with
+    chapters. Each new chunk starts with the trailing paragraphs of the previous
+    one (up to overlap_chars) so relationships spanning a boundary are not lost.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if len(text) <= max_chars:
+        return [text]
+
+    paragraphs = []
+    for paragraph in _split_paragraphs(text):
+        paragraphs.extend(_hard_split(paragraph, max_chars))
+
+    chunks = []
+    current: List[str] = []
+    current_len = 0
+    fresh = 0  # paragraphs in current that were not carried over
+
+    def flush():
+        nonlocal current, current_len, fresh
+        chunks.append("\n\n".join(current))
+        # Carry the tail of this chunk over as context for the next one
+        carried: List[str] = []
+        carried_len = 0
+        for paragraph in reversed(current):
+            if carried_len + len(paragraph) > overlap_chars:
+                break
+            carried.insert(0, paragraph)
+            carried_len += len(paragraph) + 2
+        current, current_len, fresh = carried, carried_len, 0
+
+    for paragraph in paragraphs:
+        starts_chapter = bool(CHAPTER_HEADING.match(paragraph.split("\n", 1)[0]))
+        if fresh and starts_chapter and current_len >= max_chars // 2:
+            flush()
+            # Don't drag the end of the previous chapter into a new one
+            current, current_len = [], 0
+        elif current_len + len(paragraph) > max_chars:
+            if fresh:
+                flush()
+            if current_len + len(paragraph) > max_chars:
+                current, current_len = [], 0
+        current.append(paragraph)
+        current_len += len(paragraph) + 2
+        fresh += 1
+
+    if fresh:
+        chunks.append("\n\n".join(current))
+
+    return chunks
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, single-process use only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_DIR = os.path.join(current_dir, "corpus")
+
+BOOK_ID_PATTERN = re.compile(r"^\d+$")
+
+
+class CorpusStore:
+    """
+    On-disk store of stripped Gutenberg texts.
+
+    Each book is kept gzip-compressed under books/<id>.txt.gz and described in
+    index.json (checksum, size, fetch time and the ETag/Last-Modified headers
+    needed for conditional re-validation). Several processes may share the
+    store: index updates re-read and merge the file under a lock file.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or DEFAULT_CORPUS_DIR
+        self.books_dir = os.path.join(self.root, "books")
+        self.index_path = os.path.join(self.root, "index.json")
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, dict]] = None
+        self._index_mtime = None
+
+    @staticmethod
+    def valid_id(book_id) -> bool:
+        return bool(BOOK_ID_PATTERN.match(str(book_id)))
+
+    def _book_path(self, book_id: str) -> str:
+        return os.path.join(self.books_dir, f"{book_id}.txt.gz")
+
+    def _load_index(self) -> Dict[str, dict]:
+        """The index, re-read whenever another process has replaced the file."""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._index is None or mtime != self._index_mtime:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+            except Exception as e:
+                logger.error(f"Corpus index unreadable, starting empty: {e}")
+                self._index = {}
+            self._index_mtime = mtime
+        return self._index
+
+    @contextmanager
+    def _index_file_lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(f"{self.index_path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _update_index(self, book_id: str, update: Callable[[Optional[dict]], Optional[dict]]):
+        """Apply update to one entry against the latest index on disk and save it."""
+        with self._lock, self._index_file_lock():
+            self._index = None  # mtimes can be coarse; always merge against the file
+            index = self._load_index()
+            entry = update(index.get(book_id))
+            if entry is None:
+                return
+            index[book_id] = entry
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.index_path)
+            self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def entry(self, book_id: str) -> Optional[dict]:
+        """Index metadata for a book, or None if it is not stored."""
+        if not self.valid_id(book_id):
+            return None
+        with self._lock:
+            entry = self._load_index().get(str(book_id))
+            return dict(entry) if entry else None
+
+    def get(self, book_id: str) -> Optional[str]:
+        """Return the stored text for a book, or None if it is missing or corrupt."""
+        entry = self.entry(book_id)
+        if entry is None:
+            return None
+        try:
+            with gzip.open(self._book_path(book_id), "rt", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            logger.warning(f"Corpus file for book {book_id} unreadable: {e}")
+            return None
+        if hashlib.sha256(text.encode("utf-8")).hexdigest() != entry.get("sha256"):
+            logger.warning(f"Corpus checksum mismatch for book {book_id}, ignoring stored copy")
+            return None
+        return text
+
+    def put(self, book_id: str, text: str, etag: str = None,
+            last_modified: str = None, source_url: str = None):
+        """Compress and store a book's stripped text, then update the index."""
+        if not self.valid_id(book_id):
+            raise ValueError(f"Invalid Gutenberg book id: {book_id!r}")
+        book_id = str(book_id)
+        os.makedirs(self.books_dir, exist_ok=True)
+        path = self._book_path(book_id)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        entry = {
+            "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "chars": len(text),
+            "compressed_bytes": os.path.getsize(path),
+            "etag": etag,
+            "last_modified": last_modified,
+            "source_url": source_url,
+            "fetched_at": now,
+            "validated_at": now,
+        }
+        self._update_index(book_id, lambda _: entry)
+
+    def touch(self, book_id: str):
+        """Record that the stored copy was re-validated against the origin (HTTP 304)."""
+        def validated(entry):
+            return dict(entry, validated_at=time.time()) if entry else None
+        self._update_index(str(book_id), validated)
+
+    def conditional_headers(self, book_id: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for re-validating a stored book."""
+        entry = self.entry(book_id) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def needs_revalidation(self, book_id: str, max_age_seconds: int) -> bool:
+        """True when the stored copy is older than max_age_seconds (0 disables re-validation)."""
+        if not max_age_seconds:
+            return False
+        entry = self.entry(book_id)
+        return entry is None or time.time() - entry.get("validated_at", 0) > max_age_seconds
+
+    def book_ids(self) -> Iterable[str]:
+        with self._lock:
+            return sorted(self._load_index().keys(), key=int)
+
+
+# Global corpus store (point GUTENBERG_CORPUS_DIR at a fixture corpus to run offline)
+corpus_store = CorpusStore(os.getenv("GUTENBERG_CORPUS_DIR"))
+
+
+def prewarm(book_ids: Iterable[str], revalidate: bool = False) -> Dict[str, str]:
+    """Fetch a list of books into the corpus store. Returns a status per book ID."""
+    # Go through scraper's store instance so this also works when run as __main__
+    from http_client import close_client
+    from scraper import async_get_gutenberg_book, corpus_store as store
+
+    async def fetch_all():
+        statuses = {}
+        try:
+            for book_id in book_ids:
+                cached = store.entry(book_id) is not None
+                text = await async_get_gutenberg_book(book_id, revalidate=revalidate)
+                if text.startswith("Gutenberg Error"):
+                    statuses[book_id] = text
+                else:
+                    statuses[book_id] = "cached" if cached and not revalidate else "stored"
+        finally:
+            await close_client()
+        return statuses
+
+    return asyncio.run(fetch_all())
+
+
+def import_files(paths: Iterable[str]) -> Dict[str, str]:
+    """Import local plain-text fixtures named <id>.txt or pg<id>.txt into the store."""
+    from scraper import strip_gutenberg_boilerplate, corpus_store as store
+
+    statuses = {}
+    for path in paths:
+        match = re.match(r"^(?:pg)?(\d+)\.txt$", os.path.basename(path))
+        if not match:
+            statuses[path] = "skipped: file name must be <id>.txt or pg<id>.txt"
+            continue
+        with open(path, "r", encoding="utf-8-sig") as f:
+            store.put(match.group(1), strip_gutenberg_boilerplate(f.read()), source_url=path)
+        statuses[path] = f"stored as {match.group(1)}"
+    return statuses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local Gutenberg corpus store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prewarm_parser = subparsers.add_parser("prewarm", help="Download books into the store")
+    prewarm_parser.add_argument("book_ids", nargs="+")
+    prewarm_parser.add_argument("--revalidate", action="store_true",
+                                help="Re-check stored books against gutenberg.org")
+
+    import_parser = subparsers.add_parser("import", help="Import local fixture .txt files")
+    import_parser.add_argument("paths", nargs="+")
+
+    subparsers.add_parser("list", help="List stored books")
+
+    args = parser.parse_args()
+    if args.command == "prewarm":
+        results = prewarm(args.book_ids, revalidate=args.revalidate)
+    elif args.command == "import":
+        results = import_files(args.paths)
+    else:
+        from scraper import corpus_store as store
+        results = {book_id: store.entry(book_id) for book_id in store.book_ids()}
+    for key, value in results.items():
+        print(f"{key}: {value}")
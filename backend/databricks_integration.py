@@ -1,31 +1,173 @@
 from databricks.sql import connect
 import os
 from datetime import datetime
+import queue
 import threading
+import time
 import logging
+from contextlib import contextmanager
+
+from databricks_outbox import Outbox, OutboxFull
+from graph_utils import endpoint_id
+from instrumentation import timed, observe_payload
 
 logger = logging.getLogger(__name__)
 
-class DatabricksClient:
-    def __init__(self):
-        self.conn = None
-        self.catalog = os.getenv("DATABRICKS_CATALOG")
-        self.schema = os.getenv("DATABRICKS_SCHEMA")
-        self._lock = threading.Lock()
+# Analyses coalesced into one write, and rows per multi-row INSERT statement
+BATCH_ANALYSES = int(os.getenv("DATABRICKS_BATCH_ANALYSES", "50"))
+ROWS_PER_INSERT = int(os.getenv("DATABRICKS_ROWS_PER_INSERT", "500"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("DATABRICKS_FLUSH_INTERVAL_SECONDS", "2"))
+MAX_BACKOFF_SECONDS = float(os.getenv("DATABRICKS_MAX_BACKOFF_SECONDS", "300"))
+# A row that fails on its own this many times is moved to the outbox's dead_letter table
+MAX_ATTEMPTS = int(os.getenv("DATABRICKS_MAX_ATTEMPTS", "8"))
+POOL_SIZE = int(os.getenv("DATABRICKS_POOL_SIZE", "2"))
+WRITERS = int(os.getenv("DATABRICKS_WRITERS", str(POOL_SIZE)))
+
+CHARACTER_COLUMNS = ("analysis_id", "id", "name", "work_source", "description", "degree_centrality", "created_at")
+RELATIONSHIP_COLUMNS = ("analysis_id", "source_id", "target_id", "relationship_type", "work_source", "created_at")
+ANALYSIS_COLUMNS = ("analysis_id", "user_id", "name", "total_characters", "total_relationships", "created_at")
+
+
+class DatabricksUnavailable(Exception):
+    """No connection could be checked out: the failure says nothing about the payloads."""
+
 
-    def _connect(self):
-        """Lazy connection initialization"""
-        if self.conn is None:
+class DatabricksConnectionPool:
+    """
+    Small pool of Databricks SQL connections.
+
+    Connections run USE CATALOG/USE SCHEMA once when they are opened. Idle ones are
+    pinged before reuse once they have been idle for health_check_after seconds and
+    closed after recycle_after seconds; a connection that fails during use is
+    discarded, so the next checkout transparently reconnects.
+    """
+
+    def __init__(self, size: int = 2, health_check_after: float = 30.0, recycle_after: float = 600.0,
+                 catalog: str = None, schema: str = None):
+        self.size = size
+        self.health_check_after = health_check_after
+        self.recycle_after = recycle_after
+        self.catalog = catalog
+        self.schema = schema
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        conn = connect(
+            server_hostname=os.getenv("DATABRICKS_HOST"),
+            http_path=os.getenv("DATABRICKS_HTTP_PATH"),
+            personal_access_token=os.getenv("DATABRICKS_TOKEN")
+        )
+        if self.catalog and self.schema:
+            cursor = conn.cursor()
             try:
-                self.conn = connect(
-                    server_hostname=os.getenv("DATABRICKS_HOST"),
-                    http_path=os.getenv("DATABRICKS_HTTP_PATH"),
-                    personal_access_token=os.getenv("DATABRICKS_TOKEN")
-                )
-                logger.info("✓ Databricks connection established")
+                # Set catalog and schema explicitly
+                cursor.execute(f"USE CATALOG {self.catalog}")
+                cursor.execute(f"USE SCHEMA {self.schema}")
+            finally:
+                cursor.close()
+        logger.info("✓ Databricks connection established")
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.recycle_after:
+                self._close(conn)
+            elif idle_for > self.health_check_after and not self._is_alive(conn):
+                logger.warning("Discarding dead Databricks connection")
+                self._close(conn)
+            else:
+                return conn
+
+    @contextmanager
+    def connection(self, timeout: float = 30.0):
+        """Borrow a connection; it goes back to the pool unless the caller raised."""
+        if not self._slots.acquire(timeout=timeout):
+            raise DatabricksUnavailable("Timed out waiting for a Databricks connection")
+        try:
+            try:
+                conn = self._checkout()
             except Exception as e:
-                logger.error(f"Failed to connect to Databricks: {e}")
-                self.conn = None
+                raise DatabricksUnavailable(f"Could not connect to Databricks: {e}") from e
+            try:
+                yield conn
+            except Exception:
+                self._close(conn)
+                raise
+            self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": self._idle.qsize()}
+
+
+class DatabricksClient:
+    """
+    Logs saved analyses to Databricks through a durable local outbox.
+
+    log_analysis persists the payload to the outbox before returning (call it
+    through asyncio.to_thread from async code); background writers (one per
+    pooled connection) drain the outbox in parallel, coalescing many analyses
+    into multi-row INSERTs and retrying with backoff. Failed batches are split
+    so a payload Databricks rejects is isolated and eventually dead-lettered.
+    """
+
+    def __init__(self, outbox: Outbox = None):
+        self.catalog = os.getenv("DATABRICKS_CATALOG")
+        self.schema = os.getenv("DATABRICKS_SCHEMA")
+        self.enabled = bool(os.getenv("DATABRICKS_HOST"))
+        self.outbox = outbox
+        if self.outbox is None and self.enabled:
+            self.outbox = Outbox(
+                path=os.getenv("DATABRICKS_OUTBOX_PATH"),
+                max_rows=int(os.getenv("DATABRICKS_OUTBOX_MAX_ROWS", "10000"))
+            )
+        self.pool = DatabricksConnectionPool(
+            size=POOL_SIZE,
+            health_check_after=float(os.getenv("DATABRICKS_POOL_HEALTHCHECK_SECONDS", "30")),
+            recycle_after=float(os.getenv("DATABRICKS_POOL_RECYCLE_SECONDS", "600")),
+            catalog=self.catalog,
+            schema=self.schema
+        )
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._writers = []
+        self.dropped_total = 0
 
     def _table_name(self, table: str) -> str:
         if self.catalog and self.schema:
@@ -33,98 +175,228 @@ class DatabricksClient:
         if self.schema:
             return f"{self.schema}.{table}"
         return table
-    
-    def _insert_data(self, analysis_id: str, user_id: str, nodes: list, links: list):
-        """Internal method to insert data (runs in background thread)"""
-        try:
-            if not self.conn:
-                self._connect()
-            if not self.conn:
-                logger.warning("Databricks connection not available, skipping logging")
-                return
 
-            with self._lock:
-                cursor = self.conn.cursor()
-                
-                # Set catalog and schema explicitly
-                if self.catalog and self.schema:
-                    cursor.execute(f"USE CATALOG {self.catalog}")
-                    cursor.execute(f"USE SCHEMA {self.schema}")
-                
-                # Insert characters
-                for node in nodes:
-                    table_name = self._table_name("lore_characters")
-                    values = (
-                        analysis_id,
-                        node.get('id'),
-                        node.get('name') or node.get('id'),
-                        node.get('work'),
-                        node.get('description', ''),
-                        node.get('size', 0),
-                        datetime.utcnow()
-                    )
-                    cursor.execute(
-                        f"""INSERT INTO {table_name} 
-                        (analysis_id, id, name, work_source, description, degree_centrality, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                        values
-                    )
-                
-                # Insert relationships
-                for link in links:
-                    table_name = self._table_name("lore_relationships")
-                    
-                    # Extract source and target IDs (handle case where they might be objects)
-                    source = link.get('source')
-                    target = link.get('target')
-                    
-                    if isinstance(source, dict):
-                        source = source.get('id')
-                    if isinstance(target, dict):
-                        target = target.get('id')
-                    
-                    cursor.execute(
-                        f"""INSERT INTO {table_name}
-                        (analysis_id, source_id, target_id, relationship_type, work_source, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?)""",
-                        (
-                            analysis_id,
-                            source,
-                            target,
-                            link.get('label', 'related'),
-                            'multi-work',
-                            datetime.utcnow()
-                        )
-                    )
-                
-                # Log analysis metadata
-                table_name = self._table_name("lore_analyses")
-                cursor.execute(
-                    f"""INSERT INTO {table_name}
-                    (analysis_id, user_id, name, total_characters, total_relationships, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (
-                        analysis_id,
-                        user_id,
-                        f"Analysis {datetime.utcnow().strftime('%Y-%m-%d')}",
-                        len(nodes),
-                        len(links),
-                        datetime.utcnow()
-                    )
-                )
-                
+    def _delete_analyses(self, cursor, table: str, analysis_ids: list):
+        """Remove rows a previous, partially failed attempt already wrote for these analyses."""
+        table_name = self._table_name(table)
+        for start in range(0, len(analysis_ids), ROWS_PER_INSERT):
+            chunk = analysis_ids[start:start + ROWS_PER_INSERT]
+            cursor.execute(
+                f"DELETE FROM {table_name} WHERE analysis_id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+
+    def _insert_many(self, cursor, table: str, columns: tuple, rows: list):
+        """Insert rows with multi-row INSERT statements of at most ROWS_PER_INSERT rows."""
+        table_name = self._table_name(table)
+        placeholders = "(" + ", ".join("?" for _ in columns) + ")"
+        for start in range(0, len(rows), ROWS_PER_INSERT):
+            chunk = rows[start:start + ROWS_PER_INSERT]
+            cursor.execute(
+                f"""INSERT INTO {table_name}
+                ({", ".join(columns)})
+                VALUES {", ".join([placeholders] * len(chunk))}""",
+                [value for row in chunk for value in row]
+            )
+
+    @timed("databricks_insert")
+    def _insert_data(self, payloads: list, redelivered: list = ()):
+        """
+        Write a batch of outbox payloads. Raises on failure so the batch is retried.
+
+        redelivered lists analyses whose outbox rows were claimed before: an earlier
+        attempt may have written some of their rows (failed halfway, or the lease
+        expired after a crash), so those are deleted first and replaced instead of
+        duplicated. First deliveries skip the DELETEs, which rewrite Delta files.
+        """
+        characters, relationships, analyses = [], [], []
+        for payload in payloads:
+            analysis_id = payload['analysis_id']
+            created_at = datetime.fromisoformat(payload['logged_at'])
+            for node in payload['nodes']:
+                characters.append((
+                    analysis_id,
+                    node.get('id'),
+                    node.get('name') or node.get('id'),
+                    node.get('work'),
+                    node.get('description', ''),
+                    node.get('size', 0),
+                    created_at
+                ))
+            for link in payload['links']:
+                relationships.append((
+                    analysis_id,
+                    link.get('source'),
+                    link.get('target'),
+                    link.get('label', 'related'),
+                    'multi-work',
+                    created_at
+                ))
+            analyses.append((
+                analysis_id,
+                payload['user_id'],
+                f"Analysis {created_at.strftime('%Y-%m-%d')}",
+                len(payload['nodes']),
+                len(payload['links']),
+                created_at
+            ))
+
+        observe_payload("databricks_rows", len(characters) + len(relationships) + len(analyses))
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                redelivered = list(dict.fromkeys(redelivered))
+                for table, columns, rows in (
+                    ("lore_characters", CHARACTER_COLUMNS, characters),
+                    ("lore_relationships", RELATIONSHIP_COLUMNS, relationships),
+                    ("lore_analyses", ANALYSIS_COLUMNS, analyses),
+                ):
+                    if redelivered:
+                        self._delete_analyses(cursor, table, redelivered)
+                    self._insert_many(cursor, table, columns, rows)
+            finally:
                 cursor.close()
-                logger.info(f"✓ Analysis {analysis_id} logged to Databricks")
+        logger.info(f"✓ {len(payloads)} analyses logged to Databricks "
+                    f"({len(characters)} characters, {len(relationships)} relationships)")
+
+    def _drain_once(self) -> int:
+        """Write one batch from the outbox. Returns how many analyses were written."""
+        claimed = self.outbox.claim(BATCH_ANALYSES)
+        if not claimed:
+            return 0
+        return self._deliver(claimed)
+
+    def _deliver(self, claimed: list, retried: bool = False) -> int:
+        """
+        Write claimed rows, bisecting a failed batch so one bad payload doesn't hold
+        back the rest. A single row that keeps failing is dead-lettered after
+        MAX_ATTEMPTS; when Databricks is unreachable the whole batch is retried later.
+        """
+        ids = [row_id for row_id, _, _ in claimed]
+        try:
+            self._insert_data(
+                [payload for _, payload, _ in claimed],
+                # A sub-batch of a failed batch may have been partly written by that attempt
+                redelivered=[payload['analysis_id'] for _, payload, attempts in claimed if attempts or retried]
+            )
+        except DatabricksUnavailable as e:
+            self._retry_later(claimed, e)
+            return 0
         except Exception as e:
-            logger.error(f"Failed to insert data to Databricks: {e}")
+            if len(claimed) > 1:
+                middle = len(claimed) // 2
+                logger.warning(f"Databricks write of {len(claimed)} analyses failed, splitting the batch: {e}")
+                return self._deliver(claimed[:middle], retried=True) + self._deliver(claimed[middle:], retried=True)
+            row_id, payload, attempts = claimed[0]
+            if attempts + 1 >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on Databricks log for analysis {payload['analysis_id']} "
+                             f"after {attempts + 1} attempts, moved to dead letter: {e}")
+                self.outbox.dead_letter(ids, str(e))
+            else:
+                self._retry_later(claimed, e)
+            return 0
+        self.outbox.ack(ids)
+        return len(ids)
+
+    def _retry_later(self, claimed: list, error: Exception):
+        attempts = max(attempts for _, _, attempts in claimed)
+        delay = min(MAX_BACKOFF_SECONDS, 2 ** attempts)
+        logger.error(f"Failed to insert data to Databricks, retrying in {delay:.0f}s: {error}")
+        self.outbox.nack([row_id for row_id, _, _ in claimed], delay)
+
+    def _writer_loop(self):
+        while not self._stopping.is_set():
+            if self._drain_once() == 0:
+                self._wake.wait(FLUSH_INTERVAL_SECONDS)
+                self._wake.clear()
+
+    def start(self):
+        """Start the background writers (also drains rows left over from a previous run)."""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            if any(writer.is_alive() for writer in self._writers):
+                return
+            self._stopping.clear()
+            # One writer per pooled connection; outbox leases keep their batches disjoint
+            self._writers = [
+                threading.Thread(target=self._writer_loop, name=f"databricks-writer-{i}", daemon=True)
+                for i in range(WRITERS)
+            ]
+            for writer in self._writers:
+                writer.start()
+
+    def stop(self, flush_timeout: float = 10.0):
+        """Stop the writers, first flushing whatever can be written within flush_timeout."""
+        if not self._writers:
+            return
+        deadline = time.monotonic() + flush_timeout
+        self._stopping.set()
+        self._wake.set()
+        for writer in self._writers:
+            writer.join(timeout=max(0.0, deadline - time.monotonic()))
+        while time.monotonic() < deadline and self._drain_once() > 0:
+            pass
+        remaining = self.outbox.depth()
+        if remaining:
+            logger.warning(f"{remaining} analyses left in the Databricks outbox; they will be sent on next start")
+        self.pool.close_all()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "dropped": self.dropped_total,
+            "outbox_depth": self.outbox.depth() if self.outbox is not None else 0,
+            "dead_letter_depth": self.outbox.dead_letter_depth() if self.outbox is not None else 0,
+            "pool": self.pool.stats(),
+        }
 
     def log_analysis(self, analysis_id: str, user_id: str, nodes: list, links: list):
-        """Log analysis to Databricks asynchronously (non-blocking)"""
-        # Run in background thread so it doesn't block the API response
-        thread = threading.Thread(
-            target=self._insert_data,
-            args=(analysis_id, user_id, nodes, links),
-            daemon=True
-        )
-        thread.start()
-        logger.info(f"Background task started to log analysis {analysis_id}")
\ No newline at end of file
+        """Persist an analysis to the outbox for the background writers (blocking disk I/O)"""
+        if not self.enabled:
+            return
+        payload = {
+            "analysis_id": analysis_id,
+            "user_id": user_id,
+            "logged_at": datetime.utcnow().isoformat(),
+            "nodes": [
+                {
+                    "id": node.get('id'),
+                    "name": node.get('name'),
+                    "work": node.get('work'),
+                    "description": node.get('description', ''),
+                    "size": node.get('size', 0),
+                }
+                for node in nodes
+            ],
+            "links": [
+                {
+                    "source": endpoint_id(link.get('source')),
+                    "target": endpoint_id(link.get('target')),
+                    "label": link.get('label', 'related'),
+                }
+                for link in links
+            ],
+        }
+        try:
+            self.outbox.enqueue(payload)
+        except OutboxFull as e:
+            self.dropped_total += 1
+            logger.error(f"Dropping Databricks log for analysis {analysis_id}: {e}")
+            return
+        self.start()
+        self._wake.set()
+        logger.info(f"Analysis {analysis_id} queued for Databricks")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_databricks_client() -> DatabricksClient:
+    """Process-wide client, so there is exactly one outbox writer per worker."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DatabricksClient()
+        return _client
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTBOX_PATH = os.path.join(current_dir, "cache", "databricks_outbox.sqlite3")
+
+
+class OutboxFull(Exception):
+    pass
+
+
+class Outbox:
+    """
+    Durable, bounded local queue of analyses waiting to be written to Databricks.
+
+    Rows are claimed with a lease instead of being removed, so a crash between
+    claim and ack only delays delivery: the lease expires and the row is retried.
+    Every claim counts as a delivery attempt, so the consumer can tell first
+    deliveries (nothing written yet) from retries that may have partially landed.
+    The file may be shared by several worker processes; claims run inside
+    BEGIN IMMEDIATE so two processes never lease the same rows. Rows that keep
+    failing on their own are moved to the dead_letter table for inspection.
+    """
+
+    def __init__(self, path: str = None, max_rows: int = 10000):
+        self.path = path or DEFAULT_OUTBOX_PATH
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly (see _transaction)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                lease_until REAL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL,
+                error TEXT
+            )"""
+        )
+        # Running row count, so enqueue doesn't scan the table every time
+        self._count = self._count_rows()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding SQLite's RESERVED lock from the start."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _count_rows(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()
+        return count
+
+    def enqueue(self, payload: dict):
+        """Persist a payload. Raises OutboxFull when max_rows are already waiting."""
+        self.enqueue_many([payload])
+
+    def enqueue_many(self, payloads: List[dict]):
+        """
+        Persist payloads in one transaction (one fsync). Payloads beyond max_rows are
+        dropped and reported with OutboxFull after the others are stored.
+        """
+        now = time.time()
+        with self._lock:
+            if self._count + len(payloads) > self.max_rows:
+                # Other processes sharing the file may have drained it; recount before refusing
+                self._count = self._count_rows()
+            accepted = payloads[:max(0, self.max_rows - self._count)]
+            if accepted:
+                with self._transaction():
+                    self._conn.executemany(
+                        "INSERT INTO outbox (payload, enqueued_at, next_attempt_at) VALUES (?, ?, ?)",
+                        [(json.dumps(payload, default=str), now, now) for payload in accepted]
+                    )
+                self._count += len(accepted)
+        if len(accepted) < len(payloads):
+            raise OutboxFull(f"Databricks outbox is full ({self._count} rows); "
+                             f"dropped {len(payloads) - len(accepted)} analyses")
+
+    def claim(self, limit: int, lease_seconds: float = 300) -> List[Tuple[int, dict, int]]:
+        """
+        Lease up to limit due rows. Returns (id, payload, attempts) tuples in FIFO
+        order, where attempts is how many times the row was claimed before.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            rows = self._conn.execute(
+                """SELECT id, payload, attempts FROM outbox
+                WHERE next_attempt_at <= ? AND (lease_until IS NULL OR lease_until < ?)
+                ORDER BY id LIMIT ?""",
+                (now, now, limit)
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE outbox SET lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + lease_seconds, row[0]) for row in rows]
+                )
+        return [(row_id, json.loads(payload), attempts) for row_id, payload, attempts in rows]
+
+    def ack(self, ids: List[int]):
+        """Delete rows that were written successfully."""
+        with self._lock:
+            with self._transaction():
+                self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+            self._count = max(0, self._count - len(ids))
+
+    def nack(self, ids: List[int], delay_seconds: float):
+        """Release rows after a failed write and schedule the retry."""
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                "UPDATE outbox SET next_attempt_at = ?, lease_until = NULL WHERE id = ?",
+                [(time.time() + delay_seconds, i) for i in ids]
+            )
+
+    def dead_letter(self, ids: List[int], error: str):
+        """Move rows that can't be written out of the queue, keeping them for inspection."""
+        with self._lock:
+            with self._transaction():
+                self._conn.executemany(
+                    """INSERT OR REPLACE INTO dead_letter (id, payload, enqueued_at, attempts, failed_at, error)
+                    SELECT id, payload, enqueued_at, attempts, ?, ? FROM outbox WHERE id = ?""",
+                    [(time.time(), error, i) for i in ids]
+                )
+                self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+            self._count = max(0, self._count - len(ids))
+
+    def dead_letter_depth(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()
+            return count
+
+    def depth(self) -> int:
+        with self._lock:
+            self._count = self._count_rows()
+            return self._count
@@ -1,25 +1,29 @@
-import pandas as pd
-import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
+from lakehouse_export import PartitionedParquetWriter
+
 load_dotenv()
 
-def sync_to_lakehouse(nodes, links, table_name="lore_triplets"):
+def sync_to_lakehouse(nodes, links, table_name="lore_triplets", analysis_id="adhoc", user_id=None):
     """
-    In a real scenario, this would use the databricks-sdk to upload to Delta Lake.
-    For the hackathon, we simulate this by saving a Delta-ready CSV that you can 
-    easily import into the Databricks UI.
+    Write one graph as partitioned Parquet (nodes and links) ready for Databricks
+    (COPY INTO / Auto Loader). Full-history exports go through lakehouse_export.py.
     """
-    df = pd.DataFrame(links)
-    
-    # Save as CSV for easy Databricks import
-    filename = f"db_{table_name}.csv"
-    df.to_csv(filename, index=False)
-    
-    print(f"📊 Data science export ready: {filename}")
-    print(f"👉 To impress judges: Upload this to Databricks and run 'SELECT * FROM {table_name}'")
-    
-    return filename
+    root = f"db_{table_name}"
+    with PartitionedParquetWriter(root) as writer:
+        writer.write_graph_batch([{
+            "id": analysis_id,
+            "user_id": user_id,
+            "name": table_name,
+            "nodes": nodes,
+            "links": links,
+            "updated_at": datetime.now(timezone.utc),
+        }])
+
+    print(f"📊 Data science export ready: {root}/ ({writer.files_written} Parquet files)")
+
+    return root
 
 if __name__ == "__main__":
     # Test data
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from chunking import chunk_text
+from llm import MODEL_NAME, PROMPT_VERSION, EXTRACTION_PROMPT, ainvoke_chain
+from extraction_cache import extraction_cache, cache_key, normalize_text
+from graph_analytics import SparseGraph
+from instrumentation import span, observe_payload
+from admission import Ticket, admission, estimate_tokens, is_rate_limit_error, rejection
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = int(os.getenv("EXTRACTION_CHUNK_CHARS", "12000"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("EXTRACTION_CHUNK_OVERLAP_CHARS", "1000"))
+MAX_CONCURRENT_CHUNKS = int(os.getenv("EXTRACTION_MAX_CONCURRENT_CHUNKS", "4"))
+# Fail the whole extraction when more than this fraction of its chunks failed
+MAX_FAILED_CHUNK_RATIO = float(os.getenv("EXTRACTION_MAX_FAILED_CHUNK_RATIO", "0.5"))
+
+
+async def extract_chunk(text: str, api_key: str) -> dict:
+    """Run the extraction chain on a single chunk and return the raw nodes/edges."""
+    result = await ainvoke_chain("extraction", api_key, {"text": text})
+    return {
+        "nodes": result.get("nodes", []) if isinstance(result, dict) else [],
+        "edges": result.get("edges", []) if isinstance(result, dict) else [],
+    }
+
+
+def _name_key(name) -> str:
+    """Key used to treat 'Count Dracula ' and 'count dracula' as the same character."""
+    return " ".join(str(name).split()).casefold()
+
+
+class GraphMerger:
+    """Accumulates partial node/edge lists from chunks into one de-duplicated graph."""
+
+    def __init__(self):
+        self.nodes: Dict[str, dict] = {}
+        self.edges: Dict[Tuple[str, str, str], dict] = {}
+
+    def _canonical(self, name) -> str:
+        node = self.nodes.get(_name_key(name))
+        return node["id"] if node else name
+
+    def add(self, partial: dict) -> Tuple[List[dict], List[dict]]:
+        """Merge one chunk's result. Returns the nodes and edges that were new."""
+        new_nodes, new_edges = [], []
+        for node in partial.get("nodes", []):
+            if not node.get("id"):
+                continue
+            key = _name_key(node["id"])
+            if key not in self.nodes:
+                self.nodes[key] = node
+                new_nodes.append(node)
+            elif not self.nodes[key].get("source_work") and node.get("source_work"):
+                self.nodes[key]["source_work"] = node["source_work"]
+
+        for edge in partial.get("edges", []):
+            if not edge.get("source") or not edge.get("target"):
+                continue
+            edge = dict(edge)
+            edge["source"] = self._canonical(edge["source"])
+            edge["target"] = self._canonical(edge["target"])
+            key = (_name_key(edge["source"]), _name_key(edge["target"]), str(edge.get("label", "")).upper())
+            if key not in self.edges:
+                self.edges[key] = edge
+                new_edges.append(edge)
+        return new_nodes, new_edges
+
+    def result(self) -> dict:
+        return {"nodes": list(self.nodes.values()), "edges": list(self.edges.values())}
+
+
+def format_graph(nodes_list: List[dict], edges_list: List[dict]) -> dict:
+    """Compute degree centrality and turn raw nodes into the sized nodes the frontend renders."""
+    graph = SparseGraph(nodes_list, edges_list)
+    centrality = graph.degree_centrality()
+
+    formatted_nodes = []
+    for node_data in nodes_list:
+        node_id = node_data["id"]
+        work = node_data.get("source_work", "Unknown System")
+        position = graph.index.get(str(node_id))
+        raw_importance = float(centrality[position]) if position is not None else 0
+        size = 5 + (raw_importance * 50)
+
+        formatted_nodes.append({
+            "id": node_id,
+            "work": work,
+            "size": size,
+            "val": size
+        })
+
+    return {"nodes": formatted_nodes, "links": edges_list}
+
+
+def estimate_prompt_tokens(chunks: List[str]) -> int:
+    """Estimated prompt tokens for extracting these chunks (text plus the prompt per chunk)."""
+    return estimate_tokens(sum(len(chunk) for chunk in chunks) + len(chunks) * len(EXTRACTION_PROMPT.template))
+
+
+async def iter_extraction(text: str, api_key: str,
+                          admit: Optional[Callable[[int], Awaitable[Ticket]]] = None) -> AsyncIterator[dict]:
+    """
+    Map-reduce extraction as a stream of events: split the text into overlapping
+    chunks, extract them concurrently (bounded by MAX_CONCURRENT_CHUNKS) and merge
+    each result as soon as it arrives.
+
+    Yields {"event": ..., "data": ...} dicts: "progress" after every chunk, "nodes"
+    and "edges" with what each chunk added to the merged graph, and finally "final"
+    with the complete graph including centrality-based size/val. The final graph's
+    failed_chunks lists the (0-based) chunks that are missing from it; more than
+    MAX_FAILED_CHUNK_RATIO of them failing is an error instead. Complete results
+    are cached by content hash, so repeat submissions skip the LLM entirely.
+
+    On a cache miss, `admit(estimated_tokens)` (e.g. admission.admit for the
+    client) is awaited before any LLM call and may raise 429/503; the slot is
+    held until the chunks are done.
+    """
+    # Normalizing and hashing multi-MB texts and the SQLite cache I/O all stay off the
+    # event loop. The normalized text is what gets chunked, so it matches the key.
+    text = await asyncio.to_thread(normalize_text, text)
+    key = await asyncio.to_thread(cache_key, text, MODEL_NAME, PROMPT_VERSION)
+    cached = await asyncio.to_thread(extraction_cache.get, key)
+    if cached is not None:
+        yield {"event": "final", "data": {**cached, "failed_chunks": []}}
+        return
+
+    observe_payload("extraction_text_chars", len(text))
+    with span("chunking"):
+        chunks = chunk_text(text, CHUNK_CHARS, CHUNK_OVERLAP_CHARS)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Invalid input: Text cannot be empty")
+
+    ticket = await admit(estimate_prompt_tokens(chunks)) if admit else None
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+
+    async def extract_bounded(index: int, chunk: str):
+        async with semaphore:
+            try:
+                return index, await extract_chunk(chunk, api_key)
+            except Exception as e:
+                return index, e
+
+    tasks = []
+    merger = GraphMerger()
+    errors = []
+    failed_chunks = []
+    completed = 0
+    rate_limited_for = None
+    try:
+        yield {"event": "progress", "data": {"completed": 0, "failed": 0, "total": len(chunks)}}
+
+        tasks = [asyncio.create_task(extract_bounded(i, c)) for i, c in enumerate(chunks)]
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            completed += 1
+            if isinstance(result, Exception):
+                logger.warning(f"Chunk {index + 1}/{len(chunks)} failed: {result!r}")
+                errors.append(result)
+                failed_chunks.append(index)
+                if is_rate_limit_error(result):
+                    # Hold back new requests instead of sending more into the quota wall
+                    rate_limited_for = admission.provider_backoff(result)
+            else:
+                with span("graph_merge"):
+                    new_nodes, new_edges = merger.add(result)
+                if new_nodes:
+                    yield {"event": "nodes", "data": {"chunk": index, "nodes": [
+                        {"id": n["id"], "work": n.get("source_work", "Unknown System")} for n in new_nodes
+                    ]}}
+                if new_edges:
+                    yield {"event": "edges", "data": {"chunk": index, "links": new_edges}}
+            yield {"event": "progress", "data": {
+                "completed": completed, "failed": len(errors), "total": len(chunks)
+            }}
+    finally:
+        # The consumer went away (e.g. SSE client disconnected): stop outstanding calls
+        for task in tasks:
+            task.cancel()
+        if ticket is not None:
+            ticket.release()
+
+    if errors and (len(errors) == len(chunks) or len(errors) > MAX_FAILED_CHUNK_RATIO * len(chunks)):
+        e = errors[0]
+        logger.error(f"{len(errors)} of {len(chunks)} chunks failed", exc_info=e)
+        if rate_limited_for is not None:
+            raise rejection(503, "LLM provider rate limit reached; try again later", rate_limited_for)
+        if isinstance(e, asyncio.TimeoutError):
+            raise HTTPException(status_code=504, detail="Extraction Error: LLM call timed out")
+        raise HTTPException(status_code=500, detail=f"Extraction Error: {len(errors)} of {len(chunks)} "
+                                                    f"chunks failed: {str(e)}")
+
+    try:
+        with span("graph_build"):
+            merged = merger.result()
+            graph = format_graph(merged["nodes"], merged["edges"])
+    except Exception as e:
+        logger.exception("Building the merged graph failed")
+        raise HTTPException(status_code=500, detail=f"Extraction Error: {str(e)}")
+
+    # Only complete graphs are cached; a retry may recover the chunks that failed
+    if not errors:
+        await asyncio.to_thread(extraction_cache.set, key, graph)
+    yield {"event": "final", "data": {**graph, "failed_chunks": sorted(failed_chunks)}}
+
+
+async def run_extraction(text: str, api_key: str, admit: Optional[Callable[[int], Awaitable[Ticket]]] = None):
+    """Run the extraction pipeline to completion and return the final graph."""
+    graph = None
+    async for event in iter_extraction(text, api_key, admit):
+        if event["event"] == "final":
+            graph = event["data"]
+    return graph
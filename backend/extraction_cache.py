@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(current_dir, "cache", "extraction_cache.sqlite3")
+# Hits only record last_access in memory; it is written back in batches this often (and before evicting)
+ACCESS_FLUSH_SECONDS = float(os.getenv("EXTRACTION_CACHE_ACCESS_FLUSH_SECONDS", "60"))
+
+
+INLINE_WHITESPACE = re.compile(r"[^\S\n]+")
+BLANK_LINES = re.compile(r"\n\s*\n")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text so trivially different submissions share a cache entry.
+
+    Runs of spaces/tabs collapse to one space and runs of blank lines to a single
+    paragraph break, but line and paragraph breaks are kept: chunking splits on
+    them. Extraction runs on the normalized text, so equal keys mean equal chunks.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [INLINE_WHITESPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def cache_key(text: str, model: str, prompt_version: str) -> str:
+    """
+    Content address of an extraction: hash of the text (already passed through
+    normalize_text), model and prompt version.
+    """
+    digest = hashlib.sha256()
+    for part in (model, prompt_version, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Persistent SQLite cache of extraction results.
+
+    Entries expire after ttl_seconds and the least recently used ones are evicted
+    once the cache holds more than max_entries or max_bytes of JSON. Methods do
+    blocking SQLite I/O; call them from async code through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = 1000,
+                 max_bytes: int = 256 * 1024 * 1024, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._touched = {}
+        self._last_flush = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS extractions (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_extractions_last_access ON extractions (last_access)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached graph for key, or None on a miss or expired entry."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created_at FROM extractions WHERE key = ?", (key,)
+                ).fetchone()
+                now = time.time()
+                if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                    if row is not None:
+                        conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    return None
+                self._touched[key] = now
+                if time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS:
+                    self._flush_access(conn)
+                    conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except Exception as e:
+            logger.error(f"Extraction cache read failed: {e}")
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        """Store a graph and evict old entries if the cache is over its limits."""
+        try:
+            payload = json.dumps(value)
+            now = time.time()
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    """INSERT OR REPLACE INTO extractions (key, value, size, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)""",
+                    (key, payload, len(payload), now, now)
+                )
+                self._touched.pop(key, None)
+                self._flush_access(conn)
+                self._evict(conn, now)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Extraction cache write failed: {e}")
+
+    def _flush_access(self, conn: sqlite3.Connection):
+        """Write back the last_access times recorded by cache hits (caller commits)."""
+        if self._touched:
+            conn.executemany(
+                "UPDATE extractions SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl_seconds:
+            cursor = conn.execute(
+                "DELETE FROM extractions WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += cursor.rowcount
+
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently used until both limits are satisfied
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM extractions ORDER BY last_access ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM extractions WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            self._touched.clear()
+            conn.execute("DELETE FROM extractions")
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Global cache instance
+extraction_cache = ExtractionCache(
+    path=os.getenv("EXTRACTION_CACHE_PATH"),
+    max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "1000")),
+    max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    ttl_seconds=int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+)
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from graph_utils import endpoint_id
+
+GRAPH_METRICS_CACHE_SIZE = int(os.getenv("GRAPH_METRICS_CACHE_SIZE", "128"))
+# Betweenness is estimated from this many BFS sources (exact when >= node count)
+BETWEENNESS_SAMPLES = int(os.getenv("GRAPH_BETWEENNESS_SAMPLES", "128"))
+BETWEENNESS_BATCH = 64
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOL = 1e-6
+PAGERANK_MAX_ITER = 100
+LABEL_PROPAGATION_MAX_ITER = 30
+
+
+class SparseGraph:
+    """
+    Undirected, unweighted graph as a CSR adjacency matrix, built once and shared by
+    every metric. Nodes are the node ids plus any link endpoint missing from the node
+    list (as networkx would add them); duplicate links and self-loops are dropped.
+    """
+
+    def __init__(self, nodes: List[dict], links: List[dict]):
+        ids = []
+        index: Dict[str, int] = {}
+
+        def add(node_id) -> int:
+            key = str(node_id)
+            if key not in index:
+                index[key] = len(ids)
+                ids.append(key)
+            return index[key]
+
+        for node in nodes or []:
+            if node.get("id") is not None:
+                add(node["id"])
+        rows, cols = [], []
+        for link in links or []:
+            source, target = endpoint_id(link.get("source")), endpoint_id(link.get("target"))
+            if source is None or target is None:
+                continue
+            i, j = add(source), add(target)
+            if i != j:
+                rows.append(i)
+                cols.append(j)
+
+        self.ids = ids
+        self.index = index
+        n = len(ids)
+        data = np.ones(2 * len(rows), dtype=np.float64)
+        adjacency = sp.csr_matrix(
+            (data, (np.array(rows + cols, dtype=np.int64), np.array(cols + rows, dtype=np.int64))),
+            shape=(n, n)
+        )
+        # Duplicate entries are summed on construction; clamp back to 0/1
+        adjacency.data[:] = 1.0
+        adjacency.eliminate_zeros()
+        self.adjacency = adjacency
+        self.degree = np.asarray(adjacency.sum(axis=1)).ravel()
+        self.edge_count = int(adjacency.nnz // 2)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.ids)
+
+    def degree_centrality(self) -> np.ndarray:
+        n = self.node_count
+        if n <= 1:
+            return np.ones(n) if n == 1 else np.zeros(0)
+        return self.degree / (n - 1)
+
+    def pagerank(self, alpha: float = PAGERANK_ALPHA, tol: float = PAGERANK_TOL,
+                 max_iter: int = PAGERANK_MAX_ITER) -> np.ndarray:
+        """Power iteration; dangling (isolated) nodes spread their rank uniformly."""
+        n = self.node_count
+        if n == 0:
+            return np.zeros(0)
+        inverse_degree = np.divide(1.0, self.degree, out=np.zeros(n), where=self.degree > 0)
+        dangling = self.degree == 0
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            previous = rank
+            rank = alpha * (self.adjacency @ (previous * inverse_degree))
+            rank += (alpha * previous[dangling].sum() + 1.0 - alpha) / n
+            if np.abs(rank - previous).sum() < n * tol:
+                break
+        return rank / rank.sum()
+
+    def components(self) -> np.ndarray:
+        if self.node_count == 0:
+            return np.zeros(0, dtype=np.int64)
+        _, labels = connected_components(self.adjacency, directed=False)
+        return labels
+
+    def betweenness(self, samples: int = BETWEENNESS_SAMPLES, seed: int = 0) -> np.ndarray:
+        """
+        Brandes betweenness (normalized like networkx), estimated from `samples` random
+        sources. Sources are processed BETWEENNESS_BATCH at a time: each BFS level and
+        each dependency-accumulation step is one sparse x dense matrix product.
+        """
+        n = self.node_count
+        if n <= 2:
+            return np.zeros(n)
+        k = min(samples, n)
+        sources = np.random.default_rng(seed).choice(n, size=k, replace=False) if k < n else np.arange(n)
+
+        centrality = np.zeros(n)
+        for start in range(0, k, BETWEENNESS_BATCH):
+            centrality += self._batch_dependencies(sources[start:start + BETWEENNESS_BATCH])
+
+        # Sum over ordered pairs -> networkx normalization, scaled up for sampling
+        return centrality * (n / k) / ((n - 1) * (n - 2))
+
+    def _batch_dependencies(self, sources: np.ndarray) -> np.ndarray:
+        n, b = self.node_count, len(sources)
+        columns = np.arange(b)
+        # Node x source matrices: shortest-path counts and BFS level membership
+        sigma = np.zeros((n, b))
+        sigma[sources, columns] = 1.0
+        visited = sigma > 0
+        levels = [visited.copy()]
+
+        frontier = sigma
+        while True:
+            reached = self.adjacency @ frontier
+            reached[visited] = 0.0
+            new = reached > 0
+            if not new.any():
+                break
+            visited |= new
+            sigma = sigma + reached
+            levels.append(new)
+            frontier = reached
+
+        inverse_sigma = np.divide(1.0, sigma, out=np.zeros_like(sigma), where=sigma > 0)
+        delta = np.zeros((n, b))
+        for depth in range(len(levels) - 1, 0, -1):
+            back = self.adjacency @ ((1.0 + delta) * inverse_sigma * levels[depth])
+            delta += sigma * back * levels[depth - 1]
+
+        delta[sources, columns] = 0.0
+        return delta.sum(axis=1)
+
+    def communities(self, max_iter: int = LABEL_PROPAGATION_MAX_ITER, seed: int = 0) -> np.ndarray:
+        """
+        Label propagation: nodes take the label with the most neighbours (a node's own
+        label counts half, so it only moves for a strictly better label; other ties are
+        broken randomly). Votes for all nodes are tallied at once by sorting
+        (node, label) keys. A random half of the nodes moves per round, which keeps
+        bipartite structures from oscillating.
+        """
+        n = self.node_count
+        labels = np.arange(n)
+        if n == 0:
+            return labels
+        rng = np.random.default_rng(seed)
+        edges = self.adjacency.tocoo()
+        voters = np.concatenate([edges.row, np.arange(n)]).astype(np.int64)
+        neighbours = np.concatenate([edges.col, np.arange(n)])
+        weights = np.concatenate([np.ones(edges.nnz), np.full(n, 0.5)])
+
+        for _ in range(max_iter):
+            keys, inverse = np.unique(voters * n + labels[neighbours], return_inverse=True)
+            scores = np.bincount(inverse, weights=weights) + rng.random(len(keys)) * 0.4
+            node, label = keys // n, keys % n
+            order = np.lexsort((-scores, node))
+            best_rows = order[np.r_[True, node[order][1:] != node[order][:-1]]]
+            best = labels.copy()
+            best[node[best_rows]] = label[best_rows]
+            changed = best != labels
+            if not changed.any():
+                break
+            labels = np.where(changed & (rng.random(n) < 0.5), best, labels)
+
+        _, compact = np.unique(labels, return_inverse=True)
+        return compact
+
+    def modularity(self, labels: np.ndarray) -> float:
+        m = self.edge_count
+        if m == 0:
+            return 0.0
+        upper = sp.triu(self.adjacency, k=1).tocoo()
+        intra = labels[upper.row] == labels[upper.col]
+        communities = labels.max() + 1
+        internal = np.bincount(labels[upper.row][intra], minlength=communities)
+        degree_sums = np.bincount(labels, weights=self.degree, minlength=communities)
+        return float((internal / m - (degree_sums / (2 * m)) ** 2).sum())
+
+
+def graph_hash(nodes: List[dict], links: List[dict], samples: int) -> str:
+    """
+    Content hash of the graph's structure (order-insensitive). Covers exactly what
+    SparseGraph builds: dangling links are ignored, endpoints missing from the node
+    list are added, and duplicate links and self-loops don't count as edges.
+    """
+    node_ids = {str(node["id"]) for node in nodes or [] if node.get("id") is not None}
+    edges = set()
+    for link in links or []:
+        source, target = endpoint_id(link.get("source")), endpoint_id(link.get("target"))
+        if source is None or target is None:
+            continue
+        source, target = str(source), str(target)
+        node_ids.update((source, target))
+        if source != target:
+            edges.add((source, target) if source < target else (target, source))
+    raw = json.dumps([sorted(node_ids), sorted(edges), samples], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def compute_metrics(nodes: List[dict], links: List[dict], samples: int = BETWEENNESS_SAMPLES) -> dict:
+    started = time.perf_counter()
+    graph = SparseGraph(nodes, links)
+    degree = graph.degree_centrality()
+    pagerank = graph.pagerank()
+    betweenness = graph.betweenness(samples)
+    components = graph.components()
+    communities = graph.communities()
+
+    component_sizes = np.bincount(components) if graph.node_count else np.zeros(0, dtype=np.int64)
+    community_sizes = np.bincount(communities) if graph.node_count else np.zeros(0, dtype=np.int64)
+    return {
+        "node_count": graph.node_count,
+        "link_count": graph.edge_count,
+        "betweenness_samples": min(samples, graph.node_count),
+        "components": {
+            "count": int(len(component_sizes)),
+            "largest": int(component_sizes.max()) if len(component_sizes) else 0,
+        },
+        "communities": {
+            "count": int(len(community_sizes)),
+            "largest": int(community_sizes.max()) if len(community_sizes) else 0,
+            "modularity": graph.modularity(communities),
+        },
+        "nodes": [
+            {
+                "id": node_id,
+                "degree_centrality": float(degree[i]),
+                "pagerank": float(pagerank[i]),
+                "betweenness": float(betweenness[i]),
+                "community": int(communities[i]),
+                "component": int(components[i]),
+            }
+            for i, node_id in enumerate(graph.ids)
+        ],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+class MetricsCache:
+    """LRU of compute_metrics results keyed by graph_hash."""
+
+    def __init__(self, max_entries: int = GRAPH_METRICS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def set(self, key: str, result: dict):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Global metrics cache instance
+metrics_cache = MetricsCache()
+
+
+def graph_metrics(nodes: List[dict], links: List[dict], samples: int = BETWEENNESS_SAMPLES) -> dict:
+    """Cached compute_metrics: identical graph structure is only analysed once."""
+    key = graph_hash(nodes, links, samples)
+    result = metrics_cache.get(key)
+    cached = result is not None
+    if not cached:
+        result = compute_metrics(nodes, links, samples)
+        metrics_cache.set(key, result)
+    return {**result, "graph_hash": key, "cached": cached}
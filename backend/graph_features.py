@@ -0,0 +1,62 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from graph_analytics import SparseGraph
+from graph_utils import endpoint_id
+from ml_predictor import FEATURE_ORDER
+
+
+def node_work(node: dict):
+    """Saved/formatted nodes carry 'work'; raw LLM nodes carry 'source_work'."""
+    return node.get("work") or node.get("source_work")
+
+
+class EdgeFeatureIndex:
+    """
+    Per-graph lookup tables built once: degree centrality (from the same SparseGraph
+    the analytics engine uses) and each character's work. Used to compute the
+    relationship predictor's features for every edge in bulk.
+    """
+
+    def __init__(self, nodes: List[dict], links: List[dict]):
+        self.graph = SparseGraph(nodes, links)
+        self.links = []
+        for link in links:
+            source, target = endpoint_id(link.get("source")), endpoint_id(link.get("target"))
+            if source is None or target is None:
+                continue
+            self.links.append((source, target, link))
+
+        self.centrality = self.graph.degree_centrality()
+        self.works: Dict[str, str] = {
+            node["id"]: node_work(node) for node in nodes if node.get("id") is not None
+        }
+
+    def edge_features(self) -> Tuple[np.ndarray, List[dict]]:
+        """
+        Feature matrix (one row per valid link, columns in FEATURE_ORDER)
+        and the links it was built from, with source/target normalized to IDs.
+        """
+        rows = np.zeros((len(self.links), len(FEATURE_ORDER)), dtype=np.float64)
+        normalized = []
+        if not self.links:
+            return rows, normalized
+
+        # Every endpoint is a SparseGraph node, so both lookups always succeed
+        source_index = np.array([self.graph.index[str(source)] for source, _, _ in self.links])
+        target_index = np.array([self.graph.index[str(target)] for _, target, _ in self.links])
+        rows[:, 0] = self.centrality[source_index]
+        rows[:, 1] = self.centrality[target_index]
+        for i, (source, target, link) in enumerate(self.links):
+            source_work = self.works.get(source)
+            target_work = self.works.get(target)
+            link_work = link.get("source_work") or link.get("work")
+            rows[i, 2:] = (
+                len(str(source)),
+                len(str(target)),
+                int(source_work is not None and source_work == target_work),
+                int(source_work is not None and source_work == link_work),
+            )
+            normalized.append({**link, "source": source, "target": target})
+        return rows, normalized
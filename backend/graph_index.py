@@ -0,0 +1,138 @@
+import argparse
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, delete, or_
+from sqlalchemy.orm import Session
+
+from graph_utils import endpoint_id
+from models import Analysis, AnalysisCharacter, AnalysisRelationship
+
+REINDEX_BATCH_SIZE = 200
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def character_rows(nodes: Iterable[dict]) -> List[dict]:
+    rows = []
+    for node in nodes or []:
+        if node.get("id") in (None, ""):
+            continue
+        rows.append({
+            "name": str(node["id"]),
+            "work": node.get("work") or node.get("source_work"),
+            "description": node.get("description"),
+            "size": _to_float(node.get("size")),
+        })
+    return rows
+
+
+def relationship_rows(links: Iterable[dict]) -> List[dict]:
+    rows = []
+    for link in links or []:
+        source = endpoint_id(link.get("source"))
+        target = endpoint_id(link.get("target"))
+        if source is None or target is None:
+            continue
+        rows.append({"source": str(source), "target": str(target), "label": link.get("label")})
+    return rows
+
+
+def _sync(db: Session, model, key_fields, analysis: Analysis, before: List[dict], after: List[dict]):
+    """
+    Bring the index rows of one analysis from `before` to `after`, touching only the
+    keys whose rows changed (delete + insert per key), so small edits stay small.
+    """
+    def group(rows):
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[tuple(row[field] for field in key_fields)].append(row)
+        return grouped
+
+    old, new = group(before), group(after)
+    changed = [key for key in old.keys() | new.keys() if old.get(key) != new.get(key)]
+    if not changed:
+        return 0
+
+    stale = [key for key in changed if key in old]
+    if stale:
+        db.execute(delete(model).where(
+            model.analysis_id == analysis.id,
+            or_(*[
+                and_(*[
+                    getattr(model, field).is_(None) if value is None else getattr(model, field) == value
+                    for field, value in zip(key_fields, key)
+                ])
+                for key in stale
+            ])
+        ))
+    inserts = [
+        {**row, "analysis_id": analysis.id, "user_id": analysis.user_id}
+        for key in changed for row in new.get(key, [])
+    ]
+    if inserts:
+        db.execute(model.__table__.insert(), inserts)
+    return len(changed)
+
+
+def sync_analysis(db: Session, analysis: Analysis, old_nodes=None, old_links=None,
+                  nodes_changed: bool = True, links_changed: bool = True):
+    """
+    Update the search index for an analysis inside the caller's transaction.
+    Pass the previous nodes/links to diff against them (None means "not indexed yet").
+    """
+    if nodes_changed:
+        _sync(db, AnalysisCharacter, ("name",), analysis,
+              character_rows(old_nodes), character_rows(analysis.nodes))
+    if links_changed:
+        _sync(db, AnalysisRelationship, ("source", "target", "label"), analysis,
+              relationship_rows(old_links), relationship_rows(analysis.links))
+
+
+def remove_analysis(db: Session, analysis_id: str):
+    """Drop an analysis's index rows (the FK cascade does this on Postgres too)."""
+    db.execute(delete(AnalysisCharacter).where(AnalysisCharacter.analysis_id == analysis_id))
+    db.execute(delete(AnalysisRelationship).where(AnalysisRelationship.analysis_id == analysis_id))
+
+
+def reindex(db: Session, user_id: Optional[str] = None, batch_size: int = REINDEX_BATCH_SIZE) -> int:
+    """Rebuild the index rows from the analyses' JSON (backfill or repair)."""
+    query = db.query(Analysis.id)
+    if user_id:
+        query = query.filter(Analysis.user_id == user_id)
+    analysis_ids = [row.id for row in query.order_by(Analysis.id)]
+
+    count = 0
+    for start in range(0, len(analysis_ids), batch_size):
+        batch = analysis_ids[start:start + batch_size]
+        for analysis in db.query(Analysis).filter(Analysis.id.in_(batch)):
+            remove_analysis(db, analysis.id)
+            sync_analysis(db, analysis)
+            count += 1
+        db.commit()
+        db.expunge_all()
+    return count
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manage the cross-analysis character search index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reindex_parser = subparsers.add_parser("reindex", help="Rebuild index rows from stored analyses")
+    reindex_parser.add_argument("--user-id", help="Only reindex this user's analyses")
+    reindex_parser.add_argument("--batch-size", type=int, default=REINDEX_BATCH_SIZE)
+
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        count = reindex(db, user_id=args.user_id, batch_size=args.batch_size)
+        print(f"✓ Reindexed {count} analyses")
+    finally:
+        db.close()
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from graph_utils import endpoint_id
+
+
+class PatchError(ValueError):
+    pass
+
+
+def escape_token(token: str) -> str:
+    """JSON Pointer escaping for one path segment."""
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape_token(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _parse_path(path: str) -> List[str]:
+    if not path.startswith("/"):
+        raise PatchError(f"Path must start with '/': {path!r}")
+    return [_unescape_token(token) for token in path[1:].split("/")]
+
+
+def link_key(link: dict) -> Tuple[Any, Any, Any]:
+    return endpoint_id(link.get("source")), endpoint_id(link.get("target")), link.get("label")
+
+
+def link_path(link: dict) -> str:
+    source, target, label = link_key(link)
+    return "/links/" + "/".join(escape_token("" if part is None else part) for part in (source, target, label))
+
+
+class GraphPatch:
+    """
+    Applies JSON-Patch-style operations to an analysis graph.
+
+    Supported paths:
+      /nodes/-                         add a node (value is the node object)
+      /nodes/{id}                      replace (merge value into the node) or remove
+      /links/-                         add a link
+      /links/{source}/{target}/{label} replace (merge) or remove
+      /work_meta/{key}                 add/replace or remove one work_meta entry
+      /name, /description              replace
+
+    Path segments use JSON Pointer escaping (~1 for '/', ~0 for '~'). Removing a node
+    also removes its links; those removals are reported in `applied`.
+    """
+
+    def __init__(self, nodes: list, links: list, work_meta: Optional[dict]):
+        self.nodes: List[dict] = [dict(node) for node in nodes or []]
+        self.links: List[dict] = [dict(link) for link in links or []]
+        self.work_meta: Dict[str, Any] = dict(work_meta or {})
+        self.fields: Dict[str, Any] = {}
+        self.applied: List[dict] = []
+        self.touched = set()
+
+    def _node_index(self, node_id) -> int:
+        for i, node in enumerate(self.nodes):
+            if str(node.get("id")) == node_id:
+                return i
+        raise PatchError(f"Node not found: {node_id!r}")
+
+    def _link_index(self, source, target, label) -> int:
+        for i, link in enumerate(self.links):
+            key = tuple("" if part is None else str(part) for part in link_key(link))
+            if key == (source, target, label):
+                return i
+        raise PatchError(f"Link not found: {source!r} -> {target!r} ({label!r})")
+
+    def apply(self, operations: List[dict]):
+        for operation in operations:
+            self._apply_one(operation["op"], operation["path"], operation.get("value"))
+        return self
+
+    def _apply_one(self, op: str, path: str, value):
+        tokens = _parse_path(path)
+        target = tokens[0]
+
+        if target == "nodes":
+            self.touched.add("nodes")
+            if len(tokens) == 2 and tokens[1] == "-" and op == "add":
+                if not isinstance(value, dict) or value.get("id") in (None, ""):
+                    raise PatchError("Added nodes need an 'id'")
+                if any(str(node.get("id")) == str(value["id"]) for node in self.nodes):
+                    raise PatchError(f"Node already exists: {value['id']!r}")
+                self.nodes.append(dict(value))
+            elif len(tokens) == 2 and op == "replace":
+                if not isinstance(value, dict):
+                    raise PatchError("Node replace value must be an object")
+                i = self._node_index(tokens[1])
+                if "id" in value and str(value["id"]) != tokens[1]:
+                    raise PatchError("Node ids cannot be changed; remove and add instead")
+                self.nodes[i] = {**self.nodes[i], **value}
+            elif len(tokens) == 2 and op == "remove":
+                node_id = tokens[1]
+                del self.nodes[self._node_index(node_id)]
+                kept = []
+                for link in self.links:
+                    source, target, _ = link_key(link)
+                    if node_id in (str(source), str(target)):
+                        self.touched.add("links")
+                        self.applied.append({"op": "remove", "path": link_path(link)})
+                    else:
+                        kept.append(link)
+                self.links = kept
+            else:
+                raise PatchError(f"Unsupported operation {op!r} on {path!r}")
+
+        elif target == "links":
+            self.touched.add("links")
+            if len(tokens) == 2 and tokens[1] == "-" and op == "add":
+                if not isinstance(value, dict) or value.get("source") is None or value.get("target") is None:
+                    raise PatchError("Added links need a 'source' and 'target'")
+                self.links.append(dict(value))
+            elif len(tokens) == 4 and op in ("replace", "remove"):
+                i = self._link_index(*tokens[1:])
+                if op == "remove":
+                    del self.links[i]
+                else:
+                    if not isinstance(value, dict):
+                        raise PatchError("Link replace value must be an object")
+                    self.links[i] = {**self.links[i], **value}
+            else:
+                raise PatchError(f"Unsupported operation {op!r} on {path!r}")
+
+        elif target == "work_meta" and len(tokens) == 2:
+            self.touched.add("work_meta")
+            if op in ("add", "replace"):
+                self.work_meta[tokens[1]] = value
+            elif op == "remove":
+                if tokens[1] not in self.work_meta:
+                    raise PatchError(f"work_meta key not found: {tokens[1]!r}")
+                del self.work_meta[tokens[1]]
+            else:
+                raise PatchError(f"Unsupported operation {op!r} on {path!r}")
+
+        elif target in ("name", "description") and len(tokens) == 1 and op == "replace":
+            if target == "name" and not value:
+                raise PatchError("Name cannot be empty")
+            self.fields[target] = value
+
+        else:
+            raise PatchError(f"Unsupported path: {path!r}")
+
+        self.applied.append({"op": op, "path": path, **({"value": value} if op != "remove" else {})})
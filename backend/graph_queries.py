@@ -0,0 +1,110 @@
+from sqlalchemy import Integer, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from graph_utils import endpoint_id
+
+# Link endpoints are stored as names, or as node objects once the frontend graph
+# library has replaced them; handle both shapes in SQL
+LINK_SOURCE = "COALESCE(l->'source'->>'id', l->>'source')"
+LINK_TARGET = "COALESCE(l->'target'->>'id', l->>'target')"
+NODE_SIZE = "CASE WHEN jsonb_typeof(n->'size') = 'number' THEN (n->>'size')::float END"
+
+_ANALYSIS = """analysis AS (
+    SELECT nodes, links FROM analyses WHERE id = :analysis_id AND user_id = :user_id
+)"""
+
+# Given a CTE `selected(n)` of node documents, return those nodes plus the links
+# whose endpoints are both selected. `found` is 0 when the analysis doesn't exist.
+_SUBGRAPH = """,
+selected_ids AS (
+    SELECT n->>'id' AS id FROM selected
+)
+SELECT
+    (SELECT COALESCE(jsonb_agg(n), '[]'::jsonb) FROM selected) AS nodes,
+    (SELECT COALESCE(jsonb_agg(l), '[]'::jsonb)
+        FROM analysis, jsonb_array_elements(analysis.links) l
+        WHERE """ + LINK_SOURCE + """ IN (SELECT id FROM selected_ids)
+          AND """ + LINK_TARGET + """ IN (SELECT id FROM selected_ids)) AS links,
+    (SELECT COUNT(*) FROM analysis) AS found
+"""
+
+
+def _subgraph_statement(selected_cte: str, recursive: bool = False):
+    sql = ("WITH RECURSIVE " if recursive else "WITH ") + _ANALYSIS + ",\n" + selected_cte + _SUBGRAPH
+    return text(sql).columns(nodes=JSONB(), links=JSONB(), found=Integer())
+
+
+WORK_SUBGRAPH = _subgraph_statement("""selected AS (
+    SELECT n FROM analysis, jsonb_array_elements(analysis.nodes) n
+    WHERE COALESCE(n->>'work', n->>'source_work') = :work
+)""")
+
+NEIGHBORHOOD_SUBGRAPH = _subgraph_statement("""edges AS (
+    SELECT """ + LINK_SOURCE + """ AS source, """ + LINK_TARGET + """ AS target
+    FROM analysis, jsonb_array_elements(analysis.links) l
+),
+hood(id, depth) AS (
+    SELECT CAST(:character AS text), 0
+    UNION
+    SELECT CASE WHEN e.source = h.id THEN e.target ELSE e.source END, h.depth + 1
+    FROM hood h JOIN edges e ON e.source = h.id OR e.target = h.id
+    WHERE h.depth < :hops
+),
+selected AS (
+    SELECT n FROM analysis, jsonb_array_elements(analysis.nodes) n
+    WHERE n->>'id' IN (SELECT id FROM hood)
+)""", recursive=True)
+
+TOP_NODES_SUBGRAPH = _subgraph_statement("""selected AS (
+    SELECT n FROM analysis, jsonb_array_elements(analysis.nodes) n
+    ORDER BY """ + NODE_SIZE + """ DESC NULLS LAST
+    LIMIT :limit
+)""")
+
+
+# The same selections in Python, for databases without JSONB (SQLite in development
+# and tests). They load the whole graph, so Postgres is what large graphs should use.
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _size(node: dict):
+    size = node.get("size")
+    return float(size) if isinstance(size, (int, float)) and not isinstance(size, bool) else None
+
+
+def _subgraph(links: list, selected: list) -> dict:
+    selected_ids = {_text(n.get("id")) for n in selected}
+    return {
+        "nodes": selected,
+        "links": [
+            l for l in links
+            if _text(endpoint_id(l.get("source"))) in selected_ids
+            and _text(endpoint_id(l.get("target"))) in selected_ids
+        ],
+    }
+
+
+def work_subgraph(nodes: list, links: list, work: str) -> dict:
+    def node_work(n):
+        return n.get("work") if n.get("work") is not None else n.get("source_work")
+    return _subgraph(links, [n for n in nodes if _text(node_work(n)) == work])
+
+
+def neighborhood_subgraph(nodes: list, links: list, character: str, hops: int) -> dict:
+    adjacent = {}
+    for l in links:
+        source, target = _text(endpoint_id(l.get("source"))), _text(endpoint_id(l.get("target")))
+        adjacent.setdefault(source, set()).add(target)
+        adjacent.setdefault(target, set()).add(source)
+    hood, frontier = {character}, {character}
+    for _ in range(hops):
+        frontier = {other for name in frontier for other in adjacent.get(name, ())} - hood
+        hood |= frontier
+    return _subgraph(links, [n for n in nodes if _text(n.get("id")) in hood])
+
+
+def top_nodes_subgraph(nodes: list, links: list, limit: int) -> dict:
+    ranked = sorted(nodes, key=lambda n: (_size(n) is None, -(_size(n) or 0.0)))
+    return _subgraph(links, ranked[:limit])
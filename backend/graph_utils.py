@@ -0,0 +1,5 @@
+def endpoint_id(endpoint):
+    """Link endpoints are names, or node objects once the frontend graph library has touched them."""
+    if isinstance(endpoint, dict):
+        return endpoint.get("id")
+    return endpoint
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+PER_HOST_CONCURRENCY = int(os.getenv("HTTP_PER_HOST_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+MAX_RESPONSE_BYTES = int(os.getenv("HTTP_MAX_RESPONSE_BYTES", str(32 * 1024 * 1024)))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+@dataclass
+class FetchResult:
+    status_code: int
+    headers: httpx.Headers
+    text: str
+
+
+_client: Optional[httpx.AsyncClient] = None
+_host_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared keep-alive client so connections to the same mirror are reused."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client (called on application shutdown)."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlparse(url).netloc
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(PER_HOST_CONCURRENCY)
+    return _host_limits[host]
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+    # Exponential backoff with jitter
+    return BACKOFF_BASE_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+
+async def fetch_text(url: str, headers: Optional[Dict[str, str]] = None,
+                     timeout: float = 15.0, max_bytes: int = MAX_RESPONSE_BYTES) -> FetchResult:
+    """
+    GET a URL through the shared client and return its decoded body.
+
+    The body is streamed and capped at max_bytes. Connection errors and
+    429/5xx responses are retried with exponential backoff; other error
+    statuses raise httpx.HTTPStatusError. A 304 is returned as-is.
+    """
+    client = get_client()
+    attempt = 0
+    while True:
+        try:
+            async with _host_limit(url):
+                async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                    if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                        delay = _retry_delay(attempt, response)
+                    else:
+                        if response.status_code != 304:
+                            response.raise_for_status()
+                        body = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            body.extend(chunk)
+                            if len(body) > max_bytes:
+                                raise ValueError(f"Response from {url} exceeds {max_bytes} bytes")
+                        text = body.decode(response.encoding or "utf-8", errors="replace")
+                        return FetchResult(response.status_code, response.headers, text)
+        except httpx.TransportError as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt)
+            logger.warning(f"GET {url} failed ({e}), retrying in {delay:.1f}s")
+        attempt += 1
+        await asyncio.sleep(delay)
@@ -0,0 +1,209 @@
+import functools
+import inspect
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Trace every request (not just those sending X-Trace: 1) and log slow ones
+TRACE_ALL_REQUESTS = os.getenv("TRACE_ALL_REQUESTS", "false").lower() == "true"
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+STAGE_SECONDS = Histogram(
+    "mythinfo_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "mythinfo_http_request_seconds", "HTTP request latency", ["method", "route", "status"], buckets=STAGE_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "mythinfo_db_query_seconds", "SQL statement latency", ["operation"], buckets=STAGE_BUCKETS
+)
+PAYLOAD_SIZE = Histogram(
+    "mythinfo_payload_size", "Payload sizes (characters, bytes or rows, see kind)", ["kind"], buckets=SIZE_BUCKETS
+)
+LLM_TOKENS = Counter("mythinfo_llm_tokens_total", "LLM tokens used", ["chain", "direction"])
+
+
+class Trace:
+    """Per-request timings, collected when a request is traced."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.stages: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+
+    def add(self, stage: str, seconds: float):
+        entry = self.stages[stage]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total ms per stage (concurrent spans overlap)."""
+        return ", ".join(
+            f'{stage.replace(" ", "_")};dur={total * 1000:.1f};desc="x{count}"'
+            for stage, (count, total) in self.stages.items()
+        )
+
+
+# Copied into tasks and to_thread calls, so spans there land in the request's trace
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as `stage` (histogram + the current request's trace)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator version of span() for sync and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_payload(kind: str, size: int):
+    PAYLOAD_SIZE.labels(kind).observe(size)
+
+
+def record_llm_usage(chain: str, message):
+    """Token counts from a LangChain AIMessage's usage_metadata, when the provider sends it."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    for direction in ("input", "output"):
+        tokens = usage.get(f"{direction}_tokens")
+        if tokens:
+            LLM_TOKENS.labels(chain, direction).inc(tokens)
+
+
+# --- SQLAlchemy ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    DB_QUERY_SECONDS.labels(operation).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("db", seconds)
+
+
+def instrument_sqlalchemy():
+    """Time every statement on every engine (sync and async share Engine events)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- Existing stats() dicts as Prometheus gauges ---
+
+class StatsCollector:
+    """Exposes registered stats()/metrics() dicts as mythinfo_<name>_<key> gauges."""
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, fn: Callable[[], dict]):
+        self.sources[name] = fn
+
+    def _flatten(self, prefix: str, stats: dict):
+        for key, value in stats.items():
+            name = f"{prefix}_{key}"
+            if isinstance(value, dict):
+                yield from self._flatten(name, value)
+            elif isinstance(value, (int, float)):
+                yield name, float(value)
+
+    def collect(self):
+        for source, fn in list(self.sources.items()):
+            try:
+                stats = fn()
+            except Exception as e:
+                logger.warning(f"Stats source {source} failed: {e}")
+                continue
+            for name, value in self._flatten(f"mythinfo_{source}", stats):
+                gauge = GaugeMetricFamily(name, f"{source} stat")
+                gauge.add_metric([], value)
+                yield gauge
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def metrics_response():
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# --- Request middleware ---
+
+async def trace_requests(request, call_next):
+    """
+    Times every request. Requests sending `X-Trace: 1` (or all, with
+    TRACE_ALL_REQUESTS) also get per-stage timings back in a Server-Timing header,
+    plus X-Trace-Id; slow traced requests are logged with their breakdown.
+    Streamed responses only include stages finished before the headers were sent.
+    """
+    traced = TRACE_ALL_REQUESTS or request.headers.get("x-trace") in ("1", "true")
+    trace = Trace(request.headers.get("x-request-id") or uuid.uuid4().hex) if traced else None
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_trace.reset(token)
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.labels(request.method, route, str(status)).observe(elapsed)
+
+    if trace is not None:
+        trace.add("total", elapsed)
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["X-Trace-Id"] = trace.trace_id
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            logger.warning(f"Slow request {request.method} {request.url.path} "
+                           f"({elapsed:.2f}s) trace={trace.trace_id}: {trace.server_timing()}")
+    return response
@@ -0,0 +1,358 @@
+import asyncio
+import functools
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import or_, select, update
+
+from admission import admission
+from database import AsyncSessionLocal
+from extraction import iter_extraction
+from instrumentation import span
+from models import AnalysisJob, User
+from routes_analyses import add_analysis, log_analysis_created
+from schemas import AnalysisCreate
+from scraper import async_get_gutenberg_book
+
+logger = logging.getLogger(__name__)
+
+# Workers per API process (0 = this process only accepts jobs, others run them)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+# A running job whose heartbeat is older than this belonged to a dead worker
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A job deferred this many times (429/503) fails instead of waiting forever; the
+# wait doubles with each deferral up to JOB_MAX_DEFER_SECONDS
+JOB_MAX_DEFERRALS = int(os.getenv("JOB_MAX_DEFERRALS", "20"))
+JOB_MAX_DEFER_SECONDS = float(os.getenv("JOB_MAX_DEFER_SECONDS", "300"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def run_pipeline(job: AnalysisJob, progress: dict) -> Optional[dict]:
+    """Download (Gutenberg jobs) and extract the text, keeping `progress` up to date."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise RuntimeError("API key not configured.")
+
+    params = job.params or {}
+    if job.kind == "gutenberg":
+        text = await async_get_gutenberg_book(params["book_id"])
+        if text.startswith("Gutenberg Error"):
+            raise RuntimeError(text)
+        if params.get("limit_chars"):
+            text = text[:params["limit_chars"]]
+    else:
+        text = params["text"]
+
+    # Jobs count against the same global, token and per-user limits as interactive
+    # requests (keyed like admission.client_key); a 429/503 re-queues the job for later
+    async with AsyncSessionLocal() as db:
+        username = (await db.execute(select(User.username).where(User.id == job.user_id))).scalar()
+    admit = functools.partial(admission.admit, f"user:{username or job.user_id}")
+
+    graph = None
+    async for event in iter_extraction(text, api_key, admit):
+        if event["event"] == "progress":
+            progress.update(event["data"])
+        elif event["event"] == "final":
+            graph = event["data"]
+            progress["failed_chunks"] = graph.get("failed_chunks", [])
+    return graph
+
+
+def analysis_name(job: AnalysisJob) -> str:
+    params = job.params or {}
+    if params.get("name"):
+        return params["name"]
+    if job.kind == "gutenberg":
+        return f"Gutenberg #{params.get('book_id')}"
+    return "Untitled analysis"
+
+
+class JobWorkerPool:
+    """
+    Background asyncio workers that run queued AnalysisJobs to completion.
+
+    Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED plus a conditional
+    UPDATE, so any number of processes can share the queue. A running job's row is
+    heartbeated with its progress; jobs whose heartbeat goes stale (the worker died)
+    are re-queued up to JOB_MAX_ATTEMPTS times. Results are saved as an Analysis in
+    the same transaction that marks the job succeeded.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: list = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.claimed_total = 0
+        self.succeeded_total = 0
+        self.failed_total = 0
+        self.cancelled_total = 0
+        self.requeued_total = 0
+        self.deferred_total = 0
+
+    def start(self):
+        if self.workers <= 0 or self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+        logger.info(f"✓ Started {self.workers} analysis job workers ({self.worker_id})")
+
+    async def stop(self):
+        """Stop the workers and hand their unfinished jobs straight back to the queue."""
+        if not self._tasks:
+            return
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.status == "running", AnalysisJob.worker_id == self.worker_id)
+                    .values(status="queued", worker_id=None, attempts=AnalysisJob.attempts - 1)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not release running jobs: {e}")
+
+    def notify(self):
+        """Wake an idle worker now instead of at its next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job running in this process (other processes notice on their next heartbeat)."""
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def claim(self) -> Optional[AnalysisJob]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AnalysisJob)
+                .where(AnalysisJob.status == "queued",
+                       or_(AnalysisJob.run_after.is_(None), AnalysisJob.run_after <= utcnow()))
+                .order_by(AnalysisJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = result.scalars().first()
+            if job is None:
+                return None
+            now = utcnow()
+            # Guarded by status for databases without row locks (SQLite)
+            claimed = await db.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job.id, AnalysisJob.status == "queued")
+                .values(status="running", worker_id=self.worker_id, attempts=AnalysisJob.attempts + 1,
+                        started_at=now, heartbeat_at=now, error=None, run_after=None)
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return None
+        self.claimed_total += 1
+        return job
+
+    async def _worker_loop(self):
+        while True:
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: AnalysisJob):
+        progress: dict = {}
+        task = asyncio.create_task(run_pipeline(job, progress))
+        self._running[job.id] = task
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, task, progress))
+        try:
+            with span("job_run"):
+                graph = await task
+        except asyncio.CancelledError:
+            if self._stopping:
+                raise
+            # Cancelled through the API; the row already says so
+            self.cancelled_total += 1
+            return
+        except HTTPException as e:
+            error = e.detail
+            if e.status_code in (429, 503):
+                # Admission refused or the provider is rate limiting: not the job's fault
+                if job.deferrals < JOB_MAX_DEFERRALS:
+                    retry_after = float((e.headers or {}).get("Retry-After", JOB_POLL_INTERVAL))
+                    backoff = min(JOB_MAX_DEFER_SECONDS, JOB_POLL_INTERVAL * 2 ** job.deferrals)
+                    await self._defer(job.id, progress, max(retry_after, backoff))
+                    return
+                error = f"Still refused after {job.deferrals} deferrals: {e.detail}"
+            logger.warning(f"Job {job.id} failed: {error}")
+            await self._finish(job.id, progress, status="failed", error=error)
+            return
+        except Exception as e:
+            detail = str(e)
+            logger.warning(f"Job {job.id} failed: {detail}")
+            await self._finish(job.id, progress, status="failed", error=detail)
+            return
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job.id, None)
+
+        if graph is None:
+            await self._finish(job.id, progress, status="failed", error="Extraction produced no graph")
+            return
+        try:
+            await self._save_result(job, graph, progress)
+        except Exception as e:
+            logger.warning(f"Saving job {job.id} failed: {e}")
+            await self._finish(job.id, progress, status="failed", error=f"Saving analysis failed: {e}")
+
+    def _owned(self, job_id: str):
+        return (AnalysisJob.id == job_id, AnalysisJob.status == "running",
+                AnalysisJob.worker_id == self.worker_id)
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task, progress: dict):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        update(AnalysisJob).where(*self._owned(job_id))
+                        .values(heartbeat_at=utcnow(), progress=dict(progress))
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+                continue
+            if result.rowcount == 0:
+                # Cancelled (possibly via another process) or re-queued as stale
+                task.cancel()
+                return
+
+    async def _finish(self, job_id: str, progress: dict, **values):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(AnalysisJob).where(*self._owned(job_id))
+                    .values(finished_at=utcnow(), progress=dict(progress), **values)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not record result of job {job_id}: {e}")
+        if values.get("status") == "failed":
+            self.failed_total += 1
+
+    async def _defer(self, job_id: str, progress: dict, retry_after: float):
+        """Put a running job back in the queue, not to be claimed for retry_after seconds."""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(AnalysisJob).where(*self._owned(job_id))
+                    .values(status="queued", worker_id=None, attempts=AnalysisJob.attempts - 1,
+                            deferrals=AnalysisJob.deferrals + 1,
+                            run_after=utcnow() + timedelta(seconds=retry_after), progress=dict(progress))
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not re-queue job {job_id}: {e}")
+        self.deferred_total += 1
+
+    async def _save_result(self, job: AnalysisJob, graph: dict, progress: dict):
+        params = job.params or {}
+        analysis_data = AnalysisCreate(
+            name=analysis_name(job),
+            description=params.get("description"),
+            nodes=graph["nodes"],
+            links=graph["links"],
+        )
+        async with AsyncSessionLocal() as db:
+            analysis = await add_analysis(db, job.user_id, analysis_data)
+            result = await db.execute(
+                update(AnalysisJob).where(*self._owned(job.id))
+                .values(status="succeeded", analysis_id=analysis.id, finished_at=utcnow(),
+                        progress=dict(progress))
+            )
+            if result.rowcount != 1:
+                # Cancelled while extracting: drop the analysis with the transaction
+                await db.rollback()
+                self.cancelled_total += 1
+                return
+            await db.commit()
+        self.succeeded_total += 1
+        await log_analysis_created(analysis)
+
+    async def requeue_stale(self) -> int:
+        """Re-queue running jobs with a stale heartbeat; fail those out of attempts."""
+        cutoff = utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+        stale = (AnalysisJob.status == "running", AnalysisJob.heartbeat_at < cutoff)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(AnalysisJob)
+                .where(*stale, AnalysisJob.attempts >= JOB_MAX_ATTEMPTS)
+                .values(status="failed", worker_id=None, finished_at=utcnow(),
+                        error=f"Worker stopped responding ({JOB_MAX_ATTEMPTS} attempts)")
+            )
+            requeued = await db.execute(
+                update(AnalysisJob)
+                .where(*stale, AnalysisJob.attempts < JOB_MAX_ATTEMPTS)
+                .values(status="queued", worker_id=None)
+            )
+            await db.commit()
+        if requeued.rowcount:
+            self.requeued_total += requeued.rowcount
+            logger.warning(f"Re-queued {requeued.rowcount} stale analysis jobs")
+            self.notify()
+        return requeued.rowcount
+
+    async def _reaper_loop(self):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                await self.requeue_stale()
+            except Exception as e:
+                logger.warning(f"Stale job check failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "running": len(self._running),
+            "claimed_total": self.claimed_total,
+            "succeeded_total": self.succeeded_total,
+            "failed_total": self.failed_total,
+            "cancelled_total": self.cancelled_total,
+            "requeued_total": self.requeued_total,
+            "deferred_total": self.deferred_total,
+        }
+
+
+# Global worker pool (started/stopped with the app)
+job_workers = JobWorkerPool()
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func
+
+from database import SessionLocal
+from graph_utils import endpoint_id
+from models import Analysis
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_ROW_GROUP_ROWS = 50000
+# Across all partitions: the largest buffers are flushed once this many rows are waiting
+DEFAULT_MAX_BUFFERED_ROWS = 200000
+DEFAULT_MAX_OPEN_FILES = 64
+# Rows committed late (transaction started before the last export finished) can carry
+# a modified_at just behind the watermark; each run re-reads this window and skips
+# the (id, version) pairs it already exported.
+DEFAULT_OVERLAP = timedelta(minutes=10)
+WATERMARK_FILE = "_watermark.json"
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+NODE_SCHEMA = pa.schema([
+    ("analysis_id", pa.string()),
+    ("user_id", pa.string()),
+    ("analysis_name", pa.string()),
+    ("node_id", pa.string()),
+    ("description", pa.string()),
+    ("size", pa.float64()),
+    ("val", pa.float64()),
+    ("updated_at", pa.timestamp("us", tz="UTC")),
+])
+
+LINK_SCHEMA = pa.schema([
+    ("analysis_id", pa.string()),
+    ("user_id", pa.string()),
+    ("source_id", pa.string()),
+    ("target_id", pa.string()),
+    ("relationship_type", pa.string()),
+    ("updated_at", pa.timestamp("us", tz="UTC")),
+])
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _partition_value(value) -> str:
+    """Hive-style partition directory value (escaped so any work title is a safe path)."""
+    if value is None or str(value) == "":
+        return DEFAULT_PARTITION
+    return quote(str(value), safe=" ")
+
+
+class PartitionedParquetWriter:
+    """
+    Writes node and link rows as zstd-compressed Parquet under
+    <root>/<nodes|links>/export_date=YYYY-MM-DD/work=<work>/part-<run>-<n>.parquet.
+
+    Rows are buffered per partition and appended to that partition's open file as
+    a row group once row_group_rows are waiting. Input is expected roughly in
+    export_date order: partitions of older dates are flushed and closed as soon as
+    a newer date arrives. Buffered rows are capped at max_buffered_rows (largest
+    buffers are flushed first) and open files at max_open_files (least recently
+    used is closed; its partition continues in a new part file), so memory and
+    file handles stay bounded no matter how much history is exported. Files are
+    complete only after close() (use the writer as a context manager).
+    """
+
+    def __init__(self, root: str, compression: str = "zstd",
+                 row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+                 max_buffered_rows: int = DEFAULT_MAX_BUFFERED_ROWS,
+                 max_open_files: int = DEFAULT_MAX_OPEN_FILES):
+        self.root = root
+        self.compression = compression
+        self.row_group_rows = row_group_rows
+        self.max_buffered_rows = max_buffered_rows
+        self.max_open_files = max(1, max_open_files)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.files_written = 0
+        self.rows_written = {"nodes": 0, "links": 0}
+        self._writers: "OrderedDict[Tuple[str, str, str], pq.ParquetWriter]" = OrderedDict()
+        self._buffers: Dict[Tuple[str, str, str], List[dict]] = defaultdict(list)
+        self._buffered_rows = 0
+        self._latest_date: Optional[str] = None
+        self._schemas = {"nodes": NODE_SCHEMA, "links": LINK_SCHEMA}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def open_files(self) -> int:
+        return len(self._writers)
+
+    @property
+    def buffered_rows(self) -> int:
+        return self._buffered_rows
+
+    def write(self, kind: str, schema: pa.Schema, partitions: Dict[Tuple[str, str], List[dict]]):
+        self._schemas[kind] = schema
+        for (export_date, work), rows in partitions.items():
+            key = (kind, export_date, _partition_value(work))
+            buffer = self._buffers[key]
+            buffer.extend(rows)
+            self._buffered_rows += len(rows)
+            self.rows_written[kind] += len(rows)
+            if len(buffer) >= self.row_group_rows:
+                self._flush(key)
+
+        newest = max((export_date for export_date, _ in partitions), default=None)
+        if newest is not None and (self._latest_date is None or newest > self._latest_date):
+            self._latest_date = newest
+            self._finish_before(newest)
+        while self._buffered_rows > self.max_buffered_rows:
+            self._flush(max(self._buffers, key=lambda key: len(self._buffers[key])))
+
+    def _finish_before(self, export_date: str):
+        """Flush and close every partition of an older export_date."""
+        for key in [key for key in self._buffers if key[1] < export_date]:
+            self._flush(key)
+        for key in [key for key in self._writers if key[1] < export_date]:
+            self._writers.pop(key).close()
+
+    def _flush(self, key: Tuple[str, str, str]):
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        self._buffered_rows -= len(rows)
+        kind, export_date, work = key
+        schema = self._schemas[kind]
+        writer = self._writers.get(key)
+        if writer is None:
+            while len(self._writers) >= self.max_open_files:
+                _, oldest = self._writers.popitem(last=False)
+                oldest.close()
+            directory = os.path.join(self.root, kind, f"export_date={export_date}", f"work={work}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{self.run_id}-{self.files_written:06d}.parquet")
+            writer = pq.ParquetWriter(path, schema, compression=self.compression)
+            self._writers[key] = writer
+            self.files_written += 1
+        else:
+            self._writers.move_to_end(key)
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+    def close(self):
+        """Flush buffered rows and finish every open file."""
+        try:
+            for key in list(self._buffers):
+                self._flush(key)
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers.clear()
+
+    def write_graph_batch(self, analyses: Iterable[dict]):
+        """Flatten a batch of analyses (dicts with id/user_id/name/nodes/links/updated_at)."""
+        node_partitions = defaultdict(list)
+        link_partitions = defaultdict(list)
+        for analysis in analyses:
+            updated_at = analysis["updated_at"]
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            export_date = updated_at.date().isoformat()
+            works = {}
+            for node in analysis["nodes"] or []:
+                work = node.get("work") or node.get("source_work")
+                works[node.get("id")] = work
+                node_partitions[(export_date, work)].append({
+                    "analysis_id": analysis["id"],
+                    "user_id": analysis["user_id"],
+                    "analysis_name": analysis["name"],
+                    "node_id": None if node.get("id") is None else str(node.get("id")),
+                    "description": node.get("description"),
+                    "size": _to_float(node.get("size")),
+                    "val": _to_float(node.get("val")),
+                    "updated_at": updated_at,
+                })
+            for link in analysis["links"] or []:
+                source = endpoint_id(link.get("source"))
+                target = endpoint_id(link.get("target"))
+                work = link.get("source_work") or works.get(source)
+                link_partitions[(export_date, work)].append({
+                    "analysis_id": analysis["id"],
+                    "user_id": analysis["user_id"],
+                    "source_id": None if source is None else str(source),
+                    "target_id": None if target is None else str(target),
+                    "relationship_type": link.get("label"),
+                    "updated_at": updated_at,
+                })
+        self.write("nodes", NODE_SCHEMA, node_partitions)
+        self.write("links", LINK_SCHEMA, link_partitions)
+
+
+def read_watermark(root: str) -> Tuple[Optional[datetime], Set[Tuple[str, int]]]:
+    """The stored watermark and the (id, version) pairs exported inside its overlap window."""
+    try:
+        with open(os.path.join(root, WATERMARK_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None, set()
+    exported = {(analysis_id, version) for analysis_id, version in data.get("exported", [])}
+    return datetime.fromisoformat(data["updated_at"]), exported
+
+
+def write_watermark(root: str, watermark: datetime, exported: Iterable[Tuple[str, int]] = ()):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"updated_at": watermark.isoformat(), "exported": sorted(exported)}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def export_analyses(root: str, since: Optional[datetime] = None,
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    exported: Optional[Set[Tuple[str, int]]] = None,
+                    overlap: timedelta = DEFAULT_OVERLAP) -> dict:
+    """
+    Stream analyses modified after `since` (minus the overlap window) out of
+    Postgres in batches and write them as partitioned Parquet. `exported` holds
+    the (id, version) pairs a previous run already wrote, which are skipped.
+    Returns a summary including the new watermark and the pairs to pass next time.
+    """
+    exported = exported or set()
+    recent: Dict[Tuple[str, int], datetime] = {}
+    modified_at = func.coalesce(Analysis.updated_at, Analysis.created_at)
+    watermark = since
+    analyses = skipped = 0
+    db = SessionLocal()
+    try:
+        with PartitionedParquetWriter(root) as writer:
+            query = db.query(
+                Analysis.id, Analysis.user_id, Analysis.name, Analysis.nodes, Analysis.links,
+                Analysis.version, modified_at.label("modified_at")
+            )
+            if since is not None:
+                query = query.filter(modified_at > since - overlap)
+            # yield_per streams rows through a server-side cursor instead of loading everything
+            query = query.order_by(modified_at, Analysis.id).yield_per(batch_size)
+
+            batch = []
+            for row in query:
+                key = (row.id, row.version)
+                recent[key] = row.modified_at
+                if watermark is None or row.modified_at > watermark:
+                    watermark = row.modified_at
+                if key in exported:
+                    skipped += 1
+                    continue
+                batch.append({
+                    "id": row.id,
+                    "user_id": row.user_id,
+                    "name": row.name,
+                    "nodes": row.nodes,
+                    "links": row.links,
+                    "updated_at": row.modified_at,
+                })
+                if len(batch) >= batch_size:
+                    writer.write_graph_batch(batch)
+                    analyses += len(batch)
+                    batch = []
+            if batch:
+                writer.write_graph_batch(batch)
+                analyses += len(batch)
+    finally:
+        db.close()
+
+    # Everything the next run's overlap window will re-read was either written or
+    # skipped here; older pairs (and rows since changed or deleted) can be forgotten
+    exported = set()
+    if watermark is not None:
+        exported = {key for key, modified in recent.items() if modified > watermark - overlap}
+    return {
+        "analyses": analyses,
+        "skipped": skipped,
+        "files": writer.files_written,
+        "rows": writer.rows_written,
+        "watermark": watermark.isoformat() if watermark else None,
+        "exported": sorted(exported),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export saved analyses as partitioned Parquet for the lakehouse")
+    parser.add_argument("--out", default="lakehouse_export", help="Output directory (local path or mounted volume)")
+    parser.add_argument("--since", help="Export analyses modified after this ISO timestamp")
+    parser.add_argument("--full", action="store_true", help="Ignore the stored watermark and export everything")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    exported = set()
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+    elif args.full:
+        since = None
+    else:
+        since, exported = read_watermark(args.out)
+
+    summary = export_analyses(args.out, since=since, batch_size=args.batch_size, exported=exported)
+    if summary["watermark"]:
+        write_watermark(args.out, datetime.fromisoformat(summary["watermark"]), summary["exported"])
+    print(json.dumps({key: value for key, value in summary.items() if key != "exported"}, indent=2))
@@ -0,0 +1,132 @@
+import asyncio
+import os
+from functools import lru_cache
+from typing import Callable, Optional
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+
+from instrumentation import span, observe_payload, record_llm_usage
+
+MODEL_NAME = "gemini-2.5-flash"
+# Bump whenever EXTRACTION_PROMPT or the merge/format logic changes so cached graphs are not reused
+PROMPT_VERSION = "1"
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+EXTRACTION_PROMPT = PromptTemplate(
+    template="""
+            You are a Multiversal Detective. Extract a Knowledge Graph from the text.
+
+            1. Identify characters and their relationships.
+            2. Identify the "Work" or "System" this text belongs to (e.g. "Pride and Prejudice", "FNAF", "Dracula").
+
+            Return ONLY a valid JSON object:
+            {{
+                "nodes": [
+                    {{"id": "Character Name", "source_work": "Name of the Book/Game/Movie"}}
+                ],
+                "edges": [
+                    {{"source": "Name A", "target": "Name B", "label": "RELATIONSHIP", "source_work": "Name of the Book/Game/Movie"}}
+                ]
+            }}
+
+            IMPORTANT: Use consistent naming for characters. Ensure 'source' and 'target' in edges exactly match an 'id' in nodes.
+
+            Text: {text}
+            """,
+    input_variables=["text"],
+)
+
+DOSSIER_PROMPT = PromptTemplate(
+    template="""
+                You are a Multiversal Detective. Create a dossier for character "{character_name}" from "{system_name}".
+                Return ONLY a valid JSON object.
+                {{
+                    "name": "{character_name}",
+                    "biography": "Brief bio.",
+                    "notable_events": ["Event 1"]
+                }}
+            """,
+    input_variables=["character_name", "system_name"],
+)
+
+json_parser = JsonOutputParser()
+
+# Output token budget per chain; None leaves the model default
+PROMPTS = {
+    "extraction": (EXTRACTION_PROMPT, 8192),
+    "dossier": (DOSSIER_PROMPT, None),
+}
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def gemini_chat_model(api_key: str, max_output_tokens: Optional[int] = None) -> ChatGoogleGenerativeAI:
+    kwargs = {"max_output_tokens": max_output_tokens} if max_output_tokens else {}
+    return ChatGoogleGenerativeAI(
+        model=MODEL_NAME,
+        google_api_key=api_key,
+        temperature=0,
+        **kwargs
+    )
+
+
+# Builds the chat model for (api_key, max_output_tokens); swapped out by benchmarks
+_chat_model_factory: Callable = gemini_chat_model
+
+
+def set_chat_model_factory(factory: Callable):
+    """Replace the chat model implementation (e.g. a fake model for load tests)."""
+    global _chat_model_factory
+    _chat_model_factory = factory
+    get_chat_model.cache_clear()
+    get_chain.cache_clear()
+
+
+@lru_cache(maxsize=32)
+def get_chat_model(api_key: str, max_output_tokens: Optional[int] = None):
+    """One client per (API key, token budget) so HTTP connections are reused across requests."""
+    return _chat_model_factory(api_key, max_output_tokens)
+
+
+@lru_cache(maxsize=64)
+def get_chain(name: str, api_key: str):
+    """
+    Build (once) the prompt | llm chain for a prompt name and API key. The JSON
+    parser runs separately in ainvoke_chain so model time and parse time are measured apart.
+    """
+    prompt, max_output_tokens = PROMPTS[name]
+    return prompt | get_chat_model(api_key, max_output_tokens)
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def ainvoke_chain(name: str, api_key: str, inputs: dict, timeout: Optional[float] = None):
+    """
+    Run a chain asynchronously. At most LLM_MAX_CONCURRENCY calls are in flight
+    per worker, and each call is cancelled after timeout seconds (asyncio.TimeoutError).
+    """
+    chain = get_chain(name, api_key)
+    async with _get_semaphore():
+        with span(f"llm_{name}"):
+            message = await asyncio.wait_for(chain.ainvoke(inputs), timeout or LLM_TIMEOUT_SECONDS)
+    record_llm_usage(name, message)
+    observe_payload(f"llm_{name}_response_chars", len(str(message.content)))
+    with span(f"parse_{name}"):
+        return json_parser.invoke(message)
+
+
+def warm_up(api_key: Optional[str]):
+    """Build the default chains at startup so the first request doesn't pay for it."""
+    if not api_key:
+        return
+    for name in PROMPTS:
+        get_chain(name, api_key)
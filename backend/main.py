@@ -1,23 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Response
 from pydantic import BaseModel
 from typing import List, Optional
-import networkx as nx
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import asyncio
+import functools
+import json
+import logging
 import os
 import traceback
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from scraper import get_gutenberg_book
-from database import init_db
+from fastapi.responses import StreamingResponse
+from scraper import async_get_gutenberg_book
+from http_client import close_client
+from extraction import run_extraction, iter_extraction
+from llm import DOSSIER_PROMPT, ainvoke_chain, warm_up
+from extraction_cache import extraction_cache
+from database import init_db, close_db
+from databricks_integration import get_databricks_client
 from routes_auth import router as auth_router
 from routes_analyses import router as analyses_router
 from routes_ml import router as ml_router
+from routes_jobs import router as jobs_router
+from jobs import job_workers
+from admission import admission, client_key, estimate_tokens, is_rate_limit_error, rejection
 from ml_predictor import predictor
+import ml_worker
+from password_hashing import password_hasher
+from instrumentation import instrument_sqlalchemy, metrics_response, stats_collector, trace_requests
+from auth_cache import auth_cache
+from graph_analytics import metrics_cache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="MythInformation API")
 
 app.add_middleware(
@@ -30,22 +46,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Trace-Id"],
 )
 
+# Per-stage latency histograms (GET /metrics) and opt-in per-request traces
+app.middleware("http")(trace_requests)
+instrument_sqlalchemy()
+stats_collector.register("extraction_cache", extraction_cache.stats)
+stats_collector.register("ml_batcher", ml_worker.batcher.metrics)
+stats_collector.register("auth_cache", auth_cache.stats)
+stats_collector.register("graph_metrics_cache", metrics_cache.stats)
+stats_collector.register("databricks", lambda: get_databricks_client().stats())
+stats_collector.register("jobs", job_workers.stats)
+stats_collector.register("admission", admission.stats)
+
 # Initialize database and ML model on startup
 @app.on_event("startup")
 async def startup_event():
     init_db()
-    # Load ML model (optional - will work without it)
+    # Resume delivering analyses left in the Databricks outbox by a previous run
+    get_databricks_client().start()
+    warm_up(os.getenv("GOOGLE_API_KEY"))
+    # Pick up queued analysis jobs, including ones interrupted by a restart
+    job_workers.start()
+    # Load ML model in the background (optional - will work without it)
     try:
-        predictor.load_model()
+        predictor.load_in_background()
     except Exception as e:
         print(f"Warning: ML model failed to load: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_workers.stop()
+    await close_client()
+    await ml_worker.shutdown()
+    password_hasher.shutdown()
+    await asyncio.to_thread(get_databricks_client().stop)
+    await close_db()
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(analyses_router)
 app.include_router(ml_router)
+app.include_router(jobs_router)
 
 class LoreRequest(BaseModel):
     text: str
@@ -59,9 +102,27 @@ class LoreRequest(BaseModel):
             raise ValueError("Text exceeds maximum length of 50,000 characters")
         return True
 
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that always closes `events` once the response is over, also when
+    the client disconnects before the body starts and the body iterator never runs.
+    """
+
+    def __init__(self, content, events, **kwargs):
+        super().__init__(content, **kwargs)
+        self.events = events
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.events.aclose()
+
 class GraphResponse(BaseModel):
     nodes: List[dict]
     links: List[dict]
+    # Chunks of the text whose extraction failed; the graph is partial when non-empty
+    failed_chunks: List[int] = []
 
 class DossierResponse(BaseModel):
     name: str
@@ -72,77 +133,14 @@ class DossierResponse(BaseModel):
 def health_check():
     return {"status": "MythInformation Brain is Active"}
 
-async def run_extraction(text: str, api_key: str):
-    try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=api_key,
-            temperature=0,
-            max_output_tokens=8192
-        )
-
-        parser = JsonOutputParser()
-
-        prompt = PromptTemplate(
-            template="""
-            You are a Multiversal Detective. Extract a Knowledge Graph from the text.
-            
-            1. Identify characters and their relationships.
-            2. Identify the "Work" or "System" this text belongs to (e.g. "Pride and Prejudice", "FNAF", "Dracula").
-            
-            Return ONLY a valid JSON object:
-            {{
-                "nodes": [
-                    {{"id": "Character Name", "source_work": "Name of the Book/Game/Movie"}}
-                ],
-                "edges": [
-                    {{"source": "Name A", "target": "Name B", "label": "RELATIONSHIP", "source_work": "Name of the Book/Game/Movie"}}
-                ]
-            }}
-            
-            IMPORTANT: Use consistent naming for characters. Ensure 'source' and 'target' in edges exactly match an 'id' in nodes.
-            
-            Text: {text}
-            """,
-            input_variables=["text"],
-        )
-
-        chain = prompt | llm | parser
-        result = chain.invoke({"text": text})
-
-        G = nx.Graph()
-        nodes_list = result.get("nodes", [])
-        edges_list = result.get("edges", [])
-        
-        for node in nodes_list:
-            G.add_node(node["id"])
-        for edge in edges_list:
-            G.add_edge(edge["source"], edge["target"])
-        
-        centrality = nx.degree_centrality(G) if len(G.nodes) > 0 else {}
-        
-        formatted_nodes = []
-        for node_data in nodes_list:
-            node_id = node_data["id"]
-            work = node_data.get("source_work", "Unknown System")
-            raw_importance = centrality.get(node_id, 0)
-            size = 5 + (raw_importance * 50)
-            
-            formatted_nodes.append({
-                "id": node_id,
-                "work": work,
-                "size": size,
-                "val": size
-            })
-            
-        return {"nodes": formatted_nodes, "links": edges_list}
-
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Extraction Error: {str(e)}")
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    body, content_type = metrics_response()
+    return Response(content=body, media_type=content_type)
 
 @app.post("/analyze", response_model=GraphResponse)
-async def analyze_lore(request: LoreRequest):
+async def analyze_lore(request: LoreRequest, client: str = Depends(client_key)):
     try:
         request.validate_text()
     except ValueError as e:
@@ -152,44 +150,91 @@ async def analyze_lore(request: LoreRequest):
     if not api_key:
         raise HTTPException(status_code=500, detail="API key not configured. Set GOOGLE_API_KEY environment variable.")
     
-    return await run_extraction(request.text, api_key)
+    return await run_extraction(request.text, api_key, functools.partial(admission.admit, client))
+
+@app.post("/analyze/stream")
+async def analyze_lore_stream(request: LoreRequest, client: str = Depends(client_key)):
+    """
+    Same extraction as /analyze, streamed as Server-Sent Events.
+
+    Emits "progress" events per chunk, "nodes"/"edges" events as each chunk is
+    merged, and a "final" event carrying the full graph with centrality-based
+    size/val. Failures after the stream has started arrive as an "error" event;
+    admission rejections (429/503) happen before it starts.
+    """
+    try:
+        request.validate_text()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+    
+    api_key = request.api_key or os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="API key not configured. Set GOOGLE_API_KEY environment variable.")
+    
+    events = iter_extraction(request.text, api_key, functools.partial(admission.admit, client))
+    # Advance to the first event now, so admission (and the empty-text check) can
+    # still answer with a plain HTTP error; the generator then holds the slot
+    first = await events.__anext__()
+
+    async def event_stream():
+        try:
+            yield f"event: {first['event']}\ndata: {json.dumps(first['data'])}\n\n"
+            async for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except HTTPException as e:
+            yield f"event: error\ndata: {json.dumps({'status_code': e.status_code, 'detail': e.detail})}\n\n"
+        except Exception:
+            logger.exception("Streaming extraction failed")
+            yield f"event: error\ndata: {json.dumps({'status_code': 500, 'detail': 'Extraction Error'})}\n\n"
+        finally:
+            await events.aclose()
+    
+    # Closes the primed generator (releasing its admission slot) even if the body never starts
+    return ClosingStreamingResponse(
+        event_stream(),
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/analyze-gutenberg/{book_id}", response_model=GraphResponse)
-async def analyze_gutenberg(book_id: str, limit_chars: int = 100000):
+async def analyze_gutenberg(book_id: str, limit_chars: Optional[int] = None,
+                            client: str = Depends(client_key)):
+    """Synchronous analysis of a book. Long books should go through POST /jobs/gutenberg."""
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise HTTPException(status_code=500, detail="API key not configured.")
     
-    text = get_gutenberg_book(book_id)
+    text = await async_get_gutenberg_book(book_id)
     if text.startswith("Gutenberg Error"):
         raise HTTPException(status_code=500, detail=text)
     
-    return await run_extraction(text[:limit_chars], api_key)
+    # The whole book is chunked and extracted; limit_chars is only an optional cap
+    if limit_chars:
+        text = text[:limit_chars]
+    return await run_extraction(text, api_key, functools.partial(admission.admit, client))
 
 @app.get("/character-dossier/{character_name}", response_model=DossierResponse)
-async def character_dossier(character_name: str, system_name: str = "Unknown"):
+async def character_dossier(character_name: str, system_name: str = "Unknown",
+                            client: str = Depends(client_key)):
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise HTTPException(status_code=500, detail="API key not configured.")
     
+    tokens = estimate_tokens(len(DOSSIER_PROMPT.template) + len(character_name) + len(system_name))
     try:
-        prompt = PromptTemplate(
-            template="""
-                You are a Multiversal Detective. Create a dossier for character "{character_name}" from "{system_name}".
-                Return ONLY a valid JSON object.
-                {{
-                    "name": "{character_name}",
-                    "biography": "Brief bio.",
-                    "notable_events": ["Event 1"]
-                }}  
-            """,
-            input_variables=["character_name", "system_name"],
-        )
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=api_key, temperature=0)
-        chain = prompt | llm | JsonOutputParser()
-        return chain.invoke({"character_name": character_name, "system_name": system_name})
+        async with admission.slot(client, tokens):
+            return await ainvoke_chain(
+                "dossier", api_key, {"character_name": character_name, "system_name": system_name}
+            )
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Dossier generation timed out")
     except Exception as e:
         traceback.print_exc()
+        if is_rate_limit_error(e):
+            raise rejection(503, "LLM provider rate limit reached; try again later", admission.provider_backoff(e))
         raise HTTPException(status_code=500, detail=f"Dossier generation failed: {str(e)}")
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Ordered, append-only list of (id, statements). create_all() builds new databases
+# with the current schema; these bring existing Postgres databases up to date and
+# each one runs exactly once (tracked in schema_migrations).
+MIGRATIONS = [
+    ("0001_analysis_summary_columns", [
+        "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS node_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS link_count INTEGER NOT NULL DEFAULT 0",
+        """UPDATE analyses SET
+            node_count = COALESCE(json_array_length(nodes::json), 0),
+            link_count = COALESCE(json_array_length(links::json), 0)""",
+        "UPDATE analyses SET updated_at = created_at WHERE updated_at IS NULL",
+        "ALTER TABLE analyses ALTER COLUMN updated_at SET DEFAULT now()",
+        "CREATE INDEX IF NOT EXISTS ix_analyses_user_id_updated_at ON analyses (user_id, updated_at)",
+    ]),
+    ("0002_analysis_jsonb", [
+        "ALTER TABLE analyses ALTER COLUMN nodes TYPE jsonb USING nodes::jsonb",
+        "ALTER TABLE analyses ALTER COLUMN links TYPE jsonb USING links::jsonb",
+        "ALTER TABLE analyses ALTER COLUMN work_meta TYPE jsonb USING work_meta::jsonb",
+    ]),
+    ("0003_analysis_version", [
+        "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    ]),
+    # The tables come from create_all(); backfill them with `python graph_index.py reindex`
+    ("0004_graph_search_trigram", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_characters_name_trgm ON analysis_characters USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_characters_work_trgm ON analysis_characters USING gin (work gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_relationships_source_trgm ON analysis_relationships USING gin (source gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_relationships_target_trgm ON analysis_relationships USING gin (target gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_relationships_label_trgm ON analysis_relationships USING gin (label gin_trgm_ops)",
+    ]),
+    # analysis_jobs comes from create_all(); workers only ever scan the queued rows
+    ("0005_analysis_jobs_queue_index", [
+        "CREATE INDEX IF NOT EXISTS ix_analysis_jobs_queued ON analysis_jobs (created_at) WHERE status = 'queued'",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_jobs_running_heartbeat ON analysis_jobs (heartbeat_at) WHERE status = 'running'",
+    ]),
+    ("0006_analysis_jobs_run_after", [
+        "ALTER TABLE analysis_jobs ADD COLUMN IF NOT EXISTS run_after TIMESTAMP WITH TIME ZONE",
+    ]),
+    # Early versions of 0002 also built GIN indexes on nodes/links. The subgraph queries
+    # read one analysis by primary key and cross-analysis search uses the normalized
+    # tables, so nothing filters by containment; drop them where they were built.
+    ("0007_drop_analysis_graph_gin", [
+        "DROP INDEX IF EXISTS ix_analyses_nodes_gin",
+        "DROP INDEX IF EXISTS ix_analyses_links_gin",
+    ]),
+    ("0008_analysis_jobs_deferrals", [
+        "ALTER TABLE analysis_jobs ADD COLUMN IF NOT EXISTS deferrals INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+# Migrations that need a Postgres extension. When it isn't installed and this role
+# may not create it, the migration is skipped with a warning and retried on the next
+# start; search still works without the trigram indexes, only slower.
+REQUIRED_EXTENSIONS = {
+    "0004_graph_search_trigram": "pg_trgm",
+}
+
+
+def _extension_available(conn, name: str) -> bool:
+    if conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = :name"), {"name": name}).first():
+        return True
+    try:
+        # Savepoint, so a permission error doesn't abort the migration transaction
+        with conn.begin_nested():
+            conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {name}"))
+        return True
+    except DBAPIError as e:
+        logger.warning(f"Postgres extension {name} is not installed and could not be created ({e.orig}); "
+                       f"ask a superuser to run `CREATE EXTENSION {name}`")
+        return False
+
+
+def run_migrations(engine):
+    """Apply pending migrations (Postgres only; other databases rely on create_all)."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            """CREATE TABLE IF NOT EXISTS schema_migrations (
+                id VARCHAR PRIMARY KEY,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+            )"""
+        ))
+        # Serialize concurrent workers starting at the same time
+        conn.execute(text("LOCK TABLE schema_migrations IN EXCLUSIVE MODE"))
+        applied = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+        for migration_id, statements in MIGRATIONS:
+            if migration_id in applied:
+                continue
+            extension = REQUIRED_EXTENSIONS.get(migration_id)
+            if extension and not _extension_available(conn, extension):
+                logger.warning(f"Skipping migration {migration_id} until {extension} is available")
+                continue
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(text("INSERT INTO schema_migrations (id) VALUES (:id)"), {"id": migration_id})
+            logger.info(f"✓ Applied migration {migration_id}")
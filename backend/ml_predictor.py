@@ -1,48 +1,276 @@
 import pickle
 import numpy as np
-from typing import Dict, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 import logging
 import os
+import threading
+import time
+
+from model_registry import ModelRegistry, ModelRegistryError, registry as default_registry, sha256_file
 
 logger = logging.getLogger(__name__)
 
+# How often each process re-reads the registry's ACTIVE file, so an activation done
+# through another worker (or the CLI) is picked up without a restart
+ML_MODEL_RECHECK_SECONDS = float(os.getenv("ML_MODEL_RECHECK_SECONDS", "10"))
+# Delay before retrying after the model failed to load
+ML_MODEL_RETRY_SECONDS = float(os.getenv("ML_MODEL_RETRY_SECONDS", "30"))
+# Unpickling a .pkl other than the bundled one is opt-in; import it into the registry instead
+ML_ALLOW_LEGACY_PICKLE = os.getenv("ML_ALLOW_LEGACY_PICKLE", "false").lower() == "true"
+LEGACY_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "relationship_predictor.pkl")
+UPGRADE_HINT = "run `python model_registry.py import-pkl models/relationship_predictor.pkl --activate`"
+# The model shipped in the repo. It is imported into the registry automatically on first
+# load, but only while its bytes match this digest; update both when retraining.
+BUNDLED_MODEL_SHA256 = "ee1d45be014002f99b6a429f63ccfbe43b103568f0cdc4eeaf1bf812f1134c52"
+BUNDLED_MODEL_VERSION = f"bundled-{BUNDLED_MODEL_SHA256[:12]}"
+
+# Column order of the feature matrix the model was trained on
+FEATURE_ORDER = [
+    "source_centrality",
+    "target_centrality",
+    "source_name_length",
+    "target_name_length",
+    "same_work",
+    "source_in_work",
+]
+
+def feature_columns(feature_names: List[str]) -> np.ndarray:
+    """
+    Indices that reorder a FEATURE_ORDER matrix into the model's feature_names order.
+    Models trained on features we don't compute (or missing some) can't be served.
+    """
+    if sorted(feature_names) != sorted(FEATURE_ORDER):
+        raise ModelRegistryError(f"Model features {list(feature_names)} don't match the computed "
+                                 f"features {FEATURE_ORDER}")
+    return np.array([FEATURE_ORDER.index(name) for name in feature_names])
+
+@dataclass
+class LoadedModel:
+    """Everything needed to score, swapped in as one object so readers never see a half-loaded model"""
+    model: object
+    label_classes: np.ndarray
+    feature_names: List[str]
+    version: str
+    # Validated on load, so a mismatched manifest is rejected before it is swapped in
+    columns: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.columns = feature_columns(self.feature_names)
+
 class RelationshipTypePredictor:
     """ML model for predicting relationship types between characters"""
     
-    def __init__(self):
-        self.model = None
-        self.label_encoder = None
-        self.feature_names = None
-        self.is_loaded = False
+    def __init__(self, registry: ModelRegistry = None):
+        self.registry = registry or default_registry
+        self._state: Optional[LoadedModel] = None
+        self._load_lock = threading.RLock()
+        self._retry_at = 0.0
+        self._next_check = 0.0
     
-    def load_model(self, model_path: str = None):
-        """Load the trained model and label encoder"""
+    @property
+    def is_loaded(self) -> bool:
+        return self._state is not None
+    
+    @property
+    def model(self):
+        return self._state.model if self._state else None
+    
+    @property
+    def feature_names(self) -> Optional[List[str]]:
+        return self._state.feature_names if self._state else None
+    
+    @property
+    def label_classes(self) -> Optional[List[str]]:
+        return self._state.label_classes.tolist() if self._state else None
+    
+    @property
+    def version(self) -> Optional[str]:
+        return self._state.version if self._state else None
+    
+    def _load_legacy_pickle(self, model_path: str, verified: bool = False) -> Optional[LoadedModel]:
+        if not os.path.exists(model_path):
+            logger.warning(f"Model file not found at {model_path}")
+            return None
+        if not verified:
+            if not ML_ALLOW_LEGACY_PICKLE:
+                logger.error(f"No active model in the registry and {model_path} is an unverified legacy "
+                             f"pickle (set ML_ALLOW_LEGACY_PICKLE=true to load it anyway); {UPGRADE_HINT}")
+                return None
+            logger.warning(f"Unpickling unverified legacy model {model_path} (ML_ALLOW_LEGACY_PICKLE=true); "
+                           f"{UPGRADE_HINT}")
+        
+        with open(model_path, 'rb') as f:
+            model_data = pickle.load(f)
+        
+        return LoadedModel(
+            model=model_data['model'],
+            label_classes=np.asarray(model_data['label_encoder'].classes_),
+            feature_names=list(model_data['feature_names']),
+            version=f"legacy:{os.path.basename(model_path)}"
+        )
+    
+    def _load_bundled_model(self) -> Optional[LoadedModel]:
+        """
+        First run with an empty registry: import the shipped .pkl once (after checking
+        it against BUNDLED_MODEL_SHA256) and activate it. When the registry directory
+        isn't writable, serve the verified file in place instead.
+        """
+        if not os.path.exists(LEGACY_MODEL_PATH) or sha256_file(LEGACY_MODEL_PATH) != BUNDLED_MODEL_SHA256:
+            return None
         try:
-            if model_path is None:
-                # Use absolute path relative to this script
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                model_path = os.path.join(current_dir, "models", "relationship_predictor.pkl")
-            
-            if model_path.endswith('.pkl'):
-                if not os.path.exists(model_path):
-                    logger.warning(f"Model file not found at {model_path}")
-                    self.is_loaded = False
-                    return
+            if BUNDLED_MODEL_VERSION not in {m["version"] for m in self.registry.versions()}:
+                self.registry.import_legacy_pickle(LEGACY_MODEL_PATH, version=BUNDLED_MODEL_VERSION)
+                logger.info(f"Imported bundled model into the registry as {BUNDLED_MODEL_VERSION}")
+            # Another worker may have activated something in the meantime
+            version = self.registry.active_version()
+            if version is None:
+                self.registry.activate(BUNDLED_MODEL_VERSION)
+                version = BUNDLED_MODEL_VERSION
+            return self._load_version(version)
+        except (OSError, ModelRegistryError) as e:
+            logger.warning(f"Could not import the bundled model into the registry ({e}); loading it in place")
+            return self._load_legacy_pickle(LEGACY_MODEL_PATH, verified=True)
+    
+    def _load_version(self, version: str) -> LoadedModel:
+        model, manifest = self.registry.load(version)
+        return LoadedModel(
+            model=model,
+            label_classes=np.asarray(manifest['label_classes']),
+            feature_names=manifest['feature_names'],
+            version=manifest['version']
+        )
+    
+    def load_model(self, model_path: str = None):
+        """
+        Load the active registry version, importing the bundled model when the registry
+        is empty. Any other .pkl (or model_path pointing at one) is only unpickled when
+        ML_ALLOW_LEGACY_PICKLE is set.
+        """
+        with self._load_lock:
+            self._next_check = time.monotonic() + ML_MODEL_RECHECK_SECONDS
+            try:
+                state = None
+                if model_path is None:
+                    version = self.registry.active_version()
+                    if version:
+                        state = self._load_version(version)
+                    else:
+                        state = self._load_bundled_model()
+                        model_path = LEGACY_MODEL_PATH
                 
-                with open(model_path, 'rb') as f:
-                    model_data = pickle.load(f)
+                if state is None and model_path is not None:
+                    if model_path.endswith('.pkl'):
+                        state = self._load_legacy_pickle(model_path)
+                    else:
+                        logger.warning("⚠ Could not load model - using fallback (predictions will return None)")
                 
-                self.model = model_data['model']
-                self.label_encoder = model_data['label_encoder']
-                self.feature_names = model_data['feature_names']
-                self.is_loaded = True
-                logger.info("✓ ML model loaded successfully")
-            else:
-                logger.warning("⚠ Could not load model - using fallback (predictions will return None)")
+                if state is not None:
+                    self._state = state
+                    logger.info(f"✓ ML model {state.version} loaded successfully")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to load model: {e}")
+            self._retry_at = time.monotonic() + ML_MODEL_RETRY_SECONDS
+    
+    def ensure_loaded(self) -> Optional[LoadedModel]:
+        """
+        Lazily load the model on first use, retrying every ML_MODEL_RETRY_SECONDS
+        while it fails, and follow the registry's ACTIVE version as it changes.
+        """
+        now = time.monotonic()
+        if self._state is None:
+            # Waits for a background load that is already in progress
+            with self._load_lock:
+                if self._state is None and now >= self._retry_at:
+                    self.load_model()
+        elif now >= self._next_check:
+            self._follow_active_version()
+        return self._state
+    
+    def _follow_active_version(self):
+        """Reload when ACTIVE names another version (set by another worker process)."""
+        # Only one thread re-checks; the others keep scoring with the current model
+        if not self._load_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + ML_MODEL_RECHECK_SECONDS
+            active = self.registry.active_version()
+            if active and self._state is not None and active != self._state.version:
+                logger.info(f"Registry ACTIVE changed to {active}, reloading")
+                self.load_model()
         except Exception as e:
-            logger.error(f"Failed to load model: {e}")
-            self.is_loaded = False
+            logger.error(f"Checking the active model version failed: {e}")
+        finally:
+            self._load_lock.release()
+    
+    def load_in_background(self):
+        """Start loading in a daemon thread so application startup isn't blocked."""
+        threading.Thread(target=self.ensure_loaded, name="ml-model-loader", daemon=True).start()
+    
+    def activate(self, version: str) -> str:
+        """
+        Load a registry version fully, then atomically swap it in and mark it active.
+        Other worker processes pick it up from ACTIVE within ML_MODEL_RECHECK_SECONDS.
+        """
+        # Under the load lock, so a concurrent load_model can't swap the old version back in
+        with self._load_lock:
+            state = self._load_version(version)
+            self.registry.activate(version)
+            self._state = state
+            self._next_check = time.monotonic() + ML_MODEL_RECHECK_SECONDS
+        logger.info(f"✓ ML model hot-swapped to {version}")
+        return state.version
 
+    def predict_batch(self, features) -> Dict[str, any]:
+        """
+        Score many (source, target) pairs in one vectorized pass.
+        
+        Args:
+            features: array-like of shape (n, 6), columns in FEATURE_ORDER
+        
+        Returns:
+            Dict with parallel lists of predicted relationship types and confidences
+        """
+        # Take one reference so a concurrent hot-swap can't mix two models in one batch
+        state = self.ensure_loaded()
+        if state is None:
+            return {
+                "predicted_relationships": None,
+                "confidences": None,
+                "error": "Model not loaded"
+            }
+        
+        try:
+            features = np.asarray(features, dtype=np.float64)
+            if features.ndim != 2 or features.shape[1] != len(FEATURE_ORDER):
+                raise ValueError(f"Expected feature rows of length {len(FEATURE_ORDER)}")
+            if len(features) == 0:
+                return {"predicted_relationships": [], "confidences": [], "error": None}
+            # Rows arrive in FEATURE_ORDER; the model expects its own manifest's order
+            features = features[:, state.columns]
+            
+            # One predict_proba pass; the label is the argmax, exactly what model.predict does
+            probabilities = state.model.predict_proba(features)
+            best = np.argmax(probabilities, axis=1)
+            # model.classes_ are label-encoder indices into label_classes
+            labels = state.label_classes[state.model.classes_[best]]
+            confidences = np.round(probabilities[np.arange(len(best)), best], 3)
+            
+            return {
+                "predicted_relationships": labels.tolist(),
+                "confidences": confidences.tolist(),
+                "error": None
+            }
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {e}")
+            return {
+                "predicted_relationships": None,
+                "confidences": None,
+                "error": str(e)
+            }
     
     def predict(self, source_centrality: float, target_centrality: float,
                 source_name_length: int, target_name_length: int,
@@ -61,44 +289,25 @@ class RelationshipTypePredictor:
         Returns:
             Dict with predicted relationship type and confidence
         """
-        if not self.is_loaded or self.model is None:
+        result = self.predict_batch([[
+            source_centrality,
+            target_centrality,
+            source_name_length,
+            target_name_length,
+            same_work,
+            source_in_work
+        ]])
+        if result["error"]:
             return {
                 "predicted_relationship": None,
                 "confidence": None,
-                "error": "Model not loaded"
-            }
-        
-        try:
-            # Prepare features
-            features = np.array([[
-                source_centrality,
-                target_centrality,
-                source_name_length,
-                target_name_length,
-                same_work,
-                source_in_work
-            ]])
-            
-            # Predict
-            prediction_encoded = self.model.predict(features)[0]
-            predicted_relationship = self.label_encoder.inverse_transform([prediction_encoded])[0]
-            
-            # Get confidence (probability of predicted class)
-            probabilities = self.model.predict_proba(features)[0]
-            confidence = float(np.max(probabilities))
-            
-            return {
-                "predicted_relationship": predicted_relationship,
-                "confidence": round(confidence, 3),
-                "error": None
-            }
-        except Exception as e:
-            logger.error(f"Prediction failed: {e}")
-            return {
-                "predicted_relationship": None,
-                "confidence": None,
-                "error": str(e)
+                "error": result["error"]
             }
+        return {
+            "predicted_relationship": result["predicted_relationships"][0],
+            "confidence": result["confidences"][0],
+            "error": None
+        }
 
 
 # Global predictor instance
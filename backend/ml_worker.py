@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from ml_predictor import predictor
+
+logger = logging.getLogger(__name__)
+
+# scikit-learn's tree ensembles release the GIL while scoring, so threads give real
+# parallelism without copying the model into every process of a process pool
+ML_WORKERS = int(os.getenv("ML_WORKERS", "2"))
+ML_BATCH_WINDOW_MS = float(os.getenv("ML_BATCH_WINDOW_MS", "5"))
+ML_MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "512"))
+
+_executor = ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix="ml-inference")
+
+
+async def run_in_pool(fn: Callable, *args):
+    """Run CPU-bound inference on the ML thread pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fn, *args)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-pair prediction requests for up to window_ms (or
+    until max_batch_size rows are waiting) and scores them as one matrix.
+    """
+
+    def __init__(self, window_ms: float = ML_BATCH_WINDOW_MS, max_batch_size: int = ML_MAX_BATCH_SIZE,
+                 max_in_flight: int = ML_WORKERS):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._scoring: set = set()
+        self.requests_total = 0
+        self.batches_total = 0
+        self.rows_scored = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, row: List[float]) -> dict:
+        """Queue one feature row and wait for its prediction (same shape as predictor.predict)."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.requests_total += 1
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [(row, future) for row, future in batch if not future.done()]
+            if not batch:
+                continue
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._score(batch))
+            self._scoring.add(task)
+            task.add_done_callback(self._scoring.discard)
+
+    async def _score(self, batch):
+        try:
+            self.batches_total += 1
+            self.rows_scored += len(batch)
+            self.last_batch_size = len(batch)
+            self.max_batch_size_seen = max(self.max_batch_size_seen, len(batch))
+            try:
+                result = await run_in_pool(predictor.predict_batch, [row for row, _ in batch])
+            except Exception as e:
+                logger.error(f"Micro-batch scoring failed: {e}")
+                result = {"error": str(e)}
+
+            for i, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if result["error"]:
+                    future.set_result({"predicted_relationship": None, "confidence": None, "error": result["error"]})
+                else:
+                    future.set_result({
+                        "predicted_relationship": result["predicted_relationships"][i],
+                        "confidence": result["confidences"][i],
+                        "error": None
+                    })
+        finally:
+            self._in_flight.release()
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size_seen": self.max_batch_size_seen,
+            "avg_batch_size": round(self.rows_scored / self.batches_total, 2) if self.batches_total else None,
+            "batch_window_ms": self.window * 1000,
+            "workers": ML_WORKERS,
+        }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# Global batcher instance
+batcher = MicroBatcher()
+
+
+async def shutdown():
+    await batcher.stop()
+    _executor.shutdown(wait=False)
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import List, Optional
+
+import skops.io as sio
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REGISTRY_DIR = os.path.join(current_dir, "models", "registry")
+
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+MODEL_FILE = "model.skops"
+MODEL_FORMAT = "skops"
+# Only types from these packages may be instantiated when a model file is loaded
+TRUSTED_TYPE_PREFIXES = ("sklearn.", "numpy.", "scipy.", "builtins.")
+MANIFEST_FILE = "manifest.json"
+ACTIVE_FILE = "ACTIVE"
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Versioned store for relationship predictor models.
+
+    Each version lives in <root>/<version>/ as a skops file plus manifest.json
+    holding the feature names, label classes and the file's SHA-256. skops is
+    not pickle: loading only instantiates types from TRUSTED_TYPE_PREFIXES and
+    refuses anything else, so a tampered file can't run arbitrary code. The
+    checksum is verified first and catches corruption and partial writes.
+    <root>/ACTIVE names the version served by default.
+
+    Versions published before the skops format (model.joblib) are pickles and
+    are refused; re-import their source .pkl.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or DEFAULT_REGISTRY_DIR
+
+    def _version_dir(self, version: str) -> str:
+        if not VERSION_PATTERN.match(version or ""):
+            raise ModelRegistryError(f"Invalid model version: {version!r}")
+        return os.path.join(self.root, version)
+
+    def manifest(self, version: str) -> dict:
+        path = os.path.join(self._version_dir(version), MANIFEST_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ModelRegistryError(f"Model version {version!r} not found")
+
+    def versions(self) -> List[dict]:
+        if not os.path.isdir(self.root):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.root)):
+            if os.path.isfile(os.path.join(self.root, name, MANIFEST_FILE)):
+                manifests.append(self.manifest(name))
+        return manifests
+
+    def active_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def activate(self, version: str):
+        """Point ACTIVE at a version (atomic rename, safe against concurrent readers)."""
+        self.manifest(version)
+        tmp_path = os.path.join(self.root, f".{ACTIVE_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, ACTIVE_FILE))
+
+    def load(self, version: str):
+        """Verify and load a version. Returns (model, manifest)."""
+        manifest = self.manifest(version)
+        if manifest.get("format") != MODEL_FORMAT:
+            raise ModelRegistryError(f"Model version {version!r} is a joblib pickle; re-import its .pkl "
+                                     f"with `python model_registry.py import-pkl`")
+        model_path = os.path.join(self._version_dir(version), MODEL_FILE)
+        if sha256_file(model_path) != manifest["sha256"]:
+            raise ModelRegistryError(f"Checksum mismatch for model version {version!r}")
+        untrusted = sio.get_untrusted_types(file=model_path)
+        rejected = [name for name in untrusted if not name.startswith(TRUSTED_TYPE_PREFIXES)]
+        if rejected:
+            raise ModelRegistryError(f"Model version {version!r} contains untrusted types: {rejected}")
+        model = sio.load(model_path, trusted=untrusted)
+        return model, manifest
+
+    def publish(self, model, feature_names: List[str], label_classes: List, version: str = None,
+                metadata: dict = None) -> str:
+        """Store a trained model as a new version. The version directory appears atomically."""
+        version = version or time.strftime("v%Y%m%d%H%M%S")
+        final_dir = self._version_dir(version)
+        if os.path.exists(final_dir):
+            raise ModelRegistryError(f"Model version {version!r} already exists")
+
+        os.makedirs(self.root, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=f".{version}-", dir=self.root)
+        try:
+            model_path = os.path.join(staging_dir, MODEL_FILE)
+            sio.dump(model, model_path)
+            manifest = {
+                "version": version,
+                "format": MODEL_FORMAT,
+                "created_at": time.time(),
+                "model_class": type(model).__name__,
+                "feature_names": list(feature_names),
+                "label_classes": [str(label) for label in label_classes],
+                "sha256": sha256_file(model_path),
+                "metadata": metadata or {},
+            }
+            with open(os.path.join(staging_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(staging_dir, final_dir)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        return version
+
+    def import_legacy_pickle(self, pkl_path: str, version: str = None) -> str:
+        """
+        Convert a legacy relationship_predictor.pkl ({model, label_encoder, feature_names}).
+        This unpickles the file, so only import .pkl files you trust.
+        """
+        import pickle
+
+        with open(pkl_path, "rb") as f:
+            model_data = pickle.load(f)
+        return self.publish(
+            model_data["model"],
+            model_data["feature_names"],
+            model_data["label_encoder"].classes_.tolist(),
+            version=version,
+            metadata={"imported_from": os.path.basename(pkl_path)},
+        )
+
+
+# Global registry instance
+registry = ModelRegistry(os.getenv("ML_MODEL_REGISTRY_DIR"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage relationship predictor model versions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import-pkl", help="Import a legacy .pkl model")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--version")
+    import_parser.add_argument("--activate", action="store_true")
+
+    activate_parser = subparsers.add_parser("activate", help="Make a version the active one")
+    activate_parser.add_argument("version")
+
+    subparsers.add_parser("list", help="List stored versions")
+
+    args = parser.parse_args()
+    if args.command == "import-pkl":
+        version = registry.import_legacy_pickle(args.path, args.version)
+        if args.activate:
+            registry.activate(version)
+        print(f"Imported {args.path} as {version}{' (active)' if args.activate else ''}")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Active model version: {args.version}")
+    else:
+        active = registry.active_version()
+        for manifest in registry.versions():
+            marker = "*" if manifest["version"] == active else " "
+            print(f"{marker} {manifest['version']}  {manifest['model_class']}  {len(manifest['label_classes'])} classes")
@@ -1,9 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index, Float, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from database import Base
 import uuid
 
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+# JSONB on Postgres (indexable, queryable server-side), plain JSON elsewhere
+GraphJSON = JSON().with_variant(JSONB(), "postgresql")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,14 +37,115 @@ class Analysis(Base):
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    nodes = Column(JSON, nullable=False, default=list)
-    links = Column(JSON, nullable=False, default=list)
-    work_meta = Column(JSON, nullable=True, default=dict)  # Store color/position metadata
+    nodes = Column(GraphJSON, nullable=False, default=list)
+    links = Column(GraphJSON, nullable=False, default=list)
+    work_meta = Column(GraphJSON, nullable=True, default=dict)  # Store color/position metadata
+    # Kept in sync with nodes/links so listings never have to load the graph JSON
+    node_count = Column(Integer, nullable=False, default=0, server_default="0")
+    link_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set in Python so every backend stores full microsecond precision: SQLite's
+    # CURRENT_TIMESTAMP is whole seconds, which breaks the (updated_at, id) keyset cursor
+    updated_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), onupdate=utcnow)
+    # Optimistic concurrency: every UPDATE checks and bumps this (StaleDataError on conflict)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     owner = relationship("User", back_populates="analyses")
 
+    __table_args__ = (
+        Index("ix_analyses_user_id_updated_at", "user_id", "updated_at"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+    @validates("nodes")
+    def _count_nodes(self, key, nodes):
+        self.node_count = len(nodes) if nodes else 0
+        return nodes
+
+    @validates("links")
+    def _count_links(self, key, links):
+        self.link_count = len(links) if links else 0
+        return links
+
     def __repr__(self):
         return f"<Analysis(id={self.id}, name={self.name}, user_id={self.user_id})>"
+
+
+# Normalized copies of each analysis's nodes and links (maintained by graph_index.py)
+# so characters, works and relationships can be searched across analyses.
+# user_id is denormalized so searches never have to touch the analyses table.
+class AnalysisCharacter(Base):
+    __tablename__ = "analysis_characters"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    analysis_id = Column(String, ForeignKey("analyses.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)
+    work = Column(String, nullable=True)
+    description = Column(Text, nullable=True)
+    size = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_characters_user_id_name", "user_id", "name"),
+        Index("ix_analysis_characters_user_id_work", "user_id", "work"),
+    )
+
+    def __repr__(self):
+        return f"<AnalysisCharacter(name={self.name}, analysis_id={self.analysis_id})>"
+
+
+class AnalysisRelationship(Base):
+    __tablename__ = "analysis_relationships"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    analysis_id = Column(String, ForeignKey("analyses.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    source = Column(String, nullable=False)
+    target = Column(String, nullable=False)
+    label = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_relationships_user_id_source", "user_id", "source"),
+        Index("ix_analysis_relationships_user_id_target", "user_id", "target"),
+        Index("ix_analysis_relationships_user_id_label", "user_id", "label"),
+    )
+
+    def __repr__(self):
+        return f"<AnalysisRelationship({self.source} -[{self.label}]-> {self.target})>"
+
+
+# Long-running analyses (Gutenberg books, large texts) queued for the background
+# workers in jobs.py. Claimed with SELECT ... FOR UPDATE SKIP LOCKED; running jobs
+# keep heartbeat_at fresh so jobs orphaned by a dead worker can be re-queued.
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)  # "gutenberg" or "text"
+    params = Column(GraphJSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="queued", server_default="queued")
+    idempotency_key = Column(String, nullable=True)
+    progress = Column(GraphJSON, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # Times the job was put back because of a 429/503; these don't use up attempts
+    deferrals = Column(Integer, nullable=False, default=0, server_default="0")
+    error = Column(Text, nullable=True)
+    analysis_id = Column(String, ForeignKey("analyses.id", ondelete="SET NULL"), nullable=True)
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Deferred jobs (admission refused or provider rate limit) are not claimed before this
+    run_after = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_analysis_jobs_user_id_idempotency_key"),
+        Index("ix_analysis_jobs_user_id_created_at", "user_id", "created_at"),
+        Index("ix_analysis_jobs_status_created_at", "status", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<AnalysisJob(id={self.id}, kind={self.kind}, status={self.status})>"
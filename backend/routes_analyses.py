@@ -1,25 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+from datetime import datetime
+import asyncio
+import base64
+import json
 
-from database import get_db
+from database import get_async_db
 from models import User, Analysis
-from schemas import AnalysisCreate, AnalysisUpdate, AnalysisResponse, AnalysisListItem
+from schemas import (
+    AnalysisCreate, AnalysisUpdate, AnalysisResponse, AnalysisListItem, SubgraphResponse,
+    AnalysisPatch, AnalysisPatchResponse, SearchHit, GraphMetricsResponse
+)
+from graph_queries import (
+    WORK_SUBGRAPH, NEIGHBORHOOD_SUBGRAPH, TOP_NODES_SUBGRAPH,
+    work_subgraph, neighborhood_subgraph, top_nodes_subgraph
+)
+from graph_patch import GraphPatch, PatchError
+from graph_index import sync_analysis, remove_analysis
+from graph_analytics import graph_metrics, BETWEENNESS_SAMPLES
+from models import AnalysisCharacter, AnalysisRelationship
 from auth import get_current_user
-from databricks_integration import DatabricksClient
+from databricks_integration import get_databricks_client
 
 router = APIRouter(prefix="/analyses", tags=["Analyses"])
-db_client = None
 
-@router.post("", response_model=AnalysisResponse, status_code=status.HTTP_201_CREATED)
-async def create_analysis(
-    analysis_data: AnalysisCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Create a new analysis for the current user."""
-    new_analysis = Analysis(
-        user_id=current_user.id,
+MAX_PATCH_OPERATIONS = 1000
+
+async def get_owned_analysis(db: AsyncSession, analysis_id: str, user_id: str) -> Analysis:
+    """Load one of the user's analyses or raise 404."""
+    result = await db.execute(select(Analysis).where(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id
+    ))
+    analysis = result.scalars().first()
+    
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+    
+    return analysis
+
+async def add_analysis(db: AsyncSession, user_id: str, analysis_data: AnalysisCreate) -> Analysis:
+    """Stage a new analysis plus its search index rows. The caller commits."""
+    analysis = Analysis(
+        user_id=user_id,
         name=analysis_data.name,
         description=analysis_data.description,
         nodes=analysis_data.nodes,
@@ -27,87 +56,308 @@ async def create_analysis(
         work_meta=analysis_data.work_meta
     )
     
-    db.add(new_analysis)
-    db.commit()
+    db.add(analysis)
+    await db.flush()
+    await db.run_sync(lambda session: sync_analysis(session, analysis))
+    return analysis
+
+async def log_analysis_created(analysis: Analysis):
+    """Queue a committed analysis for Databricks (never fails the caller)."""
     try:
-        global db_client
-        if db_client is None:
-            db_client = DatabricksClient()
-        db_client.log_analysis(
-            new_analysis.id,
-            current_user.id,
-            new_analysis.nodes,
-            new_analysis.links
+        # The outbox write is a durable SQLite commit; keep it off the event loop
+        await asyncio.to_thread(
+            get_databricks_client().log_analysis,
+            analysis.id,
+            analysis.user_id,
+            analysis.nodes,
+            analysis.links
         )
     except Exception as e:
         print(f"Databricks logging failed: {e}")
-    db.refresh(new_analysis)
+
+@router.post("", response_model=AnalysisResponse, status_code=status.HTTP_201_CREATED)
+async def create_analysis(
+    analysis_data: AnalysisCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create a new analysis for the current user."""
+    new_analysis = await add_analysis(db, current_user.id, analysis_data)
+    await db.commit()
+    await log_analysis_created(new_analysis)
+    await db.refresh(new_analysis)
     
     return new_analysis
 
+def encode_cursor(updated_at: datetime, analysis_id: str) -> str:
+    """Opaque keyset cursor pointing just after (updated_at, id)."""
+    raw = json.dumps([updated_at.isoformat(), analysis_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        updated_at, analysis_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(updated_at), analysis_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
 @router.get("", response_model=List[AnalysisListItem])
 async def get_my_analyses(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all analyses for the current user."""
-    analyses = db.query(Analysis).filter(
+    """
+    Get the current user's analyses, most recently updated first.
+    
+    Only summary columns are read. Pages are keyset-paginated on (updated_at, id):
+    when more results exist the X-Next-Cursor header holds the cursor for the next page.
+    """
+    query = select(
+        Analysis.id,
+        Analysis.name,
+        Analysis.description,
+        Analysis.created_at,
+        Analysis.updated_at,
+        Analysis.node_count,
+        Analysis.link_count
+    ).where(
         Analysis.user_id == current_user.id
-    ).order_by(Analysis.updated_at.desc()).all()
-    
-    # Convert to list items with node count
-    result = []
-    for analysis in analyses:
-        result.append({
-            "id": analysis.id,
-            "name": analysis.name,
-            "description": analysis.description,
-            "created_at": analysis.created_at,
-            "updated_at": analysis.updated_at,
-            "node_count": len(analysis.nodes) if analysis.nodes else 0
-        })
-    
-    return result
+    )
+    if cursor:
+        updated_at, analysis_id = decode_cursor(cursor)
+        query = query.where(tuple_(Analysis.updated_at, Analysis.id) < tuple_(updated_at, analysis_id))
+    
+    result = await db.execute(
+        query.order_by(Analysis.updated_at.desc(), Analysis.id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.updated_at, last.id)
+    
+    return [dict(row._mapping) for row in rows]
+
+def encode_search_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_search_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return values
+
+def like_pattern(q: str) -> str:
+    """Substring ILIKE pattern; served by the pg_trgm GIN indexes on Postgres."""
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+@router.get("/search", response_model=List[SearchHit])
+async def search_analyses(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=200),
+    kind: str = Query("character", pattern="^(character|work|relationship)$"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Search characters, works or relationships across all of the current user's analyses.
+    
+    Matches are case-insensitive substrings. Results are keyset-paginated: when more
+    exist, the X-Next-Cursor header holds the cursor for the next page.
+    """
+    pattern = like_pattern(q)
+    
+    if kind == "character":
+        query = select(
+            AnalysisCharacter.id,
+            AnalysisCharacter.analysis_id,
+            Analysis.name.label("analysis_name"),
+            AnalysisCharacter.name,
+            AnalysisCharacter.work,
+            AnalysisCharacter.description
+        ).join(Analysis, Analysis.id == AnalysisCharacter.analysis_id).where(
+            AnalysisCharacter.user_id == current_user.id,
+            AnalysisCharacter.name.ilike(pattern, escape="\\")
+        )
+        if cursor:
+            (last_id,) = decode_search_cursor(cursor, 1)
+            query = query.where(AnalysisCharacter.id > last_id)
+        query = query.order_by(AnalysisCharacter.id)
+        next_cursor = lambda row: encode_search_cursor(row.id)
+    
+    elif kind == "relationship":
+        query = select(
+            AnalysisRelationship.id,
+            AnalysisRelationship.analysis_id,
+            Analysis.name.label("analysis_name"),
+            AnalysisRelationship.source,
+            AnalysisRelationship.target,
+            AnalysisRelationship.label
+        ).join(Analysis, Analysis.id == AnalysisRelationship.analysis_id).where(
+            AnalysisRelationship.user_id == current_user.id,
+            AnalysisRelationship.source.ilike(pattern, escape="\\")
+            | AnalysisRelationship.target.ilike(pattern, escape="\\")
+            | AnalysisRelationship.label.ilike(pattern, escape="\\")
+        )
+        if cursor:
+            (last_id,) = decode_search_cursor(cursor, 1)
+            query = query.where(AnalysisRelationship.id > last_id)
+        query = query.order_by(AnalysisRelationship.id)
+        next_cursor = lambda row: encode_search_cursor(row.id)
+    
+    else:
+        query = select(
+            AnalysisCharacter.work,
+            AnalysisCharacter.analysis_id,
+            func.min(Analysis.name).label("analysis_name"),
+            func.count(AnalysisCharacter.id).label("character_count")
+        ).join(Analysis, Analysis.id == AnalysisCharacter.analysis_id).where(
+            AnalysisCharacter.user_id == current_user.id,
+            AnalysisCharacter.work.ilike(pattern, escape="\\")
+        ).group_by(AnalysisCharacter.work, AnalysisCharacter.analysis_id)
+        if cursor:
+            last_work, last_analysis_id = decode_search_cursor(cursor, 2)
+            query = query.where(
+                tuple_(AnalysisCharacter.work, AnalysisCharacter.analysis_id) > tuple_(last_work, last_analysis_id)
+            )
+        query = query.order_by(AnalysisCharacter.work, AnalysisCharacter.analysis_id)
+        next_cursor = lambda row: encode_search_cursor(row.work, row.analysis_id)
+    
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = next_cursor(rows[-1])
+    
+    return [{"kind": kind, **dict(row._mapping)} for row in rows]
 
 @router.get("/{analysis_id}", response_model=AnalysisResponse)
 async def get_analysis(
     analysis_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific analysis by ID."""
-    analysis = db.query(Analysis).filter(
-        Analysis.id == analysis_id,
-        Analysis.user_id == current_user.id
-    ).first()
+    return await get_owned_analysis(db, analysis_id, current_user.id)
+
+async def run_subgraph_query(db: AsyncSession, statement, fallback, analysis_id: str, user_id: str,
+                             **params) -> dict:
+    """
+    Execute one of the graph_queries statements; the filtering happens inside Postgres.
+    Other databases have no JSONB functions, so there the graph is loaded and `fallback`
+    (the equivalent graph_queries Python function) does the filtering.
+    """
+    if db.bind.dialect.name != "postgresql":
+        result = await db.execute(select(Analysis.nodes, Analysis.links).where(
+            Analysis.id == analysis_id,
+            Analysis.user_id == user_id
+        ))
+        row = result.first()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Analysis not found"
+            )
+        return await asyncio.to_thread(fallback, row.nodes or [], row.links or [], **params)
     
-    if not analysis:
+    result = await db.execute(statement, {"analysis_id": analysis_id, "user_id": user_id, **params})
+    row = result.one()
+    
+    if not row.found:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Analysis not found"
         )
     
-    return analysis
+    return {"nodes": row.nodes, "links": row.links}
 
-@router.put("/{analysis_id}", response_model=AnalysisResponse)
-async def update_analysis(
+@router.get("/{analysis_id}/work-subgraph", response_model=SubgraphResponse)
+async def get_work_subgraph(
     analysis_id: str,
-    analysis_data: AnalysisUpdate,
+    work: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update an existing analysis."""
-    analysis = db.query(Analysis).filter(
+    """Get the characters of one work and the links between them."""
+    return await run_subgraph_query(db, WORK_SUBGRAPH, work_subgraph, analysis_id, current_user.id, work=work)
+
+@router.get("/{analysis_id}/neighborhood", response_model=SubgraphResponse)
+async def get_character_neighborhood(
+    analysis_id: str,
+    character: str,
+    hops: int = Query(1, ge=1, le=3),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get every character within `hops` links of a character, and the links among them."""
+    return await run_subgraph_query(
+        db, NEIGHBORHOOD_SUBGRAPH, neighborhood_subgraph, analysis_id, current_user.id, character=character, hops=hops
+    )
+
+@router.get("/{analysis_id}/top-nodes", response_model=SubgraphResponse)
+async def get_top_nodes(
+    analysis_id: str,
+    n: int = Query(20, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the N largest characters by `size` and the links among them."""
+    return await run_subgraph_query(db, TOP_NODES_SUBGRAPH, top_nodes_subgraph, analysis_id, current_user.id, limit=n)
+
+@router.get("/{analysis_id}/metrics", response_model=GraphMetricsResponse)
+async def get_graph_metrics(
+    analysis_id: str,
+    samples: int = Query(BETWEENNESS_SAMPLES, ge=1, le=10000),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    PageRank, sampled betweenness, communities (label propagation + modularity) and
+    connected components for every character. Results are cached by graph structure.
+    """
+    result = await db.execute(select(Analysis.nodes, Analysis.links).where(
         Analysis.id == analysis_id,
         Analysis.user_id == current_user.id
-    ).first()
+    ))
+    row = result.first()
     
-    if not analysis:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Analysis not found"
         )
     
+    # CPU-bound numpy/scipy work; keep it off the event loop
+    return await asyncio.to_thread(graph_metrics, row.nodes or [], row.links or [], samples)
+
+@router.put("/{analysis_id}", response_model=AnalysisResponse)
+async def update_analysis(
+    analysis_id: str,
+    analysis_data: AnalysisUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Update an existing analysis."""
+    analysis = await get_owned_analysis(db, analysis_id, current_user.id)
+    
+    old_nodes, old_links = analysis.nodes, analysis.links
+    
     # Update fields if provided
     if analysis_data.name is not None:
         analysis.name = analysis_data.name
@@ -120,30 +370,114 @@ async def update_analysis(
     if analysis_data.work_meta is not None:
         analysis.work_meta = analysis_data.work_meta
     
-    db.commit()
-    db.refresh(analysis)
+    await db.run_sync(lambda session: sync_analysis(
+        session, analysis, old_nodes, old_links,
+        nodes_changed=analysis_data.nodes is not None,
+        links_changed=analysis_data.links is not None
+    ))
+    
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise version_conflict(analysis_id)
+    await db.refresh(analysis)
     
     return analysis
 
-@router.delete("/{analysis_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_analysis(
+def version_conflict(analysis_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Analysis {analysis_id} was modified concurrently; reload and retry"
+    )
+
+@router.patch("/{analysis_id}", response_model=AnalysisPatchResponse)
+async def patch_analysis(
     analysis_id: str,
+    patch: AnalysisPatch,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Delete an analysis."""
-    analysis = db.query(Analysis).filter(
-        Analysis.id == analysis_id,
-        Analysis.user_id == current_user.id
-    ).first()
+    """
+    Apply JSON-Patch-style operations to an analysis (see graph_patch.GraphPatch for paths).
     
-    if not analysis:
+    `base_version` must match the stored version, otherwise nothing is applied and a 409
+    is returned. The response carries only the new version, counts and applied operations
+    (including links removed along with a node), not the whole graph.
+    """
+    if not patch.operations:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No operations")
+    if len(patch.operations) > MAX_PATCH_OPERATIONS:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Analysis not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_PATCH_OPERATIONS} operations per patch"
+        )
+    
+    analysis = await get_owned_analysis(db, analysis_id, current_user.id)
+    if analysis.version != patch.base_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Version mismatch", "current_version": analysis.version}
+        )
+    
+    try:
+        result = GraphPatch(analysis.nodes, analysis.links, analysis.work_meta).apply(
+            [operation.model_dump() for operation in patch.operations]
         )
+    except PatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    
+    old_nodes, old_links = analysis.nodes, analysis.links
+    
+    # Only assign what changed so the UPDATE only rewrites those columns
+    if "nodes" in result.touched:
+        analysis.nodes = result.nodes
+    if "links" in result.touched:
+        analysis.links = result.links
+    if "work_meta" in result.touched:
+        analysis.work_meta = result.work_meta
+    for field, value in result.fields.items():
+        setattr(analysis, field, value)
+    
+    await db.run_sync(lambda session: sync_analysis(
+        session, analysis, old_nodes, old_links,
+        nodes_changed="nodes" in result.touched,
+        links_changed="links" in result.touched
+    ))
+    
+    try:
+        # The UPDATE is guarded by WHERE version = base_version, so a concurrent
+        # writer between our read and this commit surfaces as StaleDataError
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise version_conflict(analysis_id)
+    
+    summary = await db.execute(select(
+        Analysis.version, Analysis.updated_at, Analysis.node_count, Analysis.link_count
+    ).where(Analysis.id == analysis_id))
+    row = summary.one()
+    
+    return {
+        "id": analysis_id,
+        "version": row.version,
+        "updated_at": row.updated_at,
+        "node_count": row.node_count,
+        "link_count": row.link_count,
+        "applied": result.applied
+    }
+
+@router.delete("/{analysis_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_analysis(
+    analysis_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Delete an analysis."""
+    analysis = await get_owned_analysis(db, analysis_id, current_user.id)
     
-    db.delete(analysis)
-    db.commit()
+    await db.run_sync(lambda session: remove_analysis(session, analysis.id))
+    await db.delete(analysis)
+    await db.commit()
     
     return None
@@ -0,0 +1,162 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import os
+
+from database import get_async_db
+from models import User, AnalysisJob
+from schemas import GutenbergJobCreate, TextJobCreate, JobResponse
+from auth import get_current_user
+from jobs import job_workers, utcnow, ACTIVE_STATUSES, JOB_POLL_INTERVAL
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+MAX_JOB_TEXT_CHARS = int(os.getenv("JOB_MAX_TEXT_CHARS", "5000000"))
+JOB_STATUS_PATTERN = "^(queued|running|succeeded|failed|cancelled)$"
+
+def job_response(job: AnalysisJob) -> JobResponse:
+    """Job as returned by the API (text jobs don't echo their input back)."""
+    response = JobResponse.model_validate(job)
+    response.params = {key: value for key, value in (job.params or {}).items() if key != "text"}
+    return response
+
+async def get_owned_job(db: AsyncSession, job_id: str, user_id: str) -> AnalysisJob:
+    """Load one of the user's jobs or raise 404."""
+    result = await db.execute(select(AnalysisJob).where(
+        AnalysisJob.id == job_id,
+        AnalysisJob.user_id == user_id
+    ))
+    job = result.scalars().first()
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    return job
+
+async def find_idempotent_job(db: AsyncSession, user_id: str, key: str, kind: str, params: dict):
+    """The job previously submitted with this Idempotency-Key, if any (409 if it differs)."""
+    result = await db.execute(select(AnalysisJob).where(
+        AnalysisJob.user_id == user_id,
+        AnalysisJob.idempotency_key == key
+    ))
+    job = result.scalars().first()
+    if job is not None and (job.kind != kind or job.params != params):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key was already used for a different job"
+        )
+    return job
+
+async def submit_job(db: AsyncSession, user: User, kind: str, params: dict,
+                     idempotency_key: Optional[str], response: Response) -> JobResponse:
+    """Queue a job, or return the existing one for a repeated Idempotency-Key."""
+    if idempotency_key:
+        existing = await find_idempotent_job(db, user.id, idempotency_key, kind, params)
+        if existing is not None:
+            response.status_code = status.HTTP_200_OK
+            return job_response(existing)
+
+    job = AnalysisJob(user_id=user.id, kind=kind, params=params, idempotency_key=idempotency_key)
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        if not idempotency_key:
+            raise
+        # Lost a race with a concurrent submit using the same key
+        existing = await find_idempotent_job(db, user.id, idempotency_key, kind, params)
+        response.status_code = status.HTTP_200_OK
+        return job_response(existing)
+
+    await db.refresh(job)
+    job_workers.notify()
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job_response(job)
+
+@router.post("/gutenberg", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_gutenberg_job(
+    job_data: GutenbergJobCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue download + extraction of a Gutenberg book; poll GET /jobs/{id} for the result."""
+    params = {key: value for key, value in job_data.model_dump().items() if value is not None}
+    return await submit_job(db, current_user, "gutenberg", params, idempotency_key, response)
+
+@router.post("/analyze", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_text_job(
+    job_data: TextJobCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue extraction of a text too long to analyze within one request."""
+    if not job_data.text.strip():
+        raise HTTPException(status_code=400, detail="Invalid input: Text cannot be empty")
+    if len(job_data.text) > MAX_JOB_TEXT_CHARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid input: Text exceeds maximum length of {MAX_JOB_TEXT_CHARS:,} characters"
+        )
+    params = {key: value for key, value in job_data.model_dump().items() if value is not None}
+    params["text_chars"] = len(job_data.text)
+    return await submit_job(db, current_user, "text", params, idempotency_key, response)
+
+@router.get("", response_model=List[JobResponse])
+async def list_jobs(
+    status_filter: Optional[str] = Query(None, alias="status", pattern=JOB_STATUS_PATTERN),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The current user's most recent jobs."""
+    query = select(AnalysisJob).where(AnalysisJob.user_id == current_user.id)
+    if status_filter:
+        query = query.where(AnalysisJob.status == status_filter)
+    result = await db.execute(query.order_by(AnalysisJob.created_at.desc()).limit(limit))
+    return [job_response(job) for job in result.scalars().all()]
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Job status and progress; analysis_id points at the saved result once succeeded."""
+    job = await get_owned_job(db, job_id, current_user.id)
+    if job.status in ACTIVE_STATUSES:
+        response.headers["Retry-After"] = str(max(1, round(JOB_POLL_INTERVAL)))
+    return job_response(job)
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cancel a queued or running job."""
+    job = await get_owned_job(db, job_id, current_user.id)
+    result = await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.id == job.id, AnalysisJob.status.in_(ACTIVE_STATUSES))
+        .values(status="cancelled", finished_at=utcnow())
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job already {job.status}"
+        )
+    job_workers.cancel(job.id)
+    await db.refresh(job)
+    return job_response(job)
@@ -1,18 +1,32 @@
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from pydantic import BaseModel, Field, FiniteFloat
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, Any, Dict, List, Optional
+import hmac
+import os
 from ml_predictor import predictor
+from model_registry import registry, ModelRegistryError
+from ml_worker import batcher, run_in_pool
+from graph_features import EdgeFeatureIndex
+from database import get_async_db
+from models import User, Analysis
+from auth import get_current_user
 
 router = APIRouter(prefix="/predict", tags=["ML Predictions"])
 
+# Rows share a micro-batch with other users' requests, so reject anything that would
+# fail the whole float64 matrix (NaN/inf, integers too large to convert) up front
+FeatureInt = Annotated[int, Field(ge=0, le=2**31 - 1)]
+
 class RelationshipPredictionRequest(BaseModel):
     """Request schema for relationship type prediction"""
-    source_centrality: float
-    target_centrality: float
-    source_name_length: int
-    target_name_length: int
-    same_work: int = 0
-    source_in_work: int = 0
+    source_centrality: FiniteFloat
+    target_centrality: FiniteFloat
+    source_name_length: FeatureInt
+    target_name_length: FeatureInt
+    same_work: FeatureInt = 0
+    source_in_work: FeatureInt = 0
 
 class RelationshipPredictionResponse(BaseModel):
     """Response schema for relationship prediction"""
@@ -20,6 +34,43 @@ class RelationshipPredictionResponse(BaseModel):
     confidence: Optional[float]
     error: Optional[str] = None
 
+class RelationshipPredictionBatchRequest(BaseModel):
+    """Request schema for scoring many character pairs at once"""
+    items: List[RelationshipPredictionRequest] = Field(..., max_length=10000)
+
+class RelationshipPredictionBatchResponse(BaseModel):
+    """Response schema for batch relationship prediction (same order as the request)"""
+    predictions: List[RelationshipPredictionResponse]
+
+class GraphLinksPredictionRequest(BaseModel):
+    """A graph (nodes/links as returned by /analyze or stored in an analysis)"""
+    nodes: List[Dict[str, Any]] = []
+    links: List[Dict[str, Any]] = Field(default=[], max_length=10000)
+
+class GraphLinksPredictionResponse(BaseModel):
+    """The graph's links annotated with predicted_relationship and confidence"""
+    links: List[Dict[str, Any]]
+
+def annotate_links(nodes: List[dict], links: List[dict]) -> dict:
+    """Compute features for every link from one shared graph index and score them in bulk."""
+    features, normalized_links = EdgeFeatureIndex(nodes, links).edge_features()
+    result = predictor.predict_batch(features)
+    
+    if result["error"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=result["error"]
+        )
+    
+    return {
+        "links": [
+            {**link, "predicted_relationship": label, "confidence": confidence}
+            for link, label, confidence in zip(
+                normalized_links, result["predicted_relationships"], result["confidences"]
+            )
+        ]
+    }
+
 @router.post("/relationship-type", response_model=RelationshipPredictionResponse)
 async def predict_relationship_type(request: RelationshipPredictionRequest):
     """
@@ -37,14 +88,15 @@ async def predict_relationship_type(request: RelationshipPredictionRequest):
     - predicted_relationship: The predicted relationship type
     - confidence: Confidence score (0-1)
     """
-    result = predictor.predict(
+    # Scored off the event loop, together with other requests arriving within a few ms
+    result = await batcher.submit([
         request.source_centrality,
         request.target_centrality,
         request.source_name_length,
         request.target_name_length,
         request.same_work,
         request.source_in_work
-    )
+    ])
     
     if result["error"]:
         raise HTTPException(
@@ -54,11 +106,104 @@ async def predict_relationship_type(request: RelationshipPredictionRequest):
     
     return result
 
+@router.post("/relationship-type/batch", response_model=RelationshipPredictionBatchResponse)
+async def predict_relationship_types_batch(request: RelationshipPredictionBatchRequest):
+    """
+    Predict relationship types for up to 10,000 character pairs in one call.
+    
+    Each item takes the same features as /predict/relationship-type. All rows are
+    scored in a single vectorized pass; predictions are returned in request order.
+    """
+    rows = [
+        [
+            item.source_centrality,
+            item.target_centrality,
+            item.source_name_length,
+            item.target_name_length,
+            item.same_work,
+            item.source_in_work
+        ]
+        for item in request.items
+    ]
+    result = await run_in_pool(predictor.predict_batch, rows)
+    
+    if result["error"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=result["error"]
+        )
+    
+    return {
+        "predictions": [
+            {"predicted_relationship": label, "confidence": confidence, "error": None}
+            for label, confidence in zip(result["predicted_relationships"], result["confidences"])
+        ]
+    }
+
+@router.post("/graph-links", response_model=GraphLinksPredictionResponse)
+async def predict_graph_links(request: GraphLinksPredictionRequest):
+    """
+    Predict relationship types for every link of a graph.
+    
+    Centrality, name lengths, same_work and source_in_work are computed server-side,
+    so clients only send the nodes and links they already have.
+    """
+    return await run_in_pool(annotate_links, request.nodes, request.links)
+
+@router.post("/analyses/{analysis_id}/links", response_model=GraphLinksPredictionResponse)
+async def predict_analysis_links(
+    analysis_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Predict relationship types for every link of one of the current user's saved analyses."""
+    result = await db.execute(select(Analysis.nodes, Analysis.links).where(
+        Analysis.id == analysis_id,
+        Analysis.user_id == current_user.id
+    ))
+    analysis = result.first()
+    
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+    
+    return await run_in_pool(annotate_links, analysis.nodes or [], analysis.links or [])
+
 @router.get("/health")
 async def ml_health_check():
     """Check if ML model is loaded and ready"""
     return {
         "ml_model_loaded": predictor.is_loaded,
+        "model_version": predictor.version,
         "model_features": predictor.feature_names,
-        "label_classes": predictor.label_encoder.classes_.tolist() if predictor.label_encoder else None
+        "label_classes": predictor.label_classes
     }
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Model administration is enabled only when ML_ADMIN_TOKEN is set"""
+    expected = os.getenv("ML_ADMIN_TOKEN")
+    if not expected or not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
+
+@router.get("/admin/models", dependencies=[Depends(require_admin_token)])
+async def list_model_versions():
+    """List stored model versions and which one is active"""
+    return {
+        "active_version": registry.active_version(),
+        "serving_version": predictor.version,
+        "versions": registry.versions()
+    }
+
+@router.post("/admin/models/{version}/activate", dependencies=[Depends(require_admin_token)])
+async def activate_model_version(version: str):
+    """Load a stored model version and hot-swap it in without restarting"""
+    try:
+        active = await run_in_pool(predictor.activate, version)
+    except ModelRegistryError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return {"model_version": active}
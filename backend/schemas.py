@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 
 # User Schemas
@@ -51,10 +51,72 @@ class AnalysisResponse(AnalysisBase):
     user_id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: int = 1
     
     class Config:
         from_attributes = True
 
+class PatchOperation(BaseModel):
+    op: Literal["add", "remove", "replace"]
+    path: str
+    value: Optional[Any] = None
+
+class AnalysisPatch(BaseModel):
+    base_version: int
+    operations: List[PatchOperation]
+
+class AnalysisPatchResponse(BaseModel):
+    id: str
+    version: int
+    updated_at: Optional[datetime] = None
+    node_count: int
+    link_count: int
+    applied: List[PatchOperation]
+
+class SubgraphResponse(BaseModel):
+    nodes: List[Dict[str, Any]]
+    links: List[Dict[str, Any]]
+
+class NodeMetrics(BaseModel):
+    id: str
+    degree_centrality: float
+    pagerank: float
+    betweenness: float
+    community: int
+    component: int
+
+class ComponentSummary(BaseModel):
+    count: int
+    largest: int
+
+class CommunitySummary(BaseModel):
+    count: int
+    largest: int
+    modularity: float
+
+class GraphMetricsResponse(BaseModel):
+    graph_hash: str
+    cached: bool
+    node_count: int
+    link_count: int
+    betweenness_samples: int
+    components: ComponentSummary
+    communities: CommunitySummary
+    nodes: List[NodeMetrics]
+    elapsed_ms: float
+
+class SearchHit(BaseModel):
+    kind: str
+    analysis_id: str
+    analysis_name: str
+    name: Optional[str] = None
+    work: Optional[str] = None
+    description: Optional[str] = None
+    source: Optional[str] = None
+    target: Optional[str] = None
+    label: Optional[str] = None
+    character_count: Optional[int] = None
+
 class AnalysisListItem(BaseModel):
     id: str
     name: str
@@ -62,6 +124,36 @@ class AnalysisListItem(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     node_count: int = 0
+    link_count: int = 0
     
     class Config:
         from_attributes = True
+
+# Job Schemas
+class GutenbergJobCreate(BaseModel):
+    book_id: str
+    limit_chars: Optional[int] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+class TextJobCreate(BaseModel):
+    text: str
+    name: str
+    description: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    params: Dict[str, Any] = {}
+    progress: Optional[Dict[str, Any]] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    analysis_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    run_after: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
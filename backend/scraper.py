@@ -1,62 +1,122 @@
+import asyncio
+import logging
 import requests
 from bs4 import BeautifulSoup
 import re
+import os
+from corpus_store import corpus_store
+from http_client import fetch_text
+from instrumentation import timed, observe_payload
+
+logger = logging.getLogger(__name__)
+
+FANDOM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+def _parse_fandom_html(html: str) -> str:
+    """Extract the article text from a Fandom page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    content_div = soup.find('div', {'class': 'mw-parser-output'})
+    if not content_div: return "Could not find content."
+    for element in content_div.find_all(['script', 'style', 'table', 'aside']):
+        element.decompose()
+    text = content_div.get_text(separator='\n')
+    text = re.sub(r'\[\d+\]', '', text)
+    return re.sub(r'\n\s*\n+', '\n\n', text).strip()
 
 def scrape_fandom_wiki(url: str):
     """
     Scrapes text content from a Fandom.com wiki page.
     Note: Highly restrictive, might return 403.
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = requests.get(url, headers=FANDOM_HEADERS, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        content_div = soup.find('div', {'class': 'mw-parser-output'})
-        if not content_div: return "Could not find content."
-        for element in content_div.find_all(['script', 'style', 'table', 'aside']):
-            element.decompose()
-        text = content_div.get_text(separator='\n')
-        text = re.sub(r'\[\d+\]', '', text)
-        return re.sub(r'\n\s*\n+', '\n\n', text).strip()
+        return _parse_fandom_html(response.text)
     except Exception as e:
         return f"Fandom Error: {str(e)}"
 
-def get_gutenberg_book(book_id: str):
-    """
-    Downloads a plain text book from Project Gutenberg.
-    Extremely reliable and bot-friendly.
-    """
-    url = f"https://www.gutenberg.org/cache/epub/{book_id}/pg{book_id}.txt"
-    print(f"--- Fetching Gutenberg Book ID: {book_id} ---")
+async def async_scrape_fandom_wiki(url: str):
+    """Non-blocking version of scrape_fandom_wiki using the shared HTTP client."""
     try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        text = response.text
-        
-        # Strip header/footer to save tokens
-        start_marker = "*** START OF THE PROJECT GUTENBERG EBOOK"
-        end_marker = "*** END OF THE PROJECT GUTENBERG EBOOK"
+        response = await fetch_text(url, headers=FANDOM_HEADERS, timeout=10)
+        # HTML parsing is CPU-bound, keep it off the event loop
+        return await asyncio.to_thread(_parse_fandom_html, response.text)
+    except Exception as e:
+        return f"Fandom Error: {str(e)}"
+
+GUTENBERG_URL = os.getenv("GUTENBERG_URL", "https://www.gutenberg.org/cache/epub/{book_id}/pg{book_id}.txt")
+# Re-check stored books against gutenberg.org after this many seconds (0 = never)
+GUTENBERG_REVALIDATE_AFTER = int(os.getenv("GUTENBERG_REVALIDATE_AFTER_SECONDS", "0"))
+
+def strip_gutenberg_boilerplate(text: str) -> str:
+    """Strip the Project Gutenberg license header/footer to save tokens."""
+    start_marker = "*** START OF THE PROJECT GUTENBERG EBOOK"
+    end_marker = "*** END OF THE PROJECT GUTENBERG EBOOK"
+    
+    start_pos = text.find(start_marker)
+    end_pos = text.find(end_marker)
+    
+    if start_pos != -1:
+        # Move to end of that line
+        start_pos = text.find("\n", start_pos) + 1
         
-        start_pos = text.find(start_marker)
-        end_pos = text.find(end_marker)
+    if start_pos != -1 and end_pos != -1:
+        text = text[start_pos:end_pos]
         
-        if start_pos != -1:
-            # Move to end of that line
-            start_pos = text.find("\n", start_pos) + 1
-            
-        if start_pos != -1 and end_pos != -1:
-            text = text[start_pos:end_pos]
-            
-        return text.strip()
+    return text.strip()
+
+@timed("gutenberg_fetch")
+async def async_get_gutenberg_book(book_id: str, revalidate: bool = False):
+    """
+    Returns the stripped plain text of a Project Gutenberg book.
+    The local corpus store is checked first; a download only happens for new
+    books or when the stored copy is due for conditional re-validation.
+    Downloads go through the shared, connection-pooled client; corpus store
+    disk I/O runs in a worker thread.
+    """
+    if not corpus_store.valid_id(book_id):
+        return f"Gutenberg Error: Invalid book ID {book_id!r}"
+
+    def load_stored():
+        stored = corpus_store.get(book_id)
+        stale = corpus_store.needs_revalidation(book_id, GUTENBERG_REVALIDATE_AFTER)
+        headers = corpus_store.conditional_headers(book_id) if stored is not None else {}
+        return stored, stale, headers
+
+    stored, stale, headers = await asyncio.to_thread(load_stored)
+    if stored is not None and not (revalidate or stale):
+        return stored
+
+    url = GUTENBERG_URL.format(book_id=book_id)
+    logger.info(f"Fetching Gutenberg book {book_id}")
+    try:
+        response = await fetch_text(url, headers=headers, timeout=15)
+        if response.status_code == 304 and stored is not None:
+            await asyncio.to_thread(corpus_store.touch, book_id)
+            return stored
+        observe_payload("gutenberg_download_chars", len(response.text))
+        text = strip_gutenberg_boilerplate(response.text)
+        await asyncio.to_thread(
+            corpus_store.put,
+            book_id,
+            text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            source_url=url
+        )
+        return text
     except Exception as e:
+        if stored is not None:
+            # Offline or mirror down: the stored copy is still good
+            logger.warning(f"Gutenberg re-validation of book {book_id} failed, serving stored copy: {e}")
+            return stored
         return f"Gutenberg Error: {str(e)}"
 
 if __name__ == "__main__":
     # Test with Dracula (ID: 345)
-    book_text = get_gutenberg_book("345")
+    book_text = asyncio.run(async_get_gutenberg_book("345"))
     if not book_text.startswith("Gutenberg Error"):
         print(f"Success! Character count: {len(book_text)}")
         print("\nFirst 500 characters of the story:")
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+# Modules import flat from backend/ and read their config at import time, so point
+# them at throwaway SQLite files before anything is imported.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="mythinformation-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.sqlite3')}")
+os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(_scratch, "extraction_cache.sqlite3"))
+os.environ.setdefault("GUTENBERG_CORPUS_DIR", os.path.join(_scratch, "corpus"))
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def engine():
+    pytest.importorskip("sqlalchemy")
+    from database import Base, engine
+    import models  # noqa: F401 (registers the tables)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    """Sync session on a freshly emptied schema."""
+    from database import Base, SessionLocal
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(db):
+    from models import User
+    user = User(email="mina@example.com", username="mina", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
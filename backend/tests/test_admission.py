@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+from admission import TokenBucket, is_rate_limit_error, retry_after_hint
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manually advanced stand-in for time.monotonic inside admission."""
+    fake = SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    monkeypatch.setattr(admission, "time", fake)
+    return fake
+
+
+def test_bucket_starts_full_and_reserves_without_waiting(clock):
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.is_full()
+    assert bucket.reserve(400) == 0.0
+    assert bucket.tokens == 200
+    assert not bucket.is_full()
+
+
+def test_overdraft_reports_the_wait_until_tokens_exist(clock):
+    bucket = TokenBucket(per_minute=600)  # 10 tokens/second
+    bucket.reserve(600)
+    assert bucket.reserve(50) == pytest.approx(5.0)
+    clock.now += 5
+    assert bucket.reserve(0) == 0.0
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(per_minute=600)
+    bucket.reserve(300)
+    clock.now += 15
+    assert bucket.reserve(0) == 0.0
+    assert bucket.tokens == 450
+    clock.now += 3600
+    assert bucket.is_full() and bucket.tokens == 600
+
+
+def test_oversized_reservations_are_charged_one_capacity(clock):
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.reserve(10_000) == 0.0
+    assert bucket.tokens == 0
+    bucket.refund(10_000)
+    assert bucket.tokens == 600
+
+
+def test_refund_returns_reserved_tokens(clock):
+    bucket = TokenBucket(per_minute=600)
+    bucket.reserve(600)
+    bucket.reserve(100)
+    bucket.refund(100)
+    assert bucket.tokens == 0
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class StatusError(Exception):
+    def __init__(self, message="", code=None, status_code=None, response=None, status=None):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+        self.response = response
+        self.status = status
+
+
+@pytest.mark.parametrize("error", [
+    ResourceExhausted("Quota exceeded"),
+    StatusError(code=429),
+    StatusError(status_code=429),
+    StatusError(response=SimpleNamespace(status_code=429)),
+    StatusError(status="RESOURCE_EXHAUSTED"),
+])
+def test_rate_limit_errors_are_recognized(error):
+    assert is_rate_limit_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("429 appears in the message only"),
+    StatusError(code=500),
+    StatusError(response=SimpleNamespace(status_code=503)),
+    asyncio.TimeoutError(),
+])
+def test_other_errors_are_not_rate_limits(error):
+    assert not is_rate_limit_error(error)
+
+
+def test_wrapped_rate_limit_errors_are_followed_through_the_cause():
+    try:
+        try:
+            raise StatusError(code=429)
+        except StatusError as inner:
+            raise RuntimeError("Chain invocation failed") from inner
+    except RuntimeError as outer:
+        assert is_rate_limit_error(outer)
+
+
+def test_cyclic_causes_terminate():
+    first, second = ValueError("a"), ValueError("b")
+    first.__cause__, second.__cause__ = second, first
+    assert not is_rate_limit_error(first)
+
+
+@pytest.mark.parametrize("message, seconds", [
+    ("429 Resource exhausted. Please retry in 12.5s.", 12.5),
+    ("Quota exceeded [retry_delay { seconds: 41 }]", 41.0),
+    ("429 Too Many Requests", None),
+])
+def test_retry_after_hint(message, seconds):
+    assert retry_after_hint(Exception(message)) == seconds
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+
+from models import Analysis
+
+
+@pytest.fixture
+def client(engine, db, user):
+    pytest.importorskip("httpx")
+    pytest.importorskip("aiosqlite")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import routes_analyses
+    from auth import get_current_user
+
+    app = FastAPI()
+    app.include_router(routes_analyses.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def page_through(client, limit):
+    ids, cursor = [], None
+    for _ in range(10):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/analyses", params=params)
+        assert response.status_code == 200
+        ids.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+    raise AssertionError(f"Paging did not finish: {ids}")
+
+
+def test_pages_through_analyses_sharing_a_timestamp(client, db, user):
+    same_second = datetime(2026, 10, 17, 17, 25, 51)
+    for analysis_id in ("a1", "a2", "a3", "a4"):
+        db.add(Analysis(id=analysis_id, user_id=user.id, name=analysis_id, updated_at=same_second))
+    db.commit()
+
+    assert page_through(client, limit=2) == ["a4", "a3", "a2", "a1"]
+
+
+def test_pages_through_analyses_created_through_the_api(client):
+    created = [client.post("/analyses", json={"name": f"Tale {i}", "nodes": [], "links": []}).json()["id"]
+               for i in range(5)]
+
+    listed = page_through(client, limit=2)
+    assert sorted(listed) == sorted(created)
+    assert len(listed) == len(set(listed))
+
+
+def test_subgraph_routes_fall_back_to_python_off_postgres(client):
+    nodes = [
+        {"id": "Dracula", "work": "Dracula", "size": 30},
+        {"id": "Mina", "work": "Dracula", "size": 20},
+        {"id": "Holmes", "source_work": "Sherlock Holmes", "size": 25},
+        {"id": "Watson", "source_work": "Sherlock Holmes"},
+    ]
+    links = [
+        {"source": "Dracula", "target": "Mina"},
+        {"source": {"id": "Mina"}, "target": {"id": "Holmes"}},
+        {"source": "Holmes", "target": "Watson"},
+    ]
+    analysis_id = client.post("/analyses", json={"name": "Crossover", "nodes": nodes, "links": links}).json()["id"]
+
+    def ids(path, **params):
+        response = client.get(f"/analyses/{analysis_id}/{path}", params=params)
+        assert response.status_code == 200
+        return [n["id"] for n in response.json()["nodes"]], len(response.json()["links"])
+
+    assert ids("work-subgraph", work="Sherlock Holmes") == (["Holmes", "Watson"], 1)
+    assert ids("neighborhood", character="Mina", hops=1) == (["Dracula", "Mina", "Holmes"], 2)
+    assert ids("top-nodes", n=2) == (["Dracula", "Holmes"], 0)
+    assert client.get("/analyses/missing/top-nodes").status_code == 404
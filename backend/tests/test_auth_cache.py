@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+import auth_cache as auth_cache_module
+from auth_cache import AuthCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manually advanced stand-in for time.monotonic/time.time inside auth_cache."""
+    fake = SimpleNamespace(now=1000.0)
+    fake.monotonic = fake.time = lambda: fake.now
+    monkeypatch.setattr(auth_cache_module, "time", fake)
+    return fake
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(max_entries=10)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=60)
+    cache.set("never stored", 3, ttl=0)
+
+    clock.now += 10
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert cache.get("never stored") is None
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_tokens_are_never_cached_past_their_expiry(clock):
+    cache = AuthCache(enabled=True, ttl=300, max_entries=10, redis_url=None)
+    cache.remember_token("soon", "mina", exp=clock.now + 30)
+    cache.remember_token("later", "mina", exp=clock.now + 3600)
+
+    clock.now += 60
+    assert cache.token_username("soon") is None
+    assert cache.token_username("later") == "mina"
+
+
+@pytest.fixture
+def client(engine, db, user, monkeypatch):
+    pytest.importorskip("httpx")
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("jose")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import auth
+    import routes_auth
+
+    # The ORM invalidation listeners and get_current_user both go through the module global
+    cache = AuthCache(enabled=True, ttl=300, max_entries=100, redis_url=None)
+    monkeypatch.setattr(auth_cache_module, "auth_cache", cache)
+    monkeypatch.setattr(auth, "auth_cache", cache)
+
+    app = FastAPI()
+    app.include_router(routes_auth.router)
+    client = TestClient(app)
+    client.cache = cache
+    client.headers["Authorization"] = f"Bearer {auth.create_access_token({'sub': user.username})}"
+    return client
+
+
+def test_password_changes_evict_the_cached_user(client, db, user):
+    assert client.get("/auth/me").json()["username"] == "mina"
+    assert client.cache.stats()["users"]["entries"] == 1
+
+    user.hashed_password = "changed"
+    db.commit()
+    assert client.cache.stats()["users"]["entries"] == 0
+    assert client.get("/auth/me").status_code == 200
+
+
+@pytest.mark.parametrize("change", ["rename", "delete"])
+def test_cached_tokens_are_rejected_once_their_user_is_gone(client, db, user, change):
+    assert client.get("/auth/me").status_code == 200
+    assert client.get("/auth/me").status_code == 200
+    assert client.cache.stats()["tokens"]["hits"] >= 1
+
+    if change == "rename":
+        user.username = "wilhelmina"
+    else:
+        db.delete(user)
+    db.commit()
+    # The token itself stays cached; the invalidated user snapshot is what rejects it
+    response = client.get("/auth/me")
+    assert response.status_code == 401
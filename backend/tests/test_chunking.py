@@ -0,0 +1,60 @@
+from chunking import chunk_text
+
+
+def paragraphs(count, size=100, prefix="p"):
+    return [f"{prefix}{i:03d} " + "x" * (size - 5) for i in range(count)]
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("  Call me Ishmael.  ", max_chars=100) == ["Call me Ishmael."]
+    assert chunk_text("   \n\n  ", max_chars=100) == []
+
+
+def test_chunks_respect_max_chars_and_keep_every_paragraph():
+    paras = paragraphs(50)
+    chunks = chunk_text("\n\n".join(paras), max_chars=1000, overlap_chars=250)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    seen = {p for chunk in chunks for p in chunk.split("\n\n")}
+    assert seen == set(paras)
+
+
+def test_consecutive_chunks_overlap_by_trailing_paragraphs():
+    chunks = chunk_text("\n\n".join(paragraphs(50)), max_chars=1000, overlap_chars=250)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        tail = previous.split("\n\n")[-2:]
+        assert current.split("\n\n")[:2] == tail
+        assert sum(len(p) for p in tail) <= 250
+
+
+def test_no_overlap_when_disabled():
+    paras = paragraphs(30)
+    chunks = chunk_text("\n\n".join(paras), max_chars=1000, overlap_chars=0)
+    assert [p for chunk in chunks for p in chunk.split("\n\n")] == paras
+
+
+def test_chapter_heading_starts_a_fresh_chunk_without_overlap():
+    chapter_one = paragraphs(6, prefix="a")
+    chapter_two = ["CHAPTER II"] + paragraphs(6, prefix="b")
+    chunks = chunk_text("\n\n".join(chapter_one + chapter_two), max_chars=1000, overlap_chars=250)
+
+    assert chunks[0].split("\n\n") == chapter_one
+    assert chunks[1].startswith("CHAPTER II")
+
+
+def test_heading_does_not_split_a_mostly_empty_chunk():
+    # The heading arrives when the chunk is under half full, so it stays in the same chunk
+    opening = paragraphs(2, prefix="a")
+    chunks = chunk_text("\n\n".join(opening + ["Chapter 2"] + paragraphs(10, prefix="b")), max_chars=1000)
+    assert chunks[0].split("\n\n")[:3] == opening + ["Chapter 2"]
+
+
+def test_oversized_paragraph_is_split_on_sentence_boundaries():
+    sentence = "Jonathan wrote in his journal. "
+    chunks = chunk_text(sentence * 100, max_chars=200, overlap_chars=0)
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == (sentence * 100).replace(" ", "")
@@ -0,0 +1,66 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+
+import corpus_store
+from corpus_store import CorpusStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CorpusStore(str(tmp_path / "corpus"))
+
+
+def test_stored_books_round_trip_with_their_metadata(store):
+    store.put("84", "It was on a dreary night of November.", etag='"abc"', source_url="https://example.org/84")
+
+    assert store.get("84") == "It was on a dreary night of November."
+    entry = store.entry("84")
+    assert entry["chars"] == 37 and entry["etag"] == '"abc"'
+    assert store.get("345") is None
+    assert store.book_ids() == ["84"]
+
+
+def test_corrupted_copies_are_ignored(store):
+    store.put("84", "Frankenstein")
+    with gzip.open(store._book_path("84"), "wt", encoding="utf-8") as f:
+        f.write("Frankenstein, edited on disk")
+
+    assert store.get("84") is None
+
+
+@pytest.mark.parametrize("book_id", ["../84", "84.txt", "", "abc"])
+def test_invalid_book_ids_are_rejected(store, book_id):
+    assert store.entry(book_id) is None
+    with pytest.raises(ValueError):
+        store.put(book_id, "text")
+
+
+def test_stores_sharing_a_directory_merge_their_index_updates(tmp_path):
+    first, second = CorpusStore(str(tmp_path)), CorpusStore(str(tmp_path))
+    first.put("84", "Frankenstein")
+    assert second.get("84") == "Frankenstein"
+
+    # Each writer merges against the file, so neither overwrites the other's book
+    second.put("345", "Dracula")
+    first.put("1342", "Pride and Prejudice")
+    assert CorpusStore(str(tmp_path)).book_ids() == ["84", "345", "1342"]
+
+
+def test_revalidation_uses_the_stored_validators(store, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(corpus_store, "time", SimpleNamespace(time=lambda: clock.now))
+    store.put("84", "Frankenstein", etag='"abc"', last_modified="Tue, 01 Oct 2024 00:00:00 GMT")
+
+    assert store.conditional_headers("84") == {
+        "If-None-Match": '"abc"', "If-Modified-Since": "Tue, 01 Oct 2024 00:00:00 GMT"
+    }
+    assert store.conditional_headers("345") == {}
+
+    clock.now += 120
+    assert not store.needs_revalidation("84", 0)
+    assert store.needs_revalidation("84", 60)
+    store.touch("84")
+    assert not store.needs_revalidation("84", 60)
+    assert store.needs_revalidation("345", 60)
@@ -0,0 +1,117 @@
+import pytest
+
+from databricks_outbox import Outbox, OutboxFull
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(path=str(tmp_path / "outbox.sqlite3"), max_rows=3)
+
+
+def test_claim_counts_delivery_attempts(outbox):
+    outbox.enqueue({"analysis_id": "a1"})
+
+    [(row_id, payload, attempts)] = outbox.claim(10)
+    assert payload == {"analysis_id": "a1"} and attempts == 0
+
+    outbox.nack([row_id], delay_seconds=0)
+    [(_, _, attempts)] = outbox.claim(10)
+    assert attempts == 1
+
+
+def test_leased_rows_are_not_claimed_twice(outbox):
+    outbox.enqueue_many([{"n": 1}, {"n": 2}])
+
+    assert [payload["n"] for _, payload, _ in outbox.claim(1)] == [1]
+    assert [payload["n"] for _, payload, _ in outbox.claim(10)] == [2]
+    assert outbox.claim(10) == []
+
+
+def test_expired_lease_is_redelivered_as_a_retry(outbox):
+    outbox.enqueue({"n": 1})
+    outbox.claim(10, lease_seconds=0)
+
+    [(_, _, attempts)] = outbox.claim(10)
+    assert attempts == 1
+
+
+def test_ack_removes_rows_and_frees_capacity(outbox):
+    outbox.enqueue_many([{"n": i} for i in range(3)])
+    with pytest.raises(OutboxFull):
+        outbox.enqueue({"n": 3})
+
+    outbox.ack([row_id for row_id, _, _ in outbox.claim(2)])
+    assert outbox.depth() == 1
+    outbox.enqueue({"n": 4})
+    assert outbox.depth() == 2
+
+
+def test_enqueue_many_keeps_what_fits(outbox):
+    with pytest.raises(OutboxFull):
+        outbox.enqueue_many([{"n": i} for i in range(5)])
+    assert [payload["n"] for _, payload, _ in outbox.claim(10)] == [0, 1, 2]
+
+
+def test_dead_letter_moves_rows_out_of_the_queue(outbox):
+    outbox.enqueue_many([{"n": 1}, {"n": 2}])
+    [(row_id, _, _), _] = outbox.claim(10)
+
+    outbox.dead_letter([row_id], "bad payload")
+    assert outbox.depth() == 1
+    assert outbox.dead_letter_depth() == 1
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    import databricks_integration
+
+    client = databricks_integration.DatabricksClient(
+        outbox=Outbox(path=str(tmp_path / "client-outbox.sqlite3"), max_rows=100)
+    )
+    written = []
+
+    def insert_data(payloads, redelivered=()):
+        if any(payload["analysis_id"] == "poison" for payload in payloads):
+            raise ValueError("rejected by Databricks")
+        written.extend(payload["analysis_id"] for payload in payloads)
+
+    monkeypatch.setattr(client, "_insert_data", insert_data)
+    monkeypatch.setattr(databricks_integration, "MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(databricks_integration, "MAX_BACKOFF_SECONDS", 0)
+    client.written = written
+    return client
+
+
+def test_poison_payload_does_not_hold_back_its_batch(client):
+    client.outbox.enqueue_many([{"analysis_id": name} for name in ("a1", "a2", "poison", "a3", "a4")])
+
+    assert client._drain_once() == 4
+    assert sorted(client.written) == ["a1", "a2", "a3", "a4"]
+    assert client.outbox.depth() == 1
+
+
+def test_poison_payload_is_dead_lettered_after_max_attempts(client):
+    client.outbox.enqueue({"analysis_id": "poison"})
+    client._drain_once()
+    assert client.outbox.depth() == 1
+
+    client._drain_once()
+    assert client.outbox.depth() == 0
+    assert client.outbox.dead_letter_depth() == 1
+
+
+def test_unreachable_databricks_retries_the_whole_batch(client, monkeypatch):
+    import databricks_integration
+
+    calls = []
+
+    def unavailable(payloads, redelivered=()):
+        calls.append(len(payloads))
+        raise databricks_integration.DatabricksUnavailable("no connection")
+
+    monkeypatch.setattr(client, "_insert_data", unavailable)
+    client.outbox.enqueue_many([{"analysis_id": f"a{i}"} for i in range(4)])
+
+    assert client._drain_once() == 0
+    assert calls == [4]
+    assert client.outbox.depth() == 4 and client.outbox.dead_letter_depth() == 0
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+from fastapi import HTTPException
+
+import extraction
+from extraction_cache import ExtractionCache
+
+CHAPTERS = "\n\n".join(f"CHAPTER {i}\n\n" + f"Mina wrote to character {i}. " * 40 for i in range(4))
+
+
+@pytest.fixture
+def flaky_extraction(tmp_path, monkeypatch):
+    """Chunks whose index is in `failing` raise; the others find one character each."""
+    failing = set()
+    chunk_index = {}
+
+    async def extract_chunk(text, api_key):
+        index = chunk_index.setdefault(text, len(chunk_index))
+        if index in failing:
+            raise RuntimeError("model returned garbage")
+        return {"nodes": [{"id": f"Character {index}"}], "edges": []}
+
+    monkeypatch.setattr(extraction, "extract_chunk", extract_chunk)
+    monkeypatch.setattr(extraction, "MAX_CONCURRENT_CHUNKS", 1)
+    monkeypatch.setattr(extraction, "CHUNK_CHARS", 1500)
+    monkeypatch.setattr(extraction, "CHUNK_OVERLAP_CHARS", 0)
+    monkeypatch.setattr(extraction, "extraction_cache", ExtractionCache(path=str(tmp_path / "cache.sqlite3")))
+    return failing
+
+
+def test_partial_graph_reports_failed_chunks(flaky_extraction):
+    flaky_extraction.add(2)
+
+    graph = asyncio.run(extraction.run_extraction(CHAPTERS, "key"))
+    assert graph["failed_chunks"] == [2]
+    assert len(graph["nodes"]) == 3
+
+
+def test_complete_graph_has_no_failed_chunks(flaky_extraction):
+    graph = asyncio.run(extraction.run_extraction(CHAPTERS, "key"))
+    assert graph["failed_chunks"] == []
+    assert len(graph["nodes"]) == 4
+
+
+def test_too_many_failed_chunks_fail_the_extraction(flaky_extraction):
+    flaky_extraction.update({0, 1, 3})
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(extraction.run_extraction(CHAPTERS, "key"))
+    assert raised.value.status_code == 500
+    assert "3 of 4 chunks failed" in raised.value.detail
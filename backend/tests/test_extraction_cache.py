@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from extraction_cache import ExtractionCache, cache_key, normalize_text
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2, ttl_seconds=3600)
+
+
+def key(text, model="gemini", prompt_version="v1"):
+    return cache_key(normalize_text(text), model, prompt_version)
+
+
+def test_trivial_whitespace_differences_share_a_key():
+    assert key("Dracula  met\tHarker.\r\n\r\n\r\nMina wrote.  ") == key("Dracula met Harker.\n\nMina wrote.")
+
+
+def test_paragraph_breaks_are_part_of_the_key():
+    # Chunking splits on blank lines, so these can chunk differently
+    assert normalize_text("Dracula met Harker.\n\nMina wrote.") == "Dracula met Harker.\n\nMina wrote."
+    assert key("Dracula met Harker.\n\nMina wrote.") != key("Dracula met Harker. Mina wrote.")
+    assert key("CHAPTER I\nDracula") != key("CHAPTER I Dracula")
+
+
+def test_model_and_prompt_version_are_part_of_the_key():
+    assert key("Dracula", model="other") != key("Dracula")
+    assert key("Dracula", prompt_version="v2") != key("Dracula")
+    # Parts are delimited, so shifting characters between them can't collide
+    assert cache_key("b", "a", "v1") != cache_key("", "a", "v1b")
+
+
+def test_hit_miss_and_expiry(cache, monkeypatch):
+    assert cache.get("k") is None
+    cache.set("k", {"nodes": [{"id": "Mina"}], "links": []})
+    assert cache.get("k") == {"nodes": [{"id": "Mina"}], "links": []}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.ttl_seconds = 0.001
+    monkeypatch.setattr("extraction_cache.time.time", lambda: 1e12)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    cache.get("a")
+    cache.set("c", {"n": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1} and cache.get("c") == {"n": 3}
+    assert cache.evictions == 1
+
+
+def test_repeat_extraction_is_served_from_the_cache(cache, monkeypatch):
+    pytest.importorskip("langchain_google_genai")
+    import extraction
+
+    calls = []
+
+    async def extract_chunk(text, api_key):
+        calls.append(text)
+        return {"nodes": [{"id": "Mina", "source_work": "Dracula"}], "edges": []}
+
+    monkeypatch.setattr(extraction, "extraction_cache", cache)
+    monkeypatch.setattr(extraction, "extract_chunk", extract_chunk)
+
+    first = asyncio.run(extraction.run_extraction("Mina  wrote to Jonathan.", "key"))
+    again = asyncio.run(extraction.run_extraction("Mina wrote to   Jonathan.\n", "key"))
+    assert calls == ["Mina wrote to Jonathan."]
+    assert again == first
@@ -0,0 +1,113 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from graph_analytics import SparseGraph, compute_metrics, graph_hash
+
+NODES = [{"id": "Dracula"}, {"id": "Harker"}, {"id": "Mina"}]
+LINKS = [
+    {"source": "Dracula", "target": "Harker"},
+    {"source": {"id": "Harker"}, "target": {"id": "Mina"}},
+]
+
+
+def test_hash_ignores_links_sparse_graph_drops():
+    noisy = LINKS + [
+        {"source": "Dracula", "target": None},
+        {"source": None, "target": "Mina"},
+        {"source": "Harker", "target": "Dracula"},
+    ]
+    assert graph_hash(NODES, noisy, 64) == graph_hash(NODES, LINKS, 64)
+    assert SparseGraph(NODES, noisy).edge_count == SparseGraph(NODES, LINKS).edge_count
+
+
+def test_hash_counts_implicit_endpoints_and_new_edges():
+    base = graph_hash(NODES, LINKS, 64)
+    assert graph_hash(NODES, LINKS + [{"source": "Mina", "target": "Renfield"}], 64) != base
+    assert graph_hash(NODES, LINKS + [{"source": "Dracula", "target": "Mina"}], 64) != base
+    assert graph_hash(NODES, LINKS, 32) != base
+
+
+def test_hash_is_order_insensitive():
+    assert graph_hash(NODES[::-1], LINKS[::-1], 64) == graph_hash(NODES, LINKS, 64)
+
+
+def test_summary_counts_are_integers():
+    metrics = compute_metrics(NODES, LINKS)
+    assert metrics["components"] == {"count": 1, "largest": 3}
+    assert isinstance(metrics["communities"]["count"], int)
+    assert isinstance(metrics["communities"]["largest"], int)
+    assert isinstance(metrics["communities"]["modularity"], float)
+
+
+def test_metrics_fit_the_response_schema():
+    schemas = pytest.importorskip("schemas")
+    response = schemas.GraphMetricsResponse(**compute_metrics(NODES, LINKS), graph_hash="x", cached=False)
+    dumped = response.model_dump()
+    assert type(dumped["communities"]["count"]) is int
+    assert type(dumped["components"]["largest"]) is int
+
+
+def small_graphs():
+    nx = pytest.importorskip("networkx")
+    # SparseGraph is unweighted; drop the karate club's edge weights
+    karate = nx.Graph(nx.karate_club_graph().edges)
+    disconnected = nx.disjoint_union(nx.path_graph(5), nx.cycle_graph(4))
+    disconnected.add_node("isolated")
+    return {
+        "karate": karate,
+        "star": nx.star_graph(6),
+        "grid": nx.grid_2d_graph(4, 5),
+        "disconnected": disconnected,
+    }
+
+
+def as_sparse_graph(graph):
+    nodes = [{"id": str(node)} for node in graph.nodes]
+    links = [{"source": str(u), "target": str(v)} for u, v in graph.edges]
+    return SparseGraph(nodes, links)
+
+
+def by_id(sparse, values):
+    return {node_id: float(values[i]) for i, node_id in enumerate(sparse.ids)}
+
+
+@pytest.mark.parametrize("name", ["karate", "star", "grid", "disconnected"])
+def test_matches_networkx(name):
+    nx = pytest.importorskip("networkx")
+    graph = small_graphs()[name]
+    sparse = as_sparse_graph(graph)
+    expected = lambda metric: {str(node): value for node, value in metric.items()}
+
+    assert sparse.edge_count == graph.number_of_edges()
+    assert by_id(sparse, sparse.degree_centrality()) == pytest.approx(expected(nx.degree_centrality(graph)))
+    assert by_id(sparse, sparse.pagerank(tol=1e-10, max_iter=1000)) == pytest.approx(
+        expected(nx.pagerank(graph, weight=None, tol=1e-10, max_iter=1000)), abs=1e-7)
+    # All nodes as sources: exact betweenness
+    assert by_id(sparse, sparse.betweenness(samples=graph.number_of_nodes())) == pytest.approx(
+        expected(nx.betweenness_centrality(graph)), abs=1e-12)
+    assert len(set(sparse.components())) == nx.number_connected_components(graph)
+
+
+def test_modularity_matches_networkx_for_found_communities():
+    nx = pytest.importorskip("networkx")
+    graph = small_graphs()["karate"]
+    sparse = as_sparse_graph(graph)
+    labels = sparse.communities()
+    partition = [
+        {node for node in graph.nodes if labels[sparse.index[str(node)]] == community}
+        for community in set(labels)
+    ]
+    assert sparse.modularity(labels) == pytest.approx(nx.community.modularity(graph, partition, weight=None))
+    assert sparse.modularity(labels) > 0.3
+
+
+def test_sampled_betweenness_is_close_to_exact():
+    graph = small_graphs()["karate"]
+    sparse = as_sparse_graph(graph)
+    exact = sparse.betweenness(samples=graph.number_of_nodes())
+    sampled = sparse.betweenness(samples=24)
+    # The bridge-like hubs stay on top even when estimated
+    assert set(np.argsort(sampled)[-3:]) == set(np.argsort(exact)[-3:])
+
@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+nx = pytest.importorskip("networkx")
+
+from graph_features import EdgeFeatureIndex
+from ml_predictor import FEATURE_ORDER
+
+NODES = [
+    {"id": "Dracula", "work": "Dracula"},
+    {"id": "Harker", "work": "Dracula"},
+    {"id": "Holmes", "source_work": "Sherlock Holmes"},
+]
+LINKS = [
+    {"source": "Dracula", "target": "Harker", "work": "Dracula"},
+    {"source": {"id": "Harker"}, "target": {"id": "Holmes"}, "source_work": "Sherlock Holmes"},
+    {"source": "Holmes", "target": "Watson"},
+    {"source": "Dracula", "target": None},
+]
+
+
+def test_edge_features_match_networkx_centrality_and_works():
+    features, links = EdgeFeatureIndex(NODES, LINKS).edge_features()
+
+    G = nx.Graph()
+    G.add_nodes_from(node["id"] for node in NODES)
+    G.add_edges_from([("Dracula", "Harker"), ("Harker", "Holmes"), ("Holmes", "Watson")])
+    centrality = nx.degree_centrality(G)
+
+    assert features.shape == (3, len(FEATURE_ORDER))
+    assert [(link["source"], link["target"]) for link in links] == [
+        ("Dracula", "Harker"), ("Harker", "Holmes"), ("Holmes", "Watson")
+    ]
+    expected_centrality = [(centrality[link["source"]], centrality[link["target"]]) for link in links]
+    np.testing.assert_allclose(features[:, :2], expected_centrality)
+    np.testing.assert_array_equal(features[:, 2:], [
+        [7, 6, 1, 1],
+        [6, 6, 0, 0],
+        [6, 6, 0, 0],
+    ])
+
+
+def test_graph_without_links_has_no_features():
+    features, links = EdgeFeatureIndex(NODES, []).edge_features()
+    assert features.shape == (0, len(FEATURE_ORDER)) and links == []
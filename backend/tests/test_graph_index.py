@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from graph_index import character_rows, relationship_rows, reindex, sync_analysis
+from models import Analysis, AnalysisCharacter, AnalysisRelationship
+
+NODES = [{"id": "Dracula", "work": "Dracula", "size": "12.5"}, {"id": "Mina", "source_work": "Dracula"}]
+LINKS = [
+    {"source": "Dracula", "target": "Mina", "label": "HUNTS"},
+    {"source": {"id": "Mina"}, "target": {"id": "Dracula"}, "label": "FEARS"},
+]
+
+
+def save(db, user, nodes, links):
+    analysis = Analysis(user_id=user.id, name="Dracula", nodes=nodes, links=links)
+    db.add(analysis)
+    db.flush()
+    sync_analysis(db, analysis)
+    db.commit()
+    return analysis
+
+
+def characters(db):
+    return sorted((row.name, row.work, row.size) for row in db.query(AnalysisCharacter))
+
+
+def relationships(db):
+    return sorted((row.source, row.target, row.label) for row in db.query(AnalysisRelationship))
+
+
+def row_ids(db, model):
+    return {row.id for row in db.query(model)}
+
+
+def test_rows_normalize_endpoints_and_skip_incomplete_entries():
+    assert character_rows(NODES + [{"id": ""}, {"name": "no id"}]) == [
+        {"name": "Dracula", "work": "Dracula", "description": None, "size": 12.5},
+        {"name": "Mina", "work": "Dracula", "description": None, "size": None},
+    ]
+    assert relationship_rows(LINKS + [{"source": "Mina"}]) == [
+        {"source": "Dracula", "target": "Mina", "label": "HUNTS"},
+        {"source": "Mina", "target": "Dracula", "label": "FEARS"},
+    ]
+
+
+def test_new_analysis_is_indexed(db, user):
+    save(db, user, NODES, LINKS)
+    assert characters(db) == [("Dracula", "Dracula", 12.5), ("Mina", "Dracula", None)]
+    assert relationships(db) == [("Dracula", "Mina", "HUNTS"), ("Mina", "Dracula", "FEARS")]
+
+
+def test_edit_only_rewrites_changed_keys(db, user):
+    analysis = save(db, user, NODES, LINKS)
+    untouched_character = db.query(AnalysisCharacter).filter_by(name="Dracula").one().id
+    untouched_relationship = db.query(AnalysisRelationship).filter_by(label="HUNTS").one().id
+
+    old_nodes, old_links = analysis.nodes, analysis.links
+    analysis.nodes = [NODES[0], {"id": "Mina", "work": "Dracula", "description": "Teacher"}, {"id": "Lucy"}]
+    analysis.links = [LINKS[0], {"source": "Lucy", "target": "Mina", "label": "FRIEND"}]
+    sync_analysis(db, analysis, old_nodes, old_links)
+    db.commit()
+
+    assert characters(db) == [("Dracula", "Dracula", 12.5), ("Lucy", None, None), ("Mina", "Dracula", None)]
+    assert relationships(db) == [("Dracula", "Mina", "HUNTS"), ("Lucy", "Mina", "FRIEND")]
+    # Rows for unchanged keys were left alone rather than deleted and re-inserted
+    assert untouched_character in row_ids(db, AnalysisCharacter)
+    assert untouched_relationship in row_ids(db, AnalysisRelationship)
+
+
+def test_unchanged_columns_are_skipped(db, user):
+    analysis = save(db, user, NODES, LINKS)
+    before = row_ids(db, AnalysisRelationship)
+
+    old_nodes = analysis.nodes
+    analysis.nodes = NODES + [{"id": "Lucy"}]
+    sync_analysis(db, analysis, old_nodes, analysis.links, nodes_changed=True, links_changed=False)
+    db.commit()
+
+    assert [name for name, _, _ in characters(db)] == ["Dracula", "Lucy", "Mina"]
+    assert row_ids(db, AnalysisRelationship) == before
+
+
+def test_null_labels_are_matched_when_removed(db, user):
+    analysis = save(db, user, NODES, [{"source": "Dracula", "target": "Mina"}])
+    old_links = analysis.links
+    analysis.links = []
+    sync_analysis(db, analysis, analysis.nodes, old_links, nodes_changed=False)
+    db.commit()
+    assert relationships(db) == []
+
+
+def test_reindex_rebuilds_from_the_json(db, user):
+    save(db, user, NODES, LINKS)
+    db.query(AnalysisCharacter).delete()
+    db.commit()
+
+    assert reindex(db) == 1
+    assert len(characters(db)) == 2
+    assert len(relationships(db)) == 2
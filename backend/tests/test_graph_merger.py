@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+from extraction import GraphMerger
+
+
+def test_characters_are_merged_case_and_whitespace_insensitively():
+    merger = GraphMerger()
+    new_nodes, _ = merger.add({"nodes": [{"id": "Count Dracula"}], "edges": []})
+    assert [n["id"] for n in new_nodes] == ["Count Dracula"]
+
+    new_nodes, _ = merger.add({"nodes": [{"id": " count  DRACULA "}, {"id": "Mina"}], "edges": []})
+    assert [n["id"] for n in new_nodes] == ["Mina"]
+    assert [n["id"] for n in merger.result()["nodes"]] == ["Count Dracula", "Mina"]
+
+
+def test_missing_source_work_is_filled_in_by_later_chunks():
+    merger = GraphMerger()
+    merger.add({"nodes": [{"id": "Mina"}], "edges": []})
+    merger.add({"nodes": [{"id": "mina", "source_work": "Dracula"}], "edges": []})
+    merger.add({"nodes": [{"id": "MINA", "source_work": "Other"}], "edges": []})
+    assert merger.result()["nodes"] == [{"id": "Mina", "source_work": "Dracula"}]
+
+
+def test_edges_use_canonical_names_and_are_deduplicated_by_label():
+    merger = GraphMerger()
+    merger.add({"nodes": [{"id": "Mina"}, {"id": "Jonathan Harker"}],
+                "edges": [{"source": "Mina", "target": "Jonathan Harker", "label": "married_to"}]})
+
+    _, new_edges = merger.add({"nodes": [], "edges": [
+        {"source": "mina", "target": "jonathan harker", "label": "MARRIED_TO"},
+        {"source": "mina", "target": "jonathan harker", "label": "LOVES"},
+    ]})
+    assert new_edges == [{"source": "Mina", "target": "Jonathan Harker", "label": "LOVES"}]
+    assert len(merger.result()["edges"]) == 2
+
+
+def test_incomplete_nodes_and_edges_are_skipped():
+    merger = GraphMerger()
+    new_nodes, new_edges = merger.add({
+        "nodes": [{"id": ""}, {"name": "no id"}],
+        "edges": [{"source": "Mina", "target": ""}, {"target": "Mina"}],
+    })
+    assert new_nodes == [] and new_edges == []
+
+
+def test_input_edges_are_not_mutated():
+    edge = {"source": "mina", "target": "Lucy", "label": "FRIEND"}
+    merger = GraphMerger()
+    merger.add({"nodes": [{"id": "Mina"}], "edges": [edge]})
+    assert edge["source"] == "mina"
+    assert merger.result()["edges"][0]["source"] == "Mina"
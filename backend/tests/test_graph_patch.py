@@ -0,0 +1,125 @@
+import pytest
+
+from graph_patch import GraphPatch, PatchError, link_path
+
+NODES = [{"id": "Dracula", "work": "Dracula"}, {"id": "Mina"}, {"id": "a/b~c"}]
+LINKS = [
+    {"source": "Dracula", "target": "Mina", "label": "HUNTS"},
+    {"source": {"id": "Mina"}, "target": {"id": "a/b~c"}, "label": None},
+]
+
+
+def patched(*operations):
+    return GraphPatch(NODES, LINKS, {"color": "red"}).apply(list(operations))
+
+
+def test_add_and_replace_nodes():
+    result = patched(
+        {"op": "add", "path": "/nodes/-", "value": {"id": "Lucy"}},
+        {"op": "replace", "path": "/nodes/Mina", "value": {"description": "Teacher"}},
+    )
+    assert [n["id"] for n in result.nodes] == ["Dracula", "Mina", "a/b~c", "Lucy"]
+    assert result.nodes[1] == {"id": "Mina", "description": "Teacher"}
+    assert result.touched == {"nodes"}
+
+
+def test_removing_a_node_removes_and_reports_its_links():
+    result = patched({"op": "remove", "path": "/nodes/Mina"})
+    assert [n["id"] for n in result.nodes] == ["Dracula", "a/b~c"]
+    assert result.links == []
+    assert [op["path"] for op in result.applied] == [
+        "/links/Dracula/Mina/HUNTS", "/links/Mina/a~1b~0c/", "/nodes/Mina"
+    ]
+    assert result.touched == {"nodes", "links"}
+
+
+def test_escaped_paths_address_nodes_and_links():
+    result = patched(
+        {"op": "replace", "path": "/nodes/a~1b~0c", "value": {"size": 3}},
+        {"op": "remove", "path": link_path(LINKS[1])},
+    )
+    assert result.nodes[2] == {"id": "a/b~c", "size": 3}
+    assert result.links == [LINKS[0]]
+
+
+def test_link_replace_and_metadata_fields():
+    result = patched(
+        {"op": "replace", "path": "/links/Dracula/Mina/HUNTS", "value": {"label": "STALKS"}},
+        {"op": "remove", "path": "/work_meta/color"},
+        {"op": "add", "path": "/work_meta/layout", "value": "radial"},
+        {"op": "replace", "path": "/name", "value": "Renamed"},
+    )
+    assert result.links[0]["label"] == "STALKS"
+    assert result.work_meta == {"layout": "radial"}
+    assert result.fields == {"name": "Renamed"}
+    assert result.touched == {"links", "work_meta"}
+
+
+def test_input_graph_is_not_mutated():
+    patched({"op": "replace", "path": "/nodes/Mina", "value": {"size": 9}},
+            {"op": "remove", "path": "/nodes/Dracula"})
+    assert NODES[1] == {"id": "Mina"} and len(NODES) == 3 and len(LINKS) == 2
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "add", "path": "/nodes/-", "value": {"id": "Mina"}},
+    {"op": "add", "path": "/nodes/-", "value": {"name": "no id"}},
+    {"op": "replace", "path": "/nodes/Renfield", "value": {}},
+    {"op": "replace", "path": "/nodes/Mina", "value": {"id": "Wilhelmina"}},
+    {"op": "remove", "path": "/links/Dracula/Mina/LOVES"},
+    {"op": "add", "path": "/links/-", "value": {"source": "Mina"}},
+    {"op": "remove", "path": "/work_meta/missing"},
+    {"op": "replace", "path": "/name", "value": ""},
+    {"op": "move", "path": "/nodes/Mina"},
+    {"op": "replace", "path": "nodes/Mina", "value": {}},
+])
+def test_invalid_operations_raise_patch_error(operation):
+    with pytest.raises(PatchError):
+        patched(operation)
+
+
+@pytest.fixture
+def client(engine, db, user):
+    pytest.importorskip("httpx")
+    pytest.importorskip("aiosqlite")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import routes_analyses
+    from auth import get_current_user
+
+    app = FastAPI()
+    app.include_router(routes_analyses.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def test_patch_route_bumps_version_and_rejects_stale_base_version(client):
+    created = client.post("/analyses", json={"name": "Dracula", "nodes": NODES, "links": LINKS})
+    assert created.status_code == 201
+    analysis_id, version = created.json()["id"], created.json()["version"]
+
+    add_lucy = {"op": "add", "path": "/nodes/-", "value": {"id": "Lucy"}}
+    response = client.patch(f"/analyses/{analysis_id}",
+                            json={"base_version": version, "operations": [add_lucy]})
+    assert response.status_code == 200
+    assert response.json()["version"] == version + 1
+    assert response.json()["node_count"] == 4
+
+    # A second client still holding the old version must not overwrite the change
+    stale = client.patch(f"/analyses/{analysis_id}",
+                         json={"base_version": version, "operations": [{"op": "remove", "path": "/nodes/Lucy"}]})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["current_version"] == version + 1
+    assert client.get(f"/analyses/{analysis_id}").json()["version"] == version + 1
+
+
+def test_patch_route_rejects_invalid_operations_without_saving(client):
+    created = client.post("/analyses", json={"name": "Dracula", "nodes": NODES, "links": LINKS}).json()
+    response = client.patch(f"/analyses/{created['id']}", json={
+        "base_version": created["version"],
+        "operations": [{"op": "add", "path": "/nodes/-", "value": {"id": "Lucy"}},
+                       {"op": "remove", "path": "/nodes/Renfield"}],
+    })
+    assert response.status_code == 422
+    assert client.get(f"/analyses/{created['id']}").json()["version"] == created["version"]
@@ -0,0 +1,105 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import http_client
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Route the shared client through `handler` instead of the network (it holds no sockets)."""
+    monkeypatch.setattr(http_client, "BACKOFF_BASE_SECONDS", 0)
+    monkeypatch.setattr(http_client, "_host_limits", {})
+
+    def install(handler):
+        monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return install
+
+
+def fetch(url, **kwargs):
+    return asyncio.run(http_client.fetch_text(url, **kwargs))
+
+
+def test_transient_failures_are_retried(serve, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 3)
+    responses = iter([
+        httpx.ConnectError("connection reset"),
+        httpx.Response(503),
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, text="It was a dark and stormy night"),
+    ])
+
+    def handler(request):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    serve(handler)
+    result = fetch("https://gutenberg.example/84.txt")
+    assert result.status_code == 200
+    assert result.text == "It was a dark and stormy night"
+
+
+def test_retries_stop_after_max_retries(serve, monkeypatch):
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 2)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502)
+
+    serve(handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch("https://gutenberg.example/84.txt")
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried(serve):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404)
+
+    serve(handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch("https://gutenberg.example/84.txt")
+    assert len(calls) == 1
+
+
+def test_not_modified_is_returned_as_is(serve):
+    serve(lambda request: httpx.Response(304))
+    assert fetch("https://gutenberg.example/84.txt", headers={"If-None-Match": '"abc"'}).status_code == 304
+
+
+def test_bodies_over_max_bytes_are_refused(serve):
+    serve(lambda request: httpx.Response(200, content=b"x" * 2048))
+    assert len(fetch("https://gutenberg.example/84.txt", max_bytes=2048).text) == 2048
+    with pytest.raises(ValueError, match="exceeds 2047 bytes"):
+        fetch("https://gutenberg.example/84.txt", max_bytes=2047)
+
+
+def test_concurrency_is_limited_per_host(serve, monkeypatch):
+    monkeypatch.setattr(http_client, "PER_HOST_CONCURRENCY", 2)
+    in_flight, peak = Counter(), Counter()
+
+    async def handler(request):
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200, text=host)
+
+    serve(handler)
+
+    async def run():
+        urls = [f"https://a.example/{i}" for i in range(6)] + [f"https://b.example/{i}" for i in range(3)]
+        return await asyncio.gather(*(http_client.fetch_text(url) for url in urls))
+
+    assert len(asyncio.run(run())) == 9
+    assert peak == {"a.example": 2, "b.example": 2}
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("httpx")
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from instrumentation import StatsCollector, metrics_response, span, trace_requests
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(trace_requests)
+
+    def parse():
+        with span("test_parse"):
+            pass
+
+    @app.get("/books/{book_id}")
+    async def book(book_id: str):
+        with span("test_lookup"):
+            await asyncio.sleep(0.001)
+        # Spans in worker threads still land in the request's trace
+        await asyncio.to_thread(parse)
+        return {"id": book_id}
+
+    @app.get("/metrics")
+    def metrics():
+        body, content_type = metrics_response()
+        return Response(content=body, media_type=content_type)
+
+    return TestClient(app)
+
+
+def test_metrics_expose_request_latency_by_route_template(client):
+    client.get("/books/84")
+    client.get("/books/345")
+
+    body = client.get("/metrics").text
+    count = next(line for line in body.splitlines() if line.startswith(
+        'mythinfo_http_request_seconds_count{method="GET",route="/books/{book_id}",status="200"}'))
+    assert float(count.rsplit(" ", 1)[1]) >= 2
+    assert 'mythinfo_stage_seconds_count{stage="test_lookup"}' in body
+
+
+def test_traced_requests_get_a_stage_breakdown(client):
+    response = client.get("/books/84", headers={"X-Trace": "1", "X-Request-Id": "req-84"})
+    assert response.headers["X-Trace-Id"] == "req-84"
+    stages = {part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")}
+    assert {"test_lookup", "test_parse", "total"} <= stages
+
+
+def test_untraced_requests_have_no_trace_headers(client):
+    response = client.get("/books/84")
+    assert "Server-Timing" not in response.headers
+    assert "X-Trace-Id" not in response.headers
+
+
+def test_stats_sources_become_gauges():
+    collector = StatsCollector()
+    collector.register("cache", lambda: {"hits": 3, "backend": "memory", "users": {"entries": 2}})
+    collector.register("broken", lambda: 1 / 0)
+
+    gauges = {family.name: family.samples[0].value for family in collector.collect()}
+    assert gauges == {"mythinfo_cache_hits": 3.0, "mythinfo_cache_users_entries": 2.0}
@@ -0,0 +1,162 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+import jobs
+from database import async_engine
+from jobs import JOB_MAX_ATTEMPTS, JOB_STALE_AFTER, JobWorkerPool, utcnow
+from models import AnalysisJob
+
+
+def run(coroutine):
+    """Run on a fresh loop, closing pooled aiosqlite connections before it goes away."""
+    async def scoped():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(scoped())
+
+
+def add_job(db, user, **values):
+    job = AnalysisJob(user_id=user.id, kind="text", params={"text": "Once upon a time", "name": "Tale"}, **values)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def reload(db, job_id):
+    db.expire_all()
+    return db.get(AnalysisJob, job_id)
+
+
+def test_claim_takes_the_oldest_queued_job_once(db, user):
+    first = add_job(db, user, created_at=utcnow() - timedelta(minutes=1))
+    second = add_job(db, user)
+    pool = JobWorkerPool(workers=0)
+
+    claimed = [run(pool.claim()) for _ in range(3)]
+    assert [job.id if job else None for job in claimed] == [first, second, None]
+
+    job = reload(db, first)
+    assert (job.status, job.worker_id, job.attempts) == ("running", pool.worker_id, 1)
+    assert job.heartbeat_at is not None
+    assert pool.claimed_total == 2
+
+
+def test_claim_skips_deferred_and_finished_jobs(db, user):
+    add_job(db, user, run_after=utcnow() + timedelta(minutes=5))
+    add_job(db, user, status="succeeded")
+    add_job(db, user, status="cancelled")
+    due = add_job(db, user, run_after=utcnow() - timedelta(seconds=1))
+
+    claimed = run(JobWorkerPool(workers=0).claim())
+    assert claimed.id == due
+    assert reload(db, due).run_after is None
+
+
+def test_reaper_requeues_stale_jobs_and_fails_exhausted_ones(db, user):
+    stale_at = utcnow() - timedelta(seconds=JOB_STALE_AFTER + 60)
+    retry = add_job(db, user, status="running", worker_id="dead", attempts=1, heartbeat_at=stale_at)
+    exhausted = add_job(db, user, status="running", worker_id="dead", attempts=JOB_MAX_ATTEMPTS,
+                        heartbeat_at=stale_at)
+    alive = add_job(db, user, status="running", worker_id="alive", attempts=1, heartbeat_at=utcnow())
+    pool = JobWorkerPool(workers=0)
+
+    assert run(pool.requeue_stale()) == 1
+    assert pool.requeued_total == 1
+
+    job = reload(db, retry)
+    assert (job.status, job.worker_id, job.attempts) == ("queued", None, 1)
+    job = reload(db, exhausted)
+    assert job.status == "failed" and job.finished_at is not None
+    assert "stopped responding" in job.error
+    assert reload(db, alive).status == "running"
+
+
+def test_deferred_job_goes_back_to_the_queue_without_using_an_attempt(db, user, monkeypatch):
+    from admission import rejection
+
+    async def refused(job, progress):
+        raise rejection(429, "Too many analyses in progress", 30)
+
+    monkeypatch.setattr(jobs, "run_pipeline", refused)
+    job_id = add_job(db, user)
+    pool = JobWorkerPool(workers=0)
+
+    async def claim_and_execute():
+        await pool._execute(await pool.claim())
+
+    run(claim_and_execute())
+    job = reload(db, job_id)
+    assert (job.status, job.attempts, job.deferrals, job.worker_id) == ("queued", 0, 1, None)
+    assert job.run_after is not None
+    assert pool.deferred_total == 1
+    assert run(pool.claim()) is None
+
+
+def test_job_fails_once_it_runs_out_of_deferrals(db, user, monkeypatch):
+    from admission import rejection
+
+    async def refused(job, progress):
+        raise rejection(503, "Provider is rate limiting", 30)
+
+    monkeypatch.setattr(jobs, "run_pipeline", refused)
+    job_id = add_job(db, user, deferrals=jobs.JOB_MAX_DEFERRALS)
+    pool = JobWorkerPool(workers=0)
+
+    async def claim_and_execute():
+        await pool._execute(await pool.claim())
+
+    run(claim_and_execute())
+    job = reload(db, job_id)
+    assert job.status == "failed" and "deferrals" in job.error
+    assert pool.deferred_total == 0 and pool.failed_total == 1
+
+
+@pytest.fixture
+def client(engine, db, user, monkeypatch):
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import routes_jobs
+    from auth import get_current_user
+
+    monkeypatch.setattr(routes_jobs.job_workers, "notify", lambda: None)
+    app = FastAPI()
+    app.include_router(routes_jobs.router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def test_repeated_idempotency_key_returns_the_same_job(client, db):
+    body = {"book_id": "345", "name": "Dracula"}
+    headers = {"Idempotency-Key": "dracula-1"}
+
+    first = client.post("/jobs/gutenberg", json=body, headers=headers)
+    assert first.status_code == 202
+    assert first.headers["Location"] == f"/jobs/{first.json()['id']}"
+
+    again = client.post("/jobs/gutenberg", json=body, headers=headers)
+    assert again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+    assert db.query(AnalysisJob).count() == 1
+
+
+def test_reused_idempotency_key_with_different_params_conflicts(client, db):
+    headers = {"Idempotency-Key": "dracula-1"}
+    assert client.post("/jobs/gutenberg", json={"book_id": "345"}, headers=headers).status_code == 202
+
+    response = client.post("/jobs/gutenberg", json={"book_id": "84"}, headers=headers)
+    assert response.status_code == 409
+    assert db.query(AnalysisJob).count() == 1
+
+
+def test_jobs_without_a_key_are_never_deduplicated(client, db):
+    for _ in range(2):
+        assert client.post("/jobs/gutenberg", json={"book_id": "345"}).status_code == 202
+    assert db.query(AnalysisJob).count() == 2
@@ -0,0 +1,62 @@
+import glob
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+lakehouse_export = pytest.importorskip("lakehouse_export")
+PartitionedParquetWriter = lakehouse_export.PartitionedParquetWriter
+
+
+def analysis(i, updated_at, works=1):
+    return {
+        "id": f"a{i}",
+        "user_id": "u1",
+        "name": f"analysis {i}",
+        "nodes": [{"id": f"n{i}-{w}", "work": f"work {w}"} for w in range(works)],
+        "links": [{"source": {"id": f"n{i}-0"}, "target": f"n{i}-{works - 1}", "label": "KNOWS"}],
+        "updated_at": updated_at,
+    }
+
+
+def node_rows(root):
+    return sum(pq.read_table(path).num_rows
+               for path in glob.glob(os.path.join(root, "nodes", "**", "*.parquet"), recursive=True))
+
+
+def test_one_file_per_partition_per_run(tmp_path):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with PartitionedParquetWriter(str(tmp_path)) as writer:
+        for offset in range(0, 600, 200):
+            writer.write_graph_batch([analysis(i, start) for i in range(offset, offset + 200)])
+
+    # One date, one work: a single nodes file and a single links file
+    assert writer.files_written == 2
+    assert node_rows(str(tmp_path)) == 600
+
+
+def test_older_dates_are_closed_as_the_export_moves_on(tmp_path):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with PartitionedParquetWriter(str(tmp_path)) as writer:
+        for day in range(30):
+            writer.write_graph_batch([analysis(day * 10 + i, start + timedelta(days=day), works=3)
+                                      for i in range(10)])
+            # Only the current day's partitions (3 node works + 1 link work) stay open/buffered
+            assert writer.open_files <= 4
+            assert {key[1] for key in writer._buffers} <= {(start + timedelta(days=day)).date().isoformat()}
+
+    assert node_rows(str(tmp_path)) == 30 * 10 * 3
+
+
+def test_buffered_rows_and_open_files_are_capped(tmp_path):
+    # Many small partitions on the same date: nothing is ever closed by date
+    updated_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with PartitionedParquetWriter(str(tmp_path), max_buffered_rows=50, max_open_files=8) as writer:
+        for batch in range(20):
+            writer.write_graph_batch([analysis(batch * 10 + i, updated_at, works=40) for i in range(10)])
+            assert writer.buffered_rows <= 50
+            assert writer.open_files <= 8
+
+    assert node_rows(str(tmp_path)) == 20 * 10 * 40
+    assert writer.rows_written == {"nodes": 8000, "links": 200}
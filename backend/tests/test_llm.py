@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import llm
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A fake chat model answering after `latency` seconds, tracking concurrent calls."""
+    state = SimpleNamespace(latency=0.0, in_flight=0, peak=0, calls=0, keys=[])
+
+    async def respond(prompt):
+        state.calls += 1
+        state.in_flight += 1
+        state.peak = max(state.peak, state.in_flight)
+        try:
+            await asyncio.sleep(state.latency)
+        finally:
+            state.in_flight -= 1
+        return AIMessage(content='{"name": "Mina", "biography": "Teacher.", "notable_events": []}')
+
+    def factory(api_key, max_output_tokens=None):
+        state.keys.append((api_key, max_output_tokens))
+        return RunnableLambda(respond)
+
+    monkeypatch.setattr(llm, "_semaphore", None)
+    llm.set_chat_model_factory(factory)
+    yield state
+    llm.set_chat_model_factory(llm.gemini_chat_model)
+
+
+def dossier(timeout=None):
+    return llm.ainvoke_chain("dossier", "key", {"character_name": "Mina", "system_name": "Dracula"}, timeout)
+
+
+def test_responses_are_parsed_and_chains_reused(model):
+    async def run():
+        return [await dossier() for _ in range(3)]
+
+    assert asyncio.run(run())[0]["name"] == "Mina"
+    assert model.calls == 3
+    # One chat model per (API key, output budget), built once
+    assert model.keys == [("key", None)]
+
+
+def test_concurrent_calls_are_capped(model, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_CONCURRENCY", 2)
+    model.latency = 0.02
+
+    async def run():
+        return await asyncio.gather(*(dossier() for _ in range(6)))
+
+    assert len(asyncio.run(run())) == 6
+    assert model.peak == 2
+
+
+def test_slow_calls_time_out_and_free_their_slot(model, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_MAX_CONCURRENCY", 1)
+
+    async def run():
+        model.latency = 10
+        with pytest.raises(asyncio.TimeoutError):
+            await dossier(timeout=0.05)
+        assert model.in_flight == 0
+        model.latency = 0
+        return await dossier(timeout=0.05)
+
+    assert asyncio.run(run())["name"] == "Mina"
@@ -0,0 +1,165 @@
+import json
+import pickle
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+pytest.importorskip("skops")
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+
+import ml_predictor
+from ml_predictor import FEATURE_ORDER, RelationshipTypePredictor
+from model_registry import ModelRegistry, ModelRegistryError
+
+
+def publish(registry, version, label):
+    # Always predicts `label`, so the served version is visible in the output
+    model = DecisionTreeClassifier().fit(np.zeros((2, len(FEATURE_ORDER))), [0, 0])
+    return registry.publish(model, FEATURE_ORDER, [label], version=version)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    publish(registry, "v1", "ALLY")
+    publish(registry, "v2", "ENEMY")
+    registry.activate("v1")
+    return registry
+
+
+def predicted(predictor):
+    return predictor.predict_batch([[0] * len(FEATURE_ORDER)])["predicted_relationships"]
+
+
+def test_loads_active_version(registry):
+    predictor = RelationshipTypePredictor(registry)
+    assert predicted(predictor) == ["ALLY"]
+    assert predictor.version == "v1"
+
+
+def test_activate_hot_swaps_and_marks_active(registry):
+    predictor = RelationshipTypePredictor(registry)
+    predictor.ensure_loaded()
+
+    assert predictor.activate("v2") == "v2"
+    assert predicted(predictor) == ["ENEMY"]
+    assert registry.active_version() == "v2"
+
+
+def test_versions_with_other_features_are_not_activated(registry):
+    model = DecisionTreeClassifier().fit(np.zeros((2, 2)), [0, 0])
+    registry.publish(model, ["source_centrality", "chapter_count"], ["RIVAL"], version="v3")
+    predictor = RelationshipTypePredictor(registry)
+    predictor.ensure_loaded()
+
+    with pytest.raises(ModelRegistryError, match="chapter_count"):
+        predictor.activate("v3")
+    assert predicted(predictor) == ["ALLY"]
+    assert registry.active_version() == "v1"
+
+
+def test_features_are_reordered_to_the_manifest_order(registry):
+    # Trained with the columns reversed: ENEMY exactly when source_in_work is set
+    names = FEATURE_ORDER[::-1]
+    training = np.zeros((2, len(names)))
+    training[1, names.index("source_in_work")] = 1
+    model = DecisionTreeClassifier().fit(training, [0, 1])
+    registry.publish(model, names, ["ALLY", "ENEMY"], version="reversed")
+    predictor = RelationshipTypePredictor(registry)
+    predictor.activate("reversed")
+
+    rows = np.zeros((2, len(FEATURE_ORDER)))
+    rows[0, FEATURE_ORDER.index("source_in_work")] = 1
+    rows[1, FEATURE_ORDER.index("source_centrality")] = 1
+    assert predictor.predict_batch(rows)["predicted_relationships"] == ["ENEMY", "ALLY"]
+
+
+def test_other_processes_follow_the_active_version(registry, monkeypatch):
+    monkeypatch.setattr(ml_predictor, "ML_MODEL_RECHECK_SECONDS", 0)
+    serving = RelationshipTypePredictor(registry)
+    admin = RelationshipTypePredictor(registry)
+    assert predicted(serving) == ["ALLY"]
+
+    admin.activate("v2")
+    assert predicted(serving) == ["ENEMY"]
+
+
+def test_failed_first_load_is_retried(registry, monkeypatch):
+    monkeypatch.setattr(ml_predictor, "ML_MODEL_RETRY_SECONDS", 0)
+    predictor = RelationshipTypePredictor(registry)
+    real_load = registry.load
+    monkeypatch.setattr(registry, "load", lambda version: (_ for _ in ()).throw(OSError("disk hiccup")))
+    assert predictor.ensure_loaded() is None
+
+    monkeypatch.setattr(registry, "load", real_load)
+    assert predicted(predictor) == ["ALLY"]
+
+
+def test_failed_load_waits_before_retrying(registry, monkeypatch):
+    monkeypatch.setattr(ml_predictor, "ML_MODEL_RETRY_SECONDS", 3600)
+    predictor = RelationshipTypePredictor(registry)
+    calls = []
+    monkeypatch.setattr(registry, "load", lambda version: calls.append(version) or 1 / 0)
+
+    predictor.ensure_loaded()
+    predictor.ensure_loaded()
+    assert calls == ["v1"]
+
+
+def test_legacy_pickle_is_not_loaded_unless_allowed(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(ml_predictor, "ML_ALLOW_LEGACY_PICKLE", False)
+    monkeypatch.setattr(ml_predictor, "LEGACY_MODEL_PATH", str(tmp_path / "relationship_predictor.pkl"))
+    (tmp_path / "relationship_predictor.pkl").write_bytes(b"not unpickled")
+    predictor = RelationshipTypePredictor(ModelRegistry(str(tmp_path / "empty")))
+
+    assert predictor.ensure_loaded() is None
+    assert "import-pkl" in caplog.text
+
+
+def test_bundled_model_is_imported_once_and_activated(tmp_path, monkeypatch):
+    pkl_path = tmp_path / "relationship_predictor.pkl"
+    source = ModelRegistry(str(tmp_path / "source"))
+    publish(source, "v1", "ALLY")
+    model, manifest = source.load("v1")
+    pkl_path.write_bytes(pickle.dumps({
+        "model": model,
+        "label_encoder": LabelEncoder().fit(manifest["label_classes"]),
+        "feature_names": FEATURE_ORDER,
+    }))
+    monkeypatch.setattr(ml_predictor, "LEGACY_MODEL_PATH", str(pkl_path))
+    monkeypatch.setattr(ml_predictor, "BUNDLED_MODEL_SHA256", ml_predictor.sha256_file(str(pkl_path)))
+    registry = ModelRegistry(str(tmp_path / "registry"))
+
+    assert predicted(RelationshipTypePredictor(registry)) == ["ALLY"]
+    assert registry.active_version() == ml_predictor.BUNDLED_MODEL_VERSION
+    # A second worker loads the imported version rather than importing again
+    assert predicted(RelationshipTypePredictor(registry)) == ["ALLY"]
+    assert len(registry.versions()) == 1
+
+
+def test_joblib_versions_are_refused(registry):
+    manifest_path = registry._version_dir("v1") + "/manifest.json"
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest.pop("format")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    with pytest.raises(ModelRegistryError, match="joblib"):
+        registry.load("v1")
+
+
+@pytest.mark.parametrize("field, value", [
+    ("source_centrality", float("nan")),
+    ("target_centrality", float("inf")),
+    ("source_name_length", 10 ** 400),
+])
+def test_prediction_request_rejects_values_that_would_fail_a_shared_batch(field, value):
+    from pydantic import ValidationError
+    from routes_ml import RelationshipPredictionRequest
+
+    features = {"source_centrality": 0.2, "target_centrality": 0.1, "source_name_length": 3, "target_name_length": 4}
+    with pytest.raises(ValidationError):
+        RelationshipPredictionRequest(**{**features, field: value})
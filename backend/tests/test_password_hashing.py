@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("passlib")
+pytest.importorskip("bcrypt")
+
+from password_hashing import PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    # Cheapest bcrypt cost; the behavior under test doesn't depend on it
+    hasher = PasswordHasher(workers=2, rounds=4, max_pending=4)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hashes_verify_and_reject_wrong_passwords(hasher):
+    async def run():
+        hashed = await hasher.hash("garlic")
+        return hashed, await hasher.verify("garlic", hashed), await hasher.verify("stake", hashed)
+
+    hashed, valid, invalid = asyncio.run(run())
+    assert hashed.startswith("$2b$04$")
+    assert valid and not invalid
+
+
+def test_bcrypt_runs_on_the_pool_not_the_event_loop(hasher, monkeypatch):
+    threads = []
+    context_hash = hasher.context.hash
+
+    def recording_hash(password):
+        threads.append(threading.current_thread().name)
+        return context_hash(password)
+
+    monkeypatch.setattr(hasher.context, "hash", recording_hash)
+
+    async def run():
+        loop_thread = threading.current_thread().name
+        await asyncio.gather(*(hasher.hash(f"password {i}") for i in range(4)))
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 4
+    assert all(name.startswith("password-hash") for name in threads)
+    assert loop_thread not in threads
+
+
+def test_hashes_with_another_cost_are_upgraded_on_verify(hasher):
+    old = PasswordHasher(workers=1, rounds=5)
+
+    async def run():
+        stored = await old.hash("garlic")
+        return await hasher.verify_and_update("garlic", stored), await hasher.verify_and_update("stake", stored)
+
+    try:
+        (valid, new_hash), (wrong, no_hash) = asyncio.run(run())
+    finally:
+        old.shutdown()
+    assert valid and new_hash.startswith("$2b$04$")
+    assert not wrong and no_hash is None
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+import extraction
+import main
+from admission import AdmissionController
+from extraction_cache import ExtractionCache
+
+CHAPTERS = "\n\n".join(f"CHAPTER {i}\n\n" + f"Mina wrote to character {i}. " * 40 for i in range(3))
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@pytest.fixture
+def controller(tmp_path, monkeypatch):
+    """Stubbed chunk extraction and a fresh admission controller to check slots against."""
+    chunk_index = {}
+
+    async def extract_chunk(text, api_key):
+        index = chunk_index.setdefault(text, len(chunk_index))
+        return {"nodes": [{"id": f"Character {index}"}, {"id": "Mina"}],
+                "edges": [{"source": "Mina", "target": f"Character {index}", "label": "WRITES_TO"}]}
+
+    monkeypatch.setattr(extraction, "extract_chunk", extract_chunk)
+    monkeypatch.setattr(extraction, "MAX_CONCURRENT_CHUNKS", 1)
+    monkeypatch.setattr(extraction, "CHUNK_CHARS", 1500)
+    monkeypatch.setattr(extraction, "CHUNK_OVERLAP_CHARS", 0)
+    monkeypatch.setattr(extraction, "extraction_cache", ExtractionCache(path=str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(main, "admission", AdmissionController(enabled=True, max_concurrent=2))
+    return main.admission
+
+
+@pytest.fixture
+def client(controller):
+    # No context manager: startup (database, Databricks, ML model) is not needed here
+    return TestClient(main.app)
+
+
+def test_stream_emits_progress_chunks_and_final_graph(client, controller):
+    response = client.post("/analyze/stream", json={"text": CHAPTERS, "api_key": "key"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    names = [name for name, _ in events]
+    assert events[0] == ("progress", {"completed": 0, "failed": 0, "total": 3})
+    assert names.count("nodes") == 3 and names.count("edges") == 3
+    assert names[-1] == "final"
+
+    final = events[-1][1]
+    assert {n["id"] for n in final["nodes"]} == {"Mina", "Character 0", "Character 1", "Character 2"}
+    assert len(final["links"]) == 3 and final["failed_chunks"] == []
+    assert controller.stats()["active"] == 0
+
+
+def test_unexpected_errors_arrive_as_an_error_event(client, controller, monkeypatch):
+    async def iter_extraction(text, api_key, admit):
+        ticket = await admit(1)
+        try:
+            yield {"event": "progress", "data": {"completed": 0, "failed": 0, "total": 1}}
+            raise KeyError("size")
+        finally:
+            ticket.release()
+
+    monkeypatch.setattr(main, "iter_extraction", iter_extraction)
+    response = client.post("/analyze/stream", json={"text": CHAPTERS, "api_key": "key"})
+    assert response.status_code == 200
+    assert parse_events(response.text) == [
+        ("progress", {"completed": 0, "failed": 0, "total": 1}),
+        ("error", {"status_code": 500, "detail": "Extraction Error"}),
+    ]
+    assert controller.stats()["active"] == 0
+
+
+def test_admission_slot_is_released_when_the_body_is_never_sent(controller):
+    async def scenario():
+        events = extraction.iter_extraction(CHAPTERS, "key", lambda tokens: controller.admit("client", tokens))
+        await events.__anext__()
+        assert controller.stats()["active"] == 1
+
+        async def body():
+            yield b""
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client went away")
+
+        response = main.ClosingStreamingResponse(body(), events, media_type="text/event-stream")
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        with pytest.raises(ClientDisconnect):
+            await response(scope, receive, send)
+        return controller.stats()["active"]
+
+    assert asyncio.run(scenario()) == 0